@@ -0,0 +1,111 @@
+"""Compare full-page parsing against distro-block extraction on the saved fixtures.
+
+Usage: python benchmarks/bench_html_parsing.py [--distro noetic] [--repeat 20] [--parser html.parser|lxml|fast]
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from roscribe.ros_html_extractor import ROSDistroExtractor, get_html_parser
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_repo_pages():
+    with open(os.path.join(FIXTURE_DIR, "pages.json"), 'r') as pages_file:
+        pages = json.load(pages_file)
+
+    repo_pages = []
+    for source, file_name in pages.items():
+        if '/r/' in source:
+            with open(os.path.join(FIXTURE_DIR, file_name), 'r') as page_file:
+                repo_pages.append(page_file.read())
+
+    return repo_pages
+
+
+def legacy_repo_fields(page_content, distro_key):
+    soup = BeautifulSoup(page_content, "html.parser")
+    for element in soup.find_all("div"):
+        if distro_key in element.get_attribute_list('class'):
+            if "No version for distro" in element.get_text():
+                return None
+            summary_div = element.contents[1].contents[1].contents[3].contents[1].contents[1]
+            repo_fields = {'checkout_uri': summary_div.contents[0].contents[3].get_text(),
+                           'vcs_type': summary_div.contents[2].contents[3].get_text(),
+                           'vcs_version': summary_div.contents[4].contents[3].get_text(),
+                           'last_updated': summary_div.contents[6].contents[2].get_text(),
+                           'dev_status': summary_div.contents[8].contents[3].get_text(),
+                           'ci_status': summary_div.contents[10].contents[3].get_text(),
+                           'released': summary_div.contents[12].contents[3].get_text(),
+                           'tags': summary_div.contents[14].contents[3].get_text()}
+
+            packages = []
+            if element.contents[1].contents[3].contents[3].contents[1].get_text() != "No packages found.":
+                for package_div in element.contents[1].contents[3].contents[3].contents[1].contents[3].contents[1::2]:
+                    packages.append((package_div.contents[1].get_text(), package_div.contents[3].get_text()))
+            repo_fields['packages'] = packages
+
+            repo_fields['readme'] = element.contents[1].contents[5].contents[3].get_text()
+            repo_fields['contrib'] = element.contents[1].contents[7].contents[3].get_text()
+            return repo_fields
+
+    return None
+
+
+def extractor_repo_fields(page_content, extractor):
+    for distro_block in extractor.get_distro_blocks(page_content):
+        if "No version for distro" not in distro_block.get_text():
+            return extractor.get_repo_fields(distro_block)
+    return None
+
+
+def measure(parse_func, repo_pages, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for page_content in repo_pages:
+            parse_func(page_content)
+    time_per_page = (time.perf_counter() - start_time) / (repeat * len(repo_pages))
+
+    peak_memory = 0
+    for page_content in repo_pages:
+        tracemalloc.start()
+        parse_func(page_content)
+        peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return time_per_page, peak_memory
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--distro', default='noetic')
+    arg_parser.add_argument('--repeat', type=int, default=20)
+    arg_parser.add_argument('--parser', default='html.parser')
+    args = arg_parser.parse_args()
+
+    repo_pages = load_repo_pages()
+    distro_key = "distro-" + args.distro
+    extractor = ROSDistroExtractor(args.distro, parser=args.parser)
+
+    for page_content in repo_pages:
+        if legacy_repo_fields(page_content, distro_key) != extractor_repo_fields(page_content, extractor):
+            raise RuntimeError("Extractor output differs from the full-page parse!")
+
+    results = {'full page (html.parser)': measure(lambda page: legacy_repo_fields(page, distro_key),
+                                                  repo_pages, args.repeat),
+               'distro block ({})'.format(get_html_parser(args.parser)):
+                   measure(lambda page: extractor_repo_fields(page, extractor), repo_pages, args.repeat)}
+
+    print("{} repository pages, distro '{}'".format(len(repo_pages), args.distro))
+    for name, (time_per_page, peak_memory) in results.items():
+        print("{:<32} {:>8.3f} ms/page {:>10.1f} KiB peak".format(name, time_per_page * 1000, peak_memory / 1024))
+
+
+if __name__ == '__main__':
+    main()
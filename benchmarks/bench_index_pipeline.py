@@ -0,0 +1,183 @@
+"""Run the ROS index build over the saved fixtures, served locally over HTTP, and report throughput.
+
+Usage: python benchmarks/bench_index_pipeline.py [--distros noetic humble] [--repeat 3] [--sharded]
+                                                 [--save-baseline FILE] [--compare FILE] [--tolerance 0.5]
+                                                 [--dedupe-report]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from fixture_server import start_fixture_server
+from roscribe.compact_index import CompactVectorStore, get_compact_index_dir
+from roscribe.embedding_backends import HashedNgramEmbeddings
+from roscribe.index_manifest import IndexManifest
+from roscribe.ros_http_fetcher import ROSHTTPFetcher
+from roscribe.ros_index_to_vectorstore import build_index, get_db_name, get_listing_URLs, near_duplicate_threshold
+from roscribe.sharded_index import get_shared_db_dir
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+NUM_LISTING_PAGES = 2
+QUERIES = ["navigation stack costmap", "lidar slam mapping", "robot localization with an ekf",
+           "image transport compression", "how to contribute a pull request", "common sensor message definitions"]
+
+
+def get_max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def count_chunks(db_root, ros_distros):
+    num_chunks = 0
+    for ros_distro in ros_distros:
+        manifest = IndexManifest(os.path.join(db_root, get_db_name(ros_distro, True), "index_manifest.json"))
+        num_chunks += sum(len(repo_entry['doc_ids']) for repo_entry in manifest.repos.values())
+
+    return num_chunks
+
+
+def time_queries(db_root, ros_distros, sharded, repeat=20):
+    # Only the vector search is timed; query embeddings are computed once up front
+    embeddings = HashedNgramEmbeddings()
+    query_vectors = embeddings.embed_documents(QUERIES)
+    store_dirs = [get_shared_db_dir(db_root)] if sharded else \
+        [os.path.join(db_root, get_db_name(ros_distro, True)) for ros_distro in ros_distros]
+
+    num_vectors = 0
+    query_seconds = 0.0
+    for store_dir in store_dirs:
+        store = CompactVectorStore(get_compact_index_dir(store_dir), embedding_function=embeddings)
+        num_vectors += store.get_shape()[0]
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            for query_vector in query_vectors:
+                store.similarity_search_by_vector(query_vector, k=8)
+        query_seconds += (time.perf_counter() - start_time) / (repeat * len(query_vectors))
+
+    return num_vectors, query_seconds * 1000
+
+
+def run_pipeline(ros_distros, sharded, dedupe_threshold=near_duplicate_threshold, compact_dtype=None, measure=None):
+    server, base_url = start_fixture_server()
+    fetcher = ROSHTTPFetcher(cache_dir=None, host_override=base_url, browser_fallback=False)
+    try:
+        with tempfile.TemporaryDirectory() as db_root, contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            index_build, pipeline = build_index(get_listing_URLs(NUM_LISTING_PAGES), list(ros_distros),
+                                                HashedNgramEmbeddings(), db_root=db_root, fetcher=fetcher,
+                                                backend="hashed-ngram", backend_options=dict(), sharded=sharded,
+                                                compact_dtype=compact_dtype, dedupe_threshold=dedupe_threshold,
+                                                num_parse_workers=1)
+            total_seconds = time.perf_counter() - start_time
+            num_chunks = count_chunks(db_root, ros_distros)
+            measured = measure(db_root) if measure is not None else None
+    finally:
+        fetcher.close()
+        server.shutdown()
+
+    pipeline_stats = pipeline.get_stats()
+    # Everything outside the staged pipeline: listing pages, opening the stores and saving them
+    stage_times = {'listing_and_setup': total_seconds - pipeline_stats['wall_time']}
+    stage_times.update({name: stats['busy_time'] for name, stats in pipeline_stats['stages'].items()})
+    num_pages = NUM_LISTING_PAGES + len(index_build.repo_URLs)
+
+    return stage_times, total_seconds, num_pages, num_chunks, measured
+
+
+def get_results(ros_distros, repeat, sharded):
+    runs = [run_pipeline(ros_distros, sharded) for _ in range(repeat)]
+
+    stage_seconds = {stage: min(run[0][stage] for run in runs) for stage in runs[0][0]}
+    total_seconds = min(run[1] for run in runs)
+    _, _, num_pages, num_chunks, _ = runs[0]
+
+    return {'distros': list(ros_distros),
+            'sharded': sharded,
+            'pages': num_pages,
+            'chunks': num_chunks,
+            'total_seconds': total_seconds,
+            'pages_per_sec': num_pages / total_seconds,
+            'chunks_per_sec': num_chunks / total_seconds,
+            'stage_seconds': stage_seconds,
+            'peak_rss_bytes': get_max_rss_bytes()}
+
+
+def get_dedupe_results(ros_distros, repeat, sharded):
+    def measure(db_root):
+        return time_queries(db_root, ros_distros, sharded)
+
+    stored_vectors = dict()
+    query_ms = dict()
+    for name, dedupe_threshold in (('without_dedupe', None), ('with_dedupe', near_duplicate_threshold)):
+        runs = [run_pipeline(ros_distros, sharded, dedupe_threshold=dedupe_threshold, compact_dtype='float16',
+                             measure=measure)[4] for _ in range(repeat)]
+        stored_vectors[name] = runs[0][0]
+        query_ms[name] = min(run[1] for run in runs)
+
+    return {'stored_vectors': stored_vectors,
+            'query_ms': query_ms,
+            'vector_reduction': 1 - stored_vectors['with_dedupe'] / max(stored_vectors['without_dedupe'], 1),
+            'query_latency_reduction': 1 - query_ms['with_dedupe'] / query_ms['without_dedupe']}
+
+
+def compare_results(results, baseline, tolerance):
+    regressions = []
+    for stage, seconds in results['stage_seconds'].items():
+        baseline_seconds = baseline['stage_seconds'].get(stage)
+        if baseline_seconds is not None and baseline_seconds > 0 and seconds > baseline_seconds * (1 + tolerance):
+            regressions.append("{}: {:.4f}s vs {:.4f}s baseline".format(stage, seconds, baseline_seconds))
+
+    for metric in ('pages_per_sec', 'chunks_per_sec'):
+        if results[metric] < baseline[metric] / (1 + tolerance):
+            regressions.append("{}: {:.1f} vs {:.1f} baseline".format(metric, results[metric], baseline[metric]))
+
+    if results['chunks'] != baseline['chunks']:
+        regressions.append("chunks: {} vs {} baseline".format(results['chunks'], baseline['chunks']))
+
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--distros', nargs='+', default=['noetic', 'humble', 'jazzy'])
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--sharded', action='store_true', help="build one shared store for all distros")
+    arg_parser.add_argument('--save-baseline', metavar='FILE')
+    arg_parser.add_argument('--compare', metavar='FILE', nargs='?', const=BASELINE_PATH)
+    arg_parser.add_argument('--tolerance', type=float, default=0.5)
+    arg_parser.add_argument('--dedupe-report', action='store_true',
+                            help="also report how much near-duplicate collapsing shrinks the index and query latency")
+    args = arg_parser.parse_args()
+
+    results = get_results(args.distros, args.repeat, args.sharded)
+    if args.dedupe_report:
+        results['dedupe'] = get_dedupe_results(args.distros, args.repeat, args.sharded)
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+            baseline_file.write("\n")
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as baseline_file:
+            regressions = compare_results(results, json.load(baseline_file), args.tolerance)
+        if len(regressions) > 0:
+            print("Regressions against {}:\n  {}".format(args.compare, "\n  ".join(regressions)))
+            sys.exit(1)
+        print("No regressions against {}.".format(args.compare))
+
+
+if __name__ == '__main__':
+    main()
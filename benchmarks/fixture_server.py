@@ -0,0 +1,93 @@
+"""Serve the saved index.ros.org fixtures over HTTP with ETag / Last-Modified support.
+
+Usage: python benchmarks/fixture_server.py [--port 8000]
+Then point ROSHTTPFetcher(host_override="http://127.0.0.1:8000") at it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture_routes(fixture_dir=FIXTURE_DIR):
+    with open(os.path.join(fixture_dir, "pages.json"), 'r') as pages_file:
+        pages = json.load(pages_file)
+
+    routes = dict()
+    for source, file_name in pages.items():
+        file_path = os.path.join(fixture_dir, file_name)
+        with open(file_path, 'rb') as page_file:
+            body = page_file.read()
+        routes[urlsplit(source).path] = {'body': body,
+                                         'etag': '"{}"'.format(hashlib.sha256(body).hexdigest()[:16]),
+                                         'last_modified': formatdate(os.path.getmtime(file_path), usegmt=True)}
+
+    return routes
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    routes = dict()
+    request_log = []
+
+    def do_GET(self):
+        self.request_log.append(self.path)
+
+        route = self.routes.get(self.path)
+        if route is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self.headers.get('If-None-Match') == route['etag'] or \
+                self.headers.get('If-Modified-Since') == route['last_modified']:
+            self.send_response(304)
+            self.send_header('ETag', route['etag'])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(route['body'])))
+        self.send_header('ETag', route['etag'])
+        self.send_header('Last-Modified', route['last_modified'])
+        self.end_headers()
+        self.wfile.write(route['body'])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(port=0, fixture_dir=FIXTURE_DIR):
+    handler = type('FixtureHandler', (FixtureRequestHandler,), {'routes': load_fixture_routes(fixture_dir),
+                                                                 'request_log': []})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, "http://127.0.0.1:{}".format(server.server_address[1])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--port', type=int, default=8000)
+    args = arg_parser.parse_args()
+
+    server, base_url = start_fixture_server(args.port)
+    print("Serving fixtures at {}".format(base_url))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
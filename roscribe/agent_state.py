@@ -0,0 +1,124 @@
+import pickle
+
+
+class SpecState:
+    def __init__(self, ros_graph_dict, ros_node_desc, ros_distro, model_name, max_interaction_limit, verbose):
+        self.ros_graph_dict = ros_graph_dict
+        self.ros_node_desc = ros_node_desc
+        self.ros_distro = ros_distro
+        self.model_name = model_name
+        self.max_interaction_limit = max_interaction_limit
+        self.verbose = verbose
+
+    def get_ros_graph_dict(self):
+        return self.ros_graph_dict
+
+    def get_ros_node_desc(self):
+        return self.ros_node_desc
+
+    def to_agent(self):
+        from roscribe.spec_agent import SpecAgent
+
+        spec_agent = SpecAgent(ros_distro=self.ros_distro,
+                               model_name=self.model_name,
+                               max_interaction_limit=self.max_interaction_limit,
+                               verbose=self.verbose)
+
+        spec_agent.ros_graph = self.ros_graph_dict
+        spec_agent.ros_node_desc = self.ros_node_desc
+
+        return spec_agent
+
+
+class GenState:
+    def __init__(self, project_name, ws_name, nodes, ros_distro, model_name, max_interaction_limit, verbose):
+        self.project_name = project_name
+        self.ws_name = ws_name
+        self.nodes = nodes
+        self.ros_distro = ros_distro
+        self.model_name = model_name
+        self.max_interaction_limit = max_interaction_limit
+        self.verbose = verbose
+
+    def to_agent(self, spec_state):
+        from roscribe.gen_agent import GenAgent
+
+        gen_agent = GenAgent(ros_distro=self.ros_distro,
+                             ros_graph_dict=spec_state.get_ros_graph_dict(),
+                             ros_node_desc=spec_state.get_ros_node_desc(),
+                             model_name=self.model_name,
+                             max_interaction_limit=self.max_interaction_limit,
+                             verbose=self.verbose)
+
+        gen_agent.project_name = self.project_name
+        gen_agent.ws_name = self.ws_name
+        gen_agent.nodes = self.nodes
+
+        return gen_agent
+
+
+class PackState:
+    def __init__(self, package, dependencies, ros_distro, model_name, max_interaction_limit, verbose):
+        self.package = package
+        self.dependencies = dependencies
+        self.ros_distro = ros_distro
+        self.model_name = model_name
+        self.max_interaction_limit = max_interaction_limit
+        self.verbose = verbose
+
+    def to_agent(self, spec_state, gen_state):
+        from roscribe.pack_agent import PackAgent
+
+        pack_agent = PackAgent(ros_distro=self.ros_distro,
+                               ros_graph_dict=spec_state.get_ros_graph_dict(),
+                               ros_node_desc=spec_state.get_ros_node_desc(),
+                               model_name=self.model_name,
+                               max_interaction_limit=self.max_interaction_limit,
+                               verbose=self.verbose,
+                               project_name=gen_state.project_name,
+                               ros_nodes=gen_state.nodes,
+                               ws_name=gen_state.ws_name)
+
+        pack_agent.package = self.package
+        pack_agent.dependencies = self.dependencies
+
+        return pack_agent
+
+
+def load_agent_info(filename):
+    with open(filename, 'rb') as saved_agent:
+        return pickle.load(saved_agent)
+
+
+def load_spec_state(filename):
+    spec_agent_info = load_agent_info(filename)
+
+    return SpecState(ros_graph_dict=spec_agent_info['ros_graph_dict'],
+                     ros_node_desc=spec_agent_info['ros_node_desc'],
+                     ros_distro=spec_agent_info['ros_distro'],
+                     model_name=spec_agent_info['model_name'],
+                     max_interaction_limit=spec_agent_info['max_interaction_limit'],
+                     verbose=spec_agent_info['verbose'])
+
+
+def load_gen_state(filename):
+    gen_agent_info = load_agent_info(filename)
+
+    return GenState(project_name=gen_agent_info['project_name'],
+                    ws_name=gen_agent_info['ws_name'],
+                    nodes=gen_agent_info['nodes'],
+                    ros_distro=gen_agent_info['ros_distro'],
+                    model_name=gen_agent_info['model_name'],
+                    max_interaction_limit=gen_agent_info['max_interaction_limit'],
+                    verbose=gen_agent_info['verbose'])
+
+
+def load_pack_state(filename):
+    pack_agent_info = load_agent_info(filename)
+
+    return PackState(package=pack_agent_info['package'],
+                     dependencies=pack_agent_info['dependencies'],
+                     ros_distro=pack_agent_info['ros_distro'],
+                     model_name=pack_agent_info['model_name'],
+                     max_interaction_limit=pack_agent_info['max_interaction_limit'],
+                     verbose=pack_agent_info['verbose'])
@@ -0,0 +1,275 @@
+import json
+import os
+import shutil
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from roscribe.mmr_search import maximal_marginal_relevance
+
+
+COMPACT_DTYPES = ('float16', 'int8')
+
+
+def export_compact_index(collection, index_dir, dtype='float16', page_size=5000):
+    if dtype not in COMPACT_DTYPES:
+        raise ValueError("Unsupported compact index dtype: {}".format(dtype))
+
+    ids, documents, metadatas, vector_pages = [], [], [], []
+    num_vectors = collection.count()
+    for offset in range(0, num_vectors, page_size):
+        page = collection.get(include=['embeddings', 'documents', 'metadatas'], limit=page_size, offset=offset)
+        ids.extend(page['ids'])
+        documents.extend(page['documents'])
+        metadatas.extend(page['metadatas'])
+        vector_pages.append(np.asarray(page['embeddings'], dtype=np.float32))
+
+    vectors = np.concatenate(vector_pages) if len(vector_pages) > 0 else np.zeros((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1.0)
+
+    # The header is written last, so an earlier export must not be left around to look complete meanwhile
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.makedirs(index_dir)
+    if dtype == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        np.save(os.path.join(index_dir, "scales.npy"), scales.astype(np.float32))
+        vectors = np.round(vectors / scales[:, None]).astype(np.int8)
+    else:
+        vectors = vectors.astype(np.float16)
+    np.save(os.path.join(index_dir, "vectors.npy"), vectors)
+
+    with open(os.path.join(index_dir, "docs.json"), 'w') as docs_file:
+        json.dump({'ids': ids, 'documents': documents, 'metadatas': metadatas}, docs_file)
+
+    header = {'dtype': dtype, 'count': len(ids), 'dim': int(vectors.shape[1]) if len(ids) > 0 else 0}
+    with open(os.path.join(index_dir, "compact_index.json"), 'w') as header_file:
+        json.dump(header, header_file)
+
+    return header
+
+
+class CompactVectorStore(VectorStore):
+    def __init__(self, index_dir, embedding_function, block_size=8192):
+        self.index_dir = index_dir
+        self.embedding_function = embedding_function
+        self.block_size = block_size
+
+        with open(os.path.join(index_dir, "compact_index.json"), 'r') as header_file:
+            header = json.load(header_file)
+        with open(os.path.join(index_dir, "docs.json"), 'r') as docs_file:
+            docs = json.load(docs_file)
+
+        vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode='r')
+        scales = np.load(os.path.join(index_dir, "scales.npy"), mmap_mode='r') if header['dtype'] == 'int8' else None
+        self._set_index(header, docs, vectors, scales)
+
+    @classmethod
+    def from_arrays(cls, header, docs, vectors, scales, embedding_function, block_size=8192):
+        store = cls.__new__(cls)
+        store.index_dir = None
+        store.embedding_function = embedding_function
+        store.block_size = block_size
+        store._set_index(header, docs, vectors, scales)
+        return store
+
+    def _set_index(self, header, docs, vectors, scales):
+        self.header = header
+        self.ids = docs['ids']
+        self.documents = docs['documents']
+        self.metadatas = docs['metadatas']
+        self.id_positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+        self.vectors = vectors
+        self.scales = scales
+        self._fields = dict()
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("CompactVectorStore is read-only; rebuild it with export_compact_index.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("CompactVectorStore is read-only; rebuild it with export_compact_index.")
+
+    def get_vectors(self, positions):
+        vectors = np.asarray(self.vectors[positions], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[positions])[:, None]
+        return vectors
+
+    def get_scores(self, query_vector):
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), self.block_size):
+            end = min(start + self.block_size, len(self.ids))
+            scores[start:end] = self.get_vectors(slice(start, end)) @ query_vector
+
+        return scores
+
+    def get_filter_mask(self, filter):
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in filter.items():
+            if key == '$and':
+                for sub_filter in condition:
+                    mask &= self.get_filter_mask(sub_filter)
+                continue
+
+            if key not in self._fields:
+                self._fields[key] = np.array([metadata.get(key) for metadata in self.metadatas], dtype=object)
+
+            if isinstance(condition, dict) and '$in' in condition:
+                mask &= np.isin(self._fields[key], list(condition['$in']))
+            else:
+                value = condition['$eq'] if isinstance(condition, dict) else condition
+                mask &= self._fields[key] == value
+
+        return mask
+
+    def top_k(self, query_vector, k, filter=None):
+        scores = self.get_scores(query_vector)
+        if filter is not None:
+            scores[~self.get_filter_mask(filter)] = -np.inf
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), scores[:0]
+
+        positions = np.argpartition(-scores, k - 1)[:k]
+        positions = positions[np.argsort(-scores[positions])]
+        return positions, scores[positions]
+
+    def get_document(self, position):
+        return Document(page_content=self.documents[position], metadata=dict(self.metadatas[position]))
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k=k,
+                                                           filter=filter)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        positions, scores = self.top_k(embedding, k, filter=filter)
+        return [(self.get_document(position), float(score)) for position, score in zip(positions, scores)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(self.embedding_function.embed_query(query), k=k,
+                                                            fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter)
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5, filter=None,
+                                                **kwargs):
+        docs, vectors = self.get_candidates(embedding, fetch_k, filter=filter)
+        selected = maximal_marginal_relevance(embedding, vectors, k=k, lambda_mult=lambda_mult)
+        return [docs[i] for i in selected]
+
+    def get_candidates(self, query_vector, fetch_k, filter=None):
+        positions, _ = self.top_k(query_vector, fetch_k, filter=filter)
+        return [self.get_document(position) for position in positions], self.get_vectors(positions)
+
+    def get(self, ids=None, include=None, **kwargs):
+        positions = [self.id_positions[doc_id] for doc_id in ids if doc_id in self.id_positions] \
+            if ids is not None else range(len(self.ids))
+        return {'ids': [self.ids[i] for i in positions],
+                'documents': [self.documents[i] for i in positions],
+                'metadatas': [self.metadatas[i] for i in positions]}
+
+    def get_shape(self):
+        return self.header['count'], self.header['dim']
+
+
+class JSONStreamReader:
+    def __init__(self, json_file, block_size=1 << 16):
+        self.json_file = json_file
+        self.block_size = block_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+
+    def fill(self):
+        block = self.json_file.read(self.block_size)
+        if len(block) == 0:
+            return False
+        self.buffer = self.buffer[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return
+
+    def accept(self, char):
+        self.skip_whitespace()
+        if self.buffer[self.pos:self.pos + 1] != char:
+            return False
+        self.pos += 1
+        return True
+
+    def expect(self, char):
+        if not self.accept(char):
+            raise ValueError("Malformed JSON stream: expected \"{}\" at \"{}\".".format(
+                char, self.buffer[self.pos:self.pos + 20]))
+
+    def read_value(self):
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number may continue in the next block, so only trust values that end inside the buffer
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(json_path, key, block_size=1 << 16):
+    with open(json_path, 'r') as json_file:
+        reader = JSONStreamReader(json_file, block_size=block_size)
+        reader.expect('{')
+        while not reader.accept('}'):
+            reader.accept(',')
+            name = reader.read_value()
+            reader.expect(':')
+            reader.expect('[')
+            while not reader.accept(']'):
+                reader.accept(',')
+                value = reader.read_value()
+                if name == key:
+                    yield value
+            if name == key:
+                return
+
+
+def iter_compact_docs(index_dir, block_size=1 << 16):
+    docs_path = os.path.join(index_dir, "docs.json")
+    return zip(iter_json_array(docs_path, 'ids', block_size=block_size),
+               iter_json_array(docs_path, 'documents', block_size=block_size),
+               iter_json_array(docs_path, 'metadatas', block_size=block_size))
+
+
+def get_compact_index_dir(db_dir):
+    return os.path.join(db_dir, "compact")
+
+
+def has_compact_index(db_dir):
+    return os.path.exists(os.path.join(get_compact_index_dir(db_dir), "compact_index.json"))
@@ -0,0 +1,138 @@
+import re
+import threading
+
+import tiktoken
+
+
+KIND_ORDER = {'summary': 0, 'packages': 1, 'readme': 2, 'contrib': 3}
+TITLE_KINDS = (("Repository summary", 'summary'), ("ROS packages", 'packages'), ("README", 'readme'),
+               ("Contributing information", 'contrib'))
+EMPTY_TEXTS = ("No README found.", "No Contributing found.")
+
+
+class ContextCompressor:
+    def __init__(self, max_tokens=1500, encoding_name="cl100k_base", drop_kinds=('contrib',)):
+        self.max_tokens = max_tokens
+        self.encoding_name = encoding_name
+        self.drop_kinds = drop_kinds
+
+        self._encoding = None
+        self._lock = threading.Lock()
+        self.num_calls = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.num_dropped = 0
+
+    @property
+    def encoding(self):
+        with self._lock:
+            if self._encoding is None:
+                try:
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+                except Exception as error:
+                    # tiktoken downloads its BPE file on first use, which fails offline
+                    print("Could not load the {} encoding ({}); budgeting context by characters instead.".
+                          format(self.encoding_name, error))
+                    self._encoding = CharEncoding()
+            return self._encoding
+
+    def compress(self, docs, repo_notes=None):
+        raw_text = "\n\n".join(doc.page_content for doc in docs)
+
+        repo_docs = dict()
+        seen_texts = set()
+        num_dropped = 0
+        for doc in docs:
+            text_key = re.sub(r"\s+", " ", doc.page_content).strip()
+            if text_key in seen_texts or text_key in EMPTY_TEXTS or get_doc_kind(doc) in self.drop_kinds:
+                num_dropped += 1
+                continue
+            seen_texts.add(text_key)
+            repo_docs.setdefault(get_doc_repo(doc), []).append(doc)
+
+        blocks = []
+        for repo_name, doc_list in repo_docs.items():
+            doc_list.sort(key=lambda doc: (KIND_ORDER.get(get_doc_kind(doc), len(KIND_ORDER)),
+                                           doc.metadata.get('chunk', 0)))
+            header = "Repository: {repo_name}".format(repo_name=repo_name)
+            if repo_notes is not None and repo_name in repo_notes:
+                header += " ({note})".format(note=repo_notes[repo_name])
+            blocks.append(header + "\n" + "\n".join(get_chunk_text(doc) for doc in doc_list))
+
+        if len(blocks) == 0:
+            compressed_text = "No relevant documents were found."
+        else:
+            compressed_text = self.truncate("\n\n".join(blocks))
+        self.record(raw_text, compressed_text, num_dropped)
+
+        return compressed_text
+
+    def truncate(self, text):
+        tokens = self.encoding.encode_ordinary(text)
+        if len(tokens) <= self.max_tokens:
+            return text
+        return self.encoding.decode(tokens[:self.max_tokens]).rstrip() + " ..."
+
+    def record(self, raw_text, compressed_text, num_dropped):
+        tokens_before = len(self.encoding.encode_ordinary(raw_text))
+        tokens_after = len(self.encoding.encode_ordinary(compressed_text))
+        with self._lock:
+            self.num_calls += 1
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+            self.num_dropped += num_dropped
+
+    def get_stats(self):
+        with self._lock:
+            tokens_saved = self.tokens_before - self.tokens_after
+            return {'calls': self.num_calls,
+                    'tokens_before': self.tokens_before,
+                    'tokens_after': self.tokens_after,
+                    'tokens_saved': tokens_saved,
+                    'tokens_saved_per_call': tokens_saved / self.num_calls if self.num_calls > 0 else 0.0,
+                    'dropped_chunks': self.num_dropped}
+
+
+class CharEncoding:
+    def __init__(self, chars_per_token=4):
+        self.chars_per_token = chars_per_token
+
+    def encode_ordinary(self, text):
+        return [text[i:i + self.chars_per_token] for i in range(0, len(text), self.chars_per_token)]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def compact_whitespace(text):
+    return "\n".join(re.sub(r"[ \t]+", " ", line).strip() for line in text.strip().splitlines())
+
+
+def get_chunk_text(doc):
+    text = compact_whitespace(doc.page_content)
+    if 'duplicate_repos' in doc.metadata:
+        text += "\n(Also in: {duplicate_repos})".format(duplicate_repos=doc.metadata['duplicate_repos'])
+    return text
+
+
+def get_doc_kind(doc):
+    kind = doc.metadata.get('kind')
+    if kind is not None:
+        return kind
+
+    title = doc.metadata.get('title', "")
+    for prefix, title_kind in TITLE_KINDS:
+        if title.startswith(prefix):
+            return title_kind
+    return None
+
+
+def get_doc_repo(doc):
+    return doc.metadata.get('repo_name', doc.metadata.get('source', "Unknown repository"))
+
+
+context_compressor = ContextCompressor()
+
+
+def get_context_compressor():
+    return context_compressor
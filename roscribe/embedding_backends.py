@@ -0,0 +1,92 @@
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+DEFAULT_EMBEDDING_BACKEND = "openai"
+
+
+class HashedNgramEmbeddings(Embeddings):
+    def __init__(self, dim=512, min_n=3, max_n=5):
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+        self.model = "hashed-ngram-{}-{}-{}".format(dim, min_n, max_n)
+
+    def get_features(self, text):
+        features = []
+        for word in re.findall(r"[a-z0-9_]+", text.lower()):
+            features.append("w:" + word)
+            padded = "<{}>".format(word)
+            for n in range(self.min_n, self.max_n + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+        return features
+
+    def embed_text(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        features = self.get_features(text)
+        if len(features) == 0:
+            return vector
+
+        hashes = np.array([zlib.crc32(feature.encode('utf-8')) for feature in features], dtype=np.uint64)
+        signs = np.where(hashes & np.uint64(1 << 31), -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, (hashes % np.uint64(self.dim)).astype(np.int64), signs)
+
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed_documents(self, texts):
+        return [self.embed_text(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_text(text).tolist()
+
+
+def get_embedding_backend(backend, **options):
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(**options)
+    if backend == "hashed-ngram":
+        return HashedNgramEmbeddings(**options)
+
+    raise ValueError("Unknown embedding backend: {}".format(backend))
+
+
+def is_remote_backend(backend):
+    return backend == "openai"
+
+
+def get_backend_path(db_dir):
+    return os.path.join(db_dir, "embedding_backend.json")
+
+
+def load_backend_spec(db_dir):
+    backend_path = get_backend_path(db_dir)
+    if not os.path.exists(backend_path):
+        return {'backend': DEFAULT_EMBEDDING_BACKEND, 'options': dict()}
+
+    with open(backend_path, 'r') as backend_file:
+        return json.load(backend_file)
+
+
+def save_backend_spec(db_dir, backend, options):
+    os.makedirs(db_dir, exist_ok=True)
+    with open(get_backend_path(db_dir), 'w') as backend_file:
+        json.dump({'backend': backend, 'options': options}, backend_file)
+
+
+def check_backend_spec(db_dir, backend, options):
+    if not os.path.isdir(db_dir) or len(os.listdir(db_dir)) == 0:
+        return
+
+    backend_spec = load_backend_spec(db_dir)
+    if backend_spec['backend'] != backend or backend_spec['options'] != options:
+        raise ValueError("The index in \"{}\" was built with the {} embedding backend {}; rebuild it from scratch to "
+                         "switch to {} {}.".format(db_dir, backend_spec['backend'], backend_spec['options'],
+                                                  backend, options))
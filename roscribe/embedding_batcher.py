@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import tiktoken
+from langchain_core.embeddings import Embeddings
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, window=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+
+        self._lock = threading.Lock()
+        self._history = deque()
+        self._window_tokens = 0
+
+    def acquire(self, num_tokens):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while len(self._history) > 0 and now - self._history[0][0] >= self.window:
+                    self._window_tokens -= self._history.popleft()[1]
+
+                requests_ok = self.requests_per_minute is None or len(self._history) < self.requests_per_minute
+                tokens_ok = self.tokens_per_minute is None or len(self._history) == 0 or \
+                    self._window_tokens + num_tokens <= self.tokens_per_minute
+
+                if requests_ok and tokens_ok:
+                    self._history.append((now, num_tokens))
+                    self._window_tokens += num_tokens
+                    return
+
+                wait_time = self.window - (now - self._history[0][0])
+
+            time.sleep(max(wait_time, 0.01))
+
+
+class TokenBatchedEmbeddings(Embeddings):
+    def __init__(self, embeddings, encoding_name="cl100k_base", max_tokens_per_request=8000,
+                 max_texts_per_request=1000, max_concurrency=4, requests_per_minute=None, tokens_per_minute=None):
+        self.embeddings = embeddings
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_texts_per_request = max_texts_per_request
+        self.max_concurrency = max_concurrency
+        # Shared by every embed_documents call, so concurrent callers never exceed max_concurrency requests together
+        self._request_slots = threading.BoundedSemaphore(max_concurrency)
+        self.rate_limiter = RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+
+        self._lock = threading.Lock()
+        self.num_requests = 0
+        self.num_tokens = 0
+        self.request_time = 0.0
+        self.start_time = None
+
+    def get_batches(self, texts):
+        token_counts = [len(token_list) for token_list in self.encoding.encode_ordinary_batch(texts)]
+
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for i, num_tokens in enumerate(token_counts):
+            if len(batch) > 0 and (batch_tokens + num_tokens > self.max_tokens_per_request or
+                                   len(batch) >= self.max_texts_per_request):
+                batches.append((batch, batch_tokens))
+                batch = []
+                batch_tokens = 0
+            batch.append(i)
+            batch_tokens += num_tokens
+
+        if len(batch) > 0:
+            batches.append((batch, batch_tokens))
+
+        return batches
+
+    def embed_documents(self, texts):
+        if len(texts) == 0:
+            return []
+
+        with self._lock:
+            if self.start_time is None:
+                self.start_time = time.perf_counter()
+
+        batches = self.get_batches(texts)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            batch_vectors = list(executor.map(lambda batch: self._embed_batch(texts, *batch), batches))
+
+        vectors = [None] * len(texts)
+        for (batch, _), vector_list in zip(batches, batch_vectors):
+            for i, vector in zip(batch, vector_list):
+                vectors[i] = vector
+
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def _embed_batch(self, texts, batch, batch_tokens):
+        with self._request_slots:
+            self.rate_limiter.acquire(batch_tokens)
+
+            start_time = time.perf_counter()
+            vector_list = self.embeddings.embed_documents([texts[i] for i in batch])
+            elapsed = time.perf_counter() - start_time
+
+        with self._lock:
+            self.num_requests += 1
+            self.num_tokens += batch_tokens
+            self.request_time += elapsed
+
+        return vector_list
+
+    def get_stats(self):
+        with self._lock:
+            wall_time = time.perf_counter() - self.start_time if self.start_time is not None else 0.0
+            return {'requests': self.num_requests,
+                    'tokens': self.num_tokens,
+                    'request_time': self.request_time,
+                    'tokens_per_sec': self.num_tokens / wall_time if wall_time > 0 else 0.0,
+                    'requests_per_sec': self.num_requests / wall_time if wall_time > 0 else 0.0}
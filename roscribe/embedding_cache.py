@@ -0,0 +1,118 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    def __init__(self, cache_path, max_entries=500000):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings "
+                           "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys):
+        found = dict()
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            for i in range(0, len(unique_keys), 500):
+                key_batch = unique_keys[i:i + 500]
+                rows = self._conn.execute("SELECT key, vector FROM embeddings WHERE key IN ({})".
+                                          format(",".join("?" * len(key_batch))), key_batch).fetchall()
+                for key, vector in rows:
+                    found[key] = array('f', vector).tolist()
+
+            if len(found) > 0:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                                   [(key, array('f', vector).tobytes(), now) for key, vector in items])
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        num_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        num_evicted = num_entries - self.max_entries
+        if num_evicted > 0:
+            self._conn.execute("DELETE FROM embeddings WHERE key IN "
+                               "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (num_evicted,))
+            self._conn.commit()
+            self.evictions += num_evicted
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, cache, model_id=None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_id = model_id if model_id is not None else get_embedding_model_id(embeddings)
+
+    def embed_documents(self, texts):
+        keys = [get_cache_key(text, self.model_id) for text in texts]
+        cached_vectors = self.cache.get_many(keys)
+
+        missing = dict()
+        for key, text in zip(keys, texts):
+            if key not in cached_vectors and key not in missing:
+                missing[key] = text
+
+        if len(missing) > 0:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_items = list(zip(missing.keys(), new_vectors))
+            self.cache.put_many(new_items)
+            cached_vectors.update(new_items)
+
+        return [cached_vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+def get_embedding_model_id(embeddings):
+    model = getattr(embeddings, 'model', None)
+    if model is None:
+        return type(embeddings).__name__
+    return "{}:{}".format(type(embeddings).__name__, model)
+
+
+def get_cache_key(text, model_id):
+    return hashlib.sha256("{}\0{}".format(model_id, text).encode('utf-8')).hexdigest()
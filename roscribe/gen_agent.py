@@ -6,9 +6,9 @@ from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain.memory import ConversationBufferWindowMemory
 from langchain.chains import LLMChain
 
-from roscribe.tools import get_rag_tool, get_code_gen_tool, get_code_retrieval_tool
+from roscribe.tools import get_rag_tool, get_multi_search_tool, get_name_lookup_tool, get_code_gen_tool, get_code_retrieval_tool
 from roscribe.prompts import get_gen_agent_prompt, get_project_name_prompt
-from roscribe.spec_agent import load_spec_agent
+from roscribe.agent_state import load_spec_state, load_gen_state
 import roscribe.ui as ui
 
 
@@ -28,11 +28,13 @@ class GenAgent:
         self.ws_name = ws_name
         self.project_name = None
 
-        rag_tool = get_rag_tool(ros_distro)
+        rag_tool = get_rag_tool(ros_distro, agent_type='gen')
+        multi_search_tool = get_multi_search_tool(ros_distro, agent_type='gen')
+        name_lookup_tool = get_name_lookup_tool(ros_distro)
         code_gen_tool = get_code_gen_tool(agent=self)
         code_download_tool = get_code_retrieval_tool(agent=self)
 
-        self.tools = [rag_tool, code_gen_tool, code_download_tool]
+        self.tools = [rag_tool, multi_search_tool, name_lookup_tool, code_gen_tool, code_download_tool]
 
         self.end_conv_keyword = 'END_OF_GEN'
 
@@ -106,23 +108,7 @@ class GenAgent:
 
 
 def load_gen_agent(gen_agent_filename, spec_agent_filename):
-    loaded_spec_agent = load_spec_agent(spec_agent_filename)
-
-    with open(gen_agent_filename, 'rb') as saved_agent:
-        loaded_gen_agent_info = pickle.load(saved_agent)
-
-    loaded_gen_agent = GenAgent(ros_distro=loaded_gen_agent_info['ros_distro'],
-                                ros_graph_dict=loaded_spec_agent.get_ros_graph_dict(),
-                                ros_node_desc=loaded_spec_agent.get_ros_node_desc(),
-                                model_name=loaded_gen_agent_info['model_name'],
-                                max_interaction_limit=loaded_gen_agent_info['max_interaction_limit'],
-                                verbose=loaded_gen_agent_info['verbose'])
-
-    loaded_gen_agent.project_name = loaded_gen_agent_info['project_name']
-    loaded_gen_agent.ws_name = loaded_gen_agent_info['ws_name']
-    loaded_gen_agent.nodes = loaded_gen_agent_info['nodes']
-
-    return loaded_gen_agent
+    return load_gen_state(gen_agent_filename).to_agent(load_spec_state(spec_agent_filename))
 
 
 def ros_ws_generator(project_name, ros_ws_name):
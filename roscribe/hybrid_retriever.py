@@ -0,0 +1,139 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from roscribe.lexical_index import is_identifier_query
+from roscribe.mmr_search import mmr_search, embed_queries
+from roscribe.ros_index_repo import get_doc_id
+
+
+class HybridRetriever(BaseRetriever):
+    vectorstore: object
+    lexical_index: object = None
+    k: int = 8
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    rrf_k: int = 60
+    max_concurrency: int = 4
+    base_filter: dict = None
+    id_map: dict = None
+    dedupe_index: object = None
+    stats: object = None
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.search(query)
+
+    def search(self, query, repo_names=None):
+        if repo_names is not None:
+            if len(repo_names) == 0:
+                return []
+            repo_names = set(repo_names)
+
+        return self._timed_search(query, repo_names)
+
+    def search_many(self, queries, repo_names=None):
+        if repo_names is not None:
+            if len(repo_names) == 0:
+                return [[] for _ in queries]
+            repo_names = set(repo_names)
+
+        vector_queries = [query for query in queries if not is_identifier_query(query)]
+        query_vectors = dict()
+        if len(vector_queries) > 0:
+            start_time = time.perf_counter()
+            query_vectors = dict(zip(vector_queries, embed_queries(self.vectorstore.embeddings, vector_queries)))
+            if self.stats is not None:
+                self.stats.record({'embed_batch': time.perf_counter() - start_time})
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(queries)))) as executor:
+            return list(executor.map(lambda query: self._timed_search(query, repo_names, query_vectors.get(query)),
+                                     queries))
+
+    def _timed_search(self, query, repo_names, query_vector=None):
+        start_time = time.perf_counter()
+        docs, timings = self._search(query, repo_names, query_vector)
+        docs = self.add_duplicate_repos(docs)
+        timings['total'] = time.perf_counter() - start_time
+
+        if self.stats is not None:
+            self.stats.record(timings)
+        return docs
+
+    def _search(self, query, repo_names, query_vector=None):
+        lexical_hits = []
+        timings = dict()
+        if self.lexical_index is not None and len(self.lexical_index) > 0:
+            start_time = time.perf_counter()
+            lexical_hits = self.lexical_index.search(query, k=self.fetch_k, repo_names=repo_names)
+            timings['lexical'] = time.perf_counter() - start_time
+
+            if len(lexical_hits) > 0 and is_identifier_query(query):
+                return self.get_documents([doc_id for doc_id, _ in lexical_hits[:self.k]]), timings
+
+        vector_filter = self.get_vector_filter(repo_names)
+        vector_docs, vector_timings = mmr_search(self.vectorstore, query, k=self.k, fetch_k=self.fetch_k,
+                                                 lambda_mult=self.lambda_mult, filter=vector_filter,
+                                                 query_vector=query_vector)
+        timings.update(vector_timings)
+
+        if len(lexical_hits) == 0:
+            return vector_docs, timings
+
+        start_time = time.perf_counter()
+        fused_scores = dict()
+        fused_docs = dict()
+        for rank, (doc_id, _) in enumerate(lexical_hits):
+            fused_scores[doc_id] = fused_scores.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        for rank, doc in enumerate(vector_docs):
+            doc_id = get_document_key(doc)
+            fused_scores[doc_id] = fused_scores.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            fused_docs[doc_id] = doc
+
+        top_ids = sorted(fused_scores.keys(), key=lambda doc_id: fused_scores[doc_id], reverse=True)[:self.k]
+
+        missing_docs = self.get_documents([doc_id for doc_id in top_ids if doc_id not in fused_docs])
+        fused_docs.update((get_document_key(doc), doc) for doc in missing_docs)
+        timings['fusion'] = time.perf_counter() - start_time
+
+        return [fused_docs[doc_id] for doc_id in top_ids if doc_id in fused_docs], timings
+
+    def get_vector_filter(self, repo_names):
+        filters = []
+        if self.base_filter is not None:
+            filters.append(self.base_filter)
+        if repo_names is not None:
+            filters.append({'repo_name': {'$in': sorted(repo_names)}})
+
+        if len(filters) == 0:
+            return None
+        return filters[0] if len(filters) == 1 else {'$and': filters}
+
+    def add_duplicate_repos(self, docs):
+        if self.dedupe_index is None:
+            return docs
+
+        for doc in docs:
+            duplicate_repos = self.dedupe_index.get_duplicate_repos(get_document_key(doc))
+            if len(duplicate_repos) > 0:
+                doc.metadata = dict(doc.metadata, duplicate_repos=", ".join(duplicate_repos))
+        return docs
+
+    def get_documents(self, doc_ids):
+        if len(doc_ids) == 0:
+            return []
+
+        store_ids = [self.id_map.get(doc_id, doc_id) for doc_id in doc_ids] if self.id_map is not None else doc_ids
+        results = self.vectorstore.get(ids=store_ids, include=['documents', 'metadatas'])
+        docs = {store_id: Document(page_content=text, metadata=metadata)
+                for store_id, text, metadata in zip(results['ids'], results['documents'], results['metadatas'])}
+
+        return [docs[store_id] for store_id in store_ids if store_id in docs]
+
+
+def get_document_key(doc):
+    metadata = doc.metadata
+    if 'kind' not in metadata:
+        return "{}:{}".format(metadata.get('source'), hash(doc.page_content))
+    return get_doc_id(metadata['repo_name'], metadata['kind'], metadata['chunk'])
@@ -0,0 +1,149 @@
+"""Inspect, export, import and verify ROS index databases.
+
+Usage: roscribe-index stats noetic [--db-root ROS_index_database] [--max-chunk-chars 2000]
+       roscribe-index export noetic ros_index_noetic.rosidx [--db-root ROS_index_database]
+       roscribe-index import ros_index_noetic.rosidx [--distro noetic] [--db-root ROS_index_database]
+       roscribe-index verify ros_index_noetic.rosidx
+       roscribe-index export-compact ROS_index_database/ros_index_db_noetic [--dtype float16]
+
+A snapshot copied to ROS_index_database/ros_index_noetic.rosidx is served in place, without importing it.
+"""
+__import__('pysqlite3')
+import sys
+sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+
+import argparse
+import json
+import os
+import time
+
+from roscribe.compact_index import COMPACT_DTYPES, export_compact_index, get_compact_index_dir
+from roscribe.index_snapshot import IndexSnapshot, export_snapshot, import_snapshot
+from roscribe.index_stats import get_index_stats, open_chroma_collection
+from roscribe.sharded_index import ShardedChunkStore, get_shared_db_dir, get_shard_path, get_shard_filter,\
+    has_shared_index
+
+
+def get_db_dir(db_root, ros_distro):
+    return os.path.join(db_root, "ros_index_db_{}".format(ros_distro))
+
+
+def get_snapshot_summary(header, snapshot_path, elapsed):
+    return {'snapshot': snapshot_path,
+            'version': header['version'],
+            'ros_distro': header['ros_distro'],
+            'sharded': header['sharded'],
+            'created': header['created'],
+            'vectors': header['compact']['count'],
+            'dim': header['compact']['dim'],
+            'dtype': header['compact']['dtype'],
+            'sections': len(header['sections']),
+            'bytes': os.path.getsize(snapshot_path),
+            'seconds': round(elapsed, 3)}
+
+
+def stats_command(args):
+    db_dir = get_db_dir(args.db_root, args.distro)
+    if not os.path.isdir(db_dir):
+        raise ValueError("No ROS index database for {} in \"{}\".".format(args.distro, args.db_root))
+
+    if has_shared_index(args.db_root, args.distro):
+        store_dir = get_shared_db_dir(args.db_root)
+        shard = ShardedChunkStore(None, get_shard_path(store_dir)).get_shard(args.distro)
+        return get_index_stats(db_dir, store_dir=store_dir, ros_distro=args.distro, shard=shard,
+                               shard_filter=get_shard_filter(args.distro), max_chunk_chars=args.max_chunk_chars)
+
+    return get_index_stats(db_dir, ros_distro=args.distro, max_chunk_chars=args.max_chunk_chars)
+
+
+def export_command(args):
+    db_dir = get_db_dir(args.db_root, args.distro)
+    store_dir = get_shared_db_dir(args.db_root) if has_shared_index(args.db_root, args.distro) else db_dir
+
+    start_time = time.perf_counter()
+    header = export_snapshot(db_dir, args.snapshot, store_dir=store_dir, ros_distro=args.distro,
+                             compress_level=args.compress_level)
+    return get_snapshot_summary(header, args.snapshot, time.perf_counter() - start_time)
+
+
+def import_command(args):
+    snapshot = IndexSnapshot(args.snapshot)
+    ros_distro = args.distro or snapshot.header['ros_distro']
+    sharded = snapshot.header['sharded']
+    snapshot.close()
+    if ros_distro is None:
+        raise ValueError("\"{}\" does not name its ROS distro; pass --distro.".format(args.snapshot))
+
+    db_dir = get_db_dir(args.db_root, ros_distro)
+    store_dir = get_shared_db_dir(args.db_root) if sharded else db_dir
+
+    start_time = time.perf_counter()
+    header = import_snapshot(args.snapshot, db_dir, store_dir=store_dir)
+    return get_snapshot_summary(header, args.snapshot, time.perf_counter() - start_time)
+
+
+def verify_command(args):
+    start_time = time.perf_counter()
+    snapshot = IndexSnapshot(args.snapshot)
+    try:
+        snapshot.verify()
+    finally:
+        snapshot.close()
+    return get_snapshot_summary(snapshot.header, args.snapshot, time.perf_counter() - start_time)
+
+
+def export_compact_command(args):
+    if not os.path.isdir(args.db_dir):
+        raise ValueError("No ROS index database in \"{}\".".format(args.db_dir))
+
+    start_time = time.perf_counter()
+    header = export_compact_index(open_chroma_collection(args.db_dir), get_compact_index_dir(args.db_dir),
+                                  dtype=args.dtype)
+    return dict(header, db_dir=args.db_dir, seconds=round(time.perf_counter() - start_time, 3))
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="roscribe-index", description=__doc__.splitlines()[0])
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    stats_parser = subparsers.add_parser('stats', help="report the contents and health of a ROS index database")
+    stats_parser.add_argument('distro')
+    stats_parser.add_argument('--db-root', default="ROS_index_database")
+    stats_parser.add_argument('--max-chunk-chars', type=int, default=2000)
+    stats_parser.set_defaults(run=stats_command)
+
+    export_parser = subparsers.add_parser('export', help="write a ROS index database to one snapshot file")
+    export_parser.add_argument('distro')
+    export_parser.add_argument('snapshot')
+    export_parser.add_argument('--db-root', default="ROS_index_database")
+    export_parser.add_argument('--compress-level', type=int, default=6)
+    export_parser.set_defaults(run=export_command)
+
+    import_parser = subparsers.add_parser('import', help="unpack a snapshot file into a ROS index database")
+    import_parser.add_argument('snapshot')
+    import_parser.add_argument('--distro')
+    import_parser.add_argument('--db-root', default="ROS_index_database")
+    import_parser.set_defaults(run=import_command)
+
+    verify_parser = subparsers.add_parser('verify', help="check every checksum of a snapshot file")
+    verify_parser.add_argument('snapshot')
+    verify_parser.set_defaults(run=verify_command)
+
+    compact_parser = subparsers.add_parser('export-compact',
+                                           help="export the compact index of an existing Chroma database")
+    compact_parser.add_argument('db_dir')
+    compact_parser.add_argument('--dtype', choices=COMPACT_DTYPES, default="float16")
+    compact_parser.set_defaults(run=export_compact_command)
+
+    args = arg_parser.parse_args(argv)
+    try:
+        results = args.run(args)
+    except (OSError, ValueError) as error:
+        print("roscribe-index: {}".format(error), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
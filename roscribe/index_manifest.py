@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+
+
+class IndexManifest:
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+
+        self.repos = dict()
+        self.checkpoint = None
+
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+            self.repos = manifest.get('repos', dict())
+            self.checkpoint = manifest.get('checkpoint', None)
+
+    def is_unchanged(self, repo_struct):
+        if repo_struct.repo_name not in self.repos:
+            return False
+
+        repo_entry = self.repos[repo_struct.repo_name]
+        repo_version = repo_struct.get_repo_version()
+
+        return repo_entry['last_updated'] == repo_version['last_updated'] and \
+            repo_entry['vcs_version'] == repo_version['vcs_version']
+
+    def update_repo(self, repo_struct, doc_ids):
+        old_doc_ids = self.repos.get(repo_struct.repo_name, dict()).get('doc_ids', [])
+
+        repo_entry = repo_struct.get_repo_version()
+        repo_entry['doc_ids'] = doc_ids
+        self.repos[repo_struct.repo_name] = repo_entry
+
+        new_doc_ids = set(doc_ids)
+        return [doc_id for doc_id in old_doc_ids if doc_id not in new_doc_ids]
+
+    def invalidate_repo(self, repo_name):
+        if repo_name in self.repos:
+            self.repos[repo_name]['last_updated'] = None
+
+    def remove_repo(self, repo_name):
+        return self.repos.pop(repo_name, dict()).get('doc_ids', [])
+
+    def get_vanished_repos(self, repo_names):
+        listed_repos = set(repo_names)
+        return [repo_name for repo_name in self.repos if repo_name not in listed_repos]
+
+    def get_resume_batch(self, repo_URLs):
+        if self.checkpoint is None or self.checkpoint['listing_hash'] != get_listing_hash(repo_URLs):
+            return 0
+        return self.checkpoint['next_batch']
+
+    def set_checkpoint(self, repo_URLs, next_batch):
+        self.checkpoint = {'listing_hash': get_listing_hash(repo_URLs), 'next_batch': next_batch}
+
+    def clear_checkpoint(self):
+        self.checkpoint = None
+
+    def save(self):
+        manifest_dir = os.path.dirname(self.manifest_path)
+        if manifest_dir != '' and not os.path.exists(manifest_dir):
+            os.makedirs(manifest_dir)
+
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as manifest_file:
+            json.dump({'repos': self.repos, 'checkpoint': self.checkpoint}, manifest_file)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def get_listing_hash(repo_URLs):
+    return hashlib.sha256("\n".join(repo_URLs).encode('utf-8')).hexdigest()
@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+
+
+_STOP = object()
+
+
+class PipelineStage:
+    def __init__(self, name, func, num_workers=1):
+        self.name = name
+        self.func = func
+        self.num_workers = num_workers
+
+        self.num_items = 0
+        self.busy_time = 0.0
+
+        self._lock = threading.Lock()
+        self._active_workers = 0
+
+    def process(self, item):
+        start_time = time.perf_counter()
+        output = self.func(item)
+        elapsed = time.perf_counter() - start_time
+
+        with self._lock:
+            self.num_items += 1
+            self.busy_time += elapsed
+
+        return output
+
+    def get_stats(self):
+        return {'workers': self.num_workers, 'items': self.num_items, 'busy_time': self.busy_time}
+
+
+class StagedPipeline:
+    def __init__(self, stages, queue_size=4):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.wall_time = 0.0
+
+        self._stop_event = threading.Event()
+        self._errors = []
+
+    def run(self, items):
+        self._stop_event.clear()
+        self._errors = []
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            stage._active_workers = stage.num_workers
+            next_workers = self.stages[i + 1].num_workers if i + 1 < len(self.stages) else 1
+            for _ in range(stage.num_workers):
+                threads.append(threading.Thread(target=self._work,
+                                                args=(stage, queues[i], queues[i + 1], next_workers),
+                                                daemon=True))
+
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        outputs = []
+        while True:
+            output = self._get(queues[-1])
+            if output is _STOP:
+                break
+            outputs.append(output)
+
+        for thread in threads:
+            thread.join()
+        self.wall_time = time.perf_counter() - start_time
+
+        if len(self._errors) > 0:
+            raise self._errors[0]
+
+        return outputs
+
+    def get_stats(self):
+        return {'wall_time': self.wall_time,
+                'stages': {stage.name: stage.get_stats() for stage in self.stages}}
+
+    def _feed(self, items, out_queue):
+        try:
+            for item in items:
+                if not self._put(out_queue, item):
+                    return
+        except Exception as error:
+            self._fail(error)
+            return
+
+        for _ in range(self.stages[0].num_workers):
+            self._put(out_queue, _STOP)
+
+    def _work(self, stage, in_queue, out_queue, next_workers):
+        while not self._stop_event.is_set():
+            item = self._get(in_queue)
+            if item is _STOP:
+                break
+
+            try:
+                output = stage.process(item)
+            except Exception as error:
+                self._fail(error)
+                break
+
+            if output is not None and not self._put(out_queue, output):
+                break
+
+        with stage._lock:
+            stage._active_workers -= 1
+            last_worker = stage._active_workers == 0
+
+        if last_worker:
+            for _ in range(next_workers):
+                self._put(out_queue, _STOP)
+
+    def _fail(self, error):
+        self._errors.append(error)
+        self._stop_event.set()
+
+    def _put(self, out_queue, item):
+        while True:
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self._stop_event.is_set():
+                    return False
+
+    def _get(self, in_queue):
+        while True:
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return _STOP
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from roscribe.compact_index import CompactVectorStore, get_compact_index_dir, has_compact_index
+from roscribe.embedding_backends import DEFAULT_EMBEDDING_BACKEND
+from roscribe.ros_name_index import ROSNameIndex
+from roscribe.lexical_index import BM25Index
+from roscribe.near_duplicates import NearDuplicateIndex
+from roscribe.repo_metadata_store import RepoMetadataStore
+
+
+SNAPSHOT_MAGIC = b"ROSIDXSN"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ALIGNMENT = 64
+SNAPSHOT_PREAMBLE = struct.Struct("<8sII")
+SNAPSHOT_TRAILER = struct.Struct("<QQ8s")
+DISTRO_FILES = ("index_manifest.json", "lexical_index.json", "name_index.json", "repo_metadata.sqlite",
+                "near_duplicates.json")
+STORE_FILES = ("embedding_backend.json", "shards.json")
+
+
+class SnapshotWriter:
+    def __init__(self, snapshot_file, compress_level=6):
+        self.snapshot_file = snapshot_file
+        self.compress_level = compress_level
+        self.sections = dict()
+
+        snapshot_file.write(SNAPSHOT_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0))
+
+    def align(self):
+        padding = -self.snapshot_file.tell() % SNAPSHOT_ALIGNMENT
+        self.snapshot_file.write(b"\0" * padding)
+        return self.snapshot_file.tell()
+
+    def add_bytes(self, name, data):
+        compressed = zlib.compress(data, self.compress_level)
+        offset = self.align()
+        self.snapshot_file.write(compressed)
+        self.sections[name] = {'offset': offset, 'length': len(compressed), 'raw_length': len(data),
+                               'codec': 'zlib', 'sha256': hashlib.sha256(compressed).hexdigest()}
+
+    def add_array(self, name, array, block_rows=65536):
+        # Arrays are stored raw and aligned so that loaders can map them without copying
+        offset = self.align()
+        checksum = hashlib.sha256()
+        for start in range(0, max(len(array), 1), block_rows):
+            block = np.ascontiguousarray(array[start:start + block_rows]).tobytes()
+            checksum.update(block)
+            self.snapshot_file.write(block)
+        self.sections[name] = {'offset': offset, 'length': self.snapshot_file.tell() - offset,
+                               'codec': 'raw', 'sha256': checksum.hexdigest(),
+                               'dtype': array.dtype.str, 'shape': list(array.shape)}
+
+    def finish(self, header):
+        header = dict(header, version=SNAPSHOT_VERSION, sections=self.sections)
+        header_bytes = json.dumps(header).encode('utf-8')
+        header_offset = self.align()
+        self.snapshot_file.write(header_bytes)
+        self.snapshot_file.write(SNAPSHOT_TRAILER.pack(header_offset, len(header_bytes), SNAPSHOT_MAGIC))
+        return header
+
+
+class IndexSnapshot:
+    def __init__(self, snapshot_path):
+        self.snapshot_path = snapshot_path
+        self._file = open(snapshot_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < SNAPSHOT_PREAMBLE.size + SNAPSHOT_TRAILER.size:
+            raise ValueError("\"{}\" is not a ROS index snapshot.".format(snapshot_path))
+        magic, version, _ = SNAPSHOT_PREAMBLE.unpack_from(self._mmap, 0)
+        header_offset, header_length, end_magic = SNAPSHOT_TRAILER.unpack_from(self._mmap,
+                                                                               len(self._mmap) -
+                                                                               SNAPSHOT_TRAILER.size)
+        if magic != SNAPSHOT_MAGIC or end_magic != SNAPSHOT_MAGIC:
+            raise ValueError("\"{}\" is not a ROS index snapshot or is truncated.".format(snapshot_path))
+        if version > SNAPSHOT_VERSION:
+            raise ValueError("\"{}\" has snapshot version {}; this roscribe reads up to version {}.".
+                             format(snapshot_path, version, SNAPSHOT_VERSION))
+
+        self.header = json.loads(self._mmap[header_offset:header_offset + header_length].decode('utf-8'))
+        self.sections = self.header['sections']
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def get_raw(self, name, verify=True):
+        section = self.sections[name]
+        data = self._mmap[section['offset']:section['offset'] + section['length']]
+        if verify and hashlib.sha256(data).hexdigest() != section['sha256']:
+            raise ValueError("Checksum mismatch for \"{}\" in \"{}\".".format(name, self.snapshot_path))
+        return data
+
+    def read(self, name, verify=True):
+        data = self.get_raw(name, verify=verify)
+        return zlib.decompress(data) if self.sections[name]['codec'] == 'zlib' else data
+
+    def read_json(self, name, verify=True):
+        return json.loads(self.read(name, verify=verify).decode('utf-8'))
+
+    def get_array(self, name, verify=False):
+        section = self.sections[name]
+        if verify:
+            self.get_raw(name)
+        return np.frombuffer(self._mmap, dtype=np.dtype(section['dtype']),
+                             count=int(np.prod(section['shape'])), offset=section['offset']).reshape(section['shape'])
+
+    def verify(self):
+        for name in self.sections:
+            self.get_raw(name)
+
+    def get_version(self):
+        checksums = "\n".join("{}:{}".format(name, section['sha256'])
+                              for name, section in sorted(self.sections.items()))
+        return hashlib.sha256(checksums.encode('utf-8')).hexdigest()[:16]
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+def export_snapshot(db_dir, snapshot_path, store_dir=None, ros_distro=None, compress_level=6):
+    store_dir = store_dir or db_dir
+    if not has_compact_index(store_dir):
+        raise ValueError("\"{}\" has no compact index; rebuild it with compact_index_dtype set before exporting.".
+                         format(store_dir))
+
+    compact_dir = get_compact_index_dir(store_dir)
+    with open(os.path.join(compact_dir, "compact_index.json"), 'r') as header_file:
+        compact_header = json.load(header_file)
+
+    tmp_path = snapshot_path + ".tmp"
+    with open(tmp_path, 'wb') as snapshot_file:
+        writer = SnapshotWriter(snapshot_file, compress_level=compress_level)
+        for file_dir, file_names, prefix in ((db_dir, DISTRO_FILES, "files/"), (store_dir, STORE_FILES, "store/")):
+            for file_name in file_names:
+                file_path = os.path.join(file_dir, file_name)
+                if os.path.exists(file_path):
+                    with open(file_path, 'rb') as index_file:
+                        writer.add_bytes(prefix + file_name, index_file.read())
+
+        with open(os.path.join(compact_dir, "docs.json"), 'rb') as docs_file:
+            writer.add_bytes("compact/docs.json", docs_file.read())
+        writer.add_array("compact/vectors", np.load(os.path.join(compact_dir, "vectors.npy"), mmap_mode='r'))
+        if compact_header['dtype'] == 'int8':
+            writer.add_array("compact/scales", np.load(os.path.join(compact_dir, "scales.npy"), mmap_mode='r'))
+
+        header = writer.finish({'ros_distro': ros_distro,
+                                'sharded': os.path.abspath(store_dir) != os.path.abspath(db_dir),
+                                'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                                'compact': compact_header})
+    os.replace(tmp_path, snapshot_path)
+
+    return header
+
+
+def import_snapshot(snapshot_path, db_dir, store_dir=None):
+    store_dir = store_dir or db_dir
+    snapshot = IndexSnapshot(snapshot_path)
+    try:
+        snapshot.verify()
+        if os.path.abspath(store_dir) != os.path.abspath(db_dir):
+            check_shared_store(snapshot, store_dir)
+
+        compact_dir = get_compact_index_dir(store_dir)
+        os.makedirs(db_dir, exist_ok=True)
+        # A compact index left by an earlier import would look complete until the new header is written
+        shutil.rmtree(compact_dir, ignore_errors=True)
+        os.makedirs(compact_dir)
+        for name in snapshot.sections:
+            for prefix, file_dir in (("files/", db_dir), ("store/", store_dir)):
+                if name.startswith(prefix):
+                    write_file(os.path.join(file_dir, name[len(prefix):]), snapshot.read(name, verify=False))
+
+        write_file(os.path.join(compact_dir, "docs.json"), snapshot.read("compact/docs.json", verify=False))
+        np.save(os.path.join(compact_dir, "vectors.npy"), snapshot.get_array("compact/vectors"))
+        if "compact/scales" in snapshot:
+            np.save(os.path.join(compact_dir, "scales.npy"), snapshot.get_array("compact/scales"))
+        # The header goes last, so an interrupted import never looks like a complete compact index
+        write_file(os.path.join(compact_dir, "compact_index.json"),
+                   json.dumps(snapshot.header['compact']).encode('utf-8'))
+    finally:
+        snapshot.close()
+
+    return snapshot.header
+
+
+def load_snapshot_store(snapshot, embedding_function):
+    # Vectors stay views of the mapped snapshot, so every process serving it shares the same pages
+    scales = snapshot.get_array("compact/scales") if "compact/scales" in snapshot else None
+    return CompactVectorStore.from_arrays(snapshot.header['compact'], snapshot.read_json("compact/docs.json"),
+                                          snapshot.get_array("compact/vectors"), scales, embedding_function)
+
+
+def load_snapshot_name_index(snapshot):
+    if "files/name_index.json" not in snapshot:
+        return ROSNameIndex(None)
+    return ROSNameIndex.from_json(snapshot.read_json("files/name_index.json"))
+
+
+def load_snapshot_lexical_index(snapshot):
+    if "files/lexical_index.json" not in snapshot:
+        return BM25Index(None)
+    return BM25Index.from_json(snapshot.read_json("files/lexical_index.json"))
+
+
+def load_snapshot_near_duplicate_index(snapshot):
+    if "files/near_duplicates.json" not in snapshot:
+        return None
+    return NearDuplicateIndex.from_json(snapshot.read_json("files/near_duplicates.json"))
+
+
+def load_snapshot_metadata_store(snapshot):
+    if "files/repo_metadata.sqlite" not in snapshot:
+        return None
+    return RepoMetadataStore.from_bytes(snapshot.read("files/repo_metadata.sqlite"))
+
+
+def load_snapshot_backend_spec(snapshot):
+    if "store/embedding_backend.json" not in snapshot:
+        return {'backend': DEFAULT_EMBEDDING_BACKEND, 'options': dict()}
+    return snapshot.read_json("store/embedding_backend.json")
+
+
+def load_snapshot_shard(snapshot, ros_distro):
+    if not snapshot.header['sharded'] or "store/shards.json" not in snapshot:
+        return None
+    return snapshot.read_json("store/shards.json")['shards'].get(ros_distro, dict())
+
+
+def get_snapshot_path(db_root, ros_distro):
+    return os.path.join(db_root, "ros_index_{}.rosidx".format(ros_distro))
+
+
+def check_shared_store(snapshot, store_dir):
+    # A sharded snapshot carries the whole shared store, so it may only replace a store with the same shards
+    shard_path = os.path.join(store_dir, "shards.json")
+    if not os.path.exists(shard_path):
+        return
+
+    with open(shard_path, 'rb') as shard_file:
+        existing_shards = shard_file.read()
+    if "store/shards.json" in snapshot and snapshot.read("store/shards.json", verify=False) == existing_shards:
+        return
+
+    other_distros = sorted(set(json.loads(existing_shards.decode('utf-8'))['shards'].keys()) -
+                           {snapshot.header['ros_distro']})
+    if len(other_distros) > 0:
+        raise ValueError("\"{}\" already holds the shared store of {}; importing \"{}\" would overwrite it. "
+                         "Import it into another --db-root instead.".format(store_dir, ", ".join(other_distros),
+                                                                            snapshot.snapshot_path))
+
+
+def write_file(file_path, data):
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'wb') as out_file:
+        out_file.write(data)
+    os.replace(tmp_path, file_path)
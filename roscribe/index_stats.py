@@ -0,0 +1,181 @@
+import json
+import os
+from array import array
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import numpy as np
+from langchain_core.documents import Document
+
+from roscribe.compact_index import get_compact_index_dir, has_compact_index, iter_compact_docs
+from roscribe.context_compressor import EMPTY_TEXTS, get_doc_kind
+from roscribe.index_manifest import IndexManifest
+from roscribe.lexical_index import get_doc_repo_name
+from roscribe.near_duplicates import NearDuplicateIndex, get_near_duplicate_path
+from roscribe.ros_index_repo import get_doc_id
+
+
+CHROMA_COLLECTION_NAME = "langchain"
+MAX_EXAMPLES = 20
+
+
+class Anomalies:
+    def __init__(self, max_examples=MAX_EXAMPLES):
+        self.max_examples = max_examples
+        self.anomalies = dict()
+
+    def add(self, kind, example):
+        anomaly = self.anomalies.setdefault(kind, {'count': 0, 'examples': []})
+        anomaly['count'] += 1
+        if len(anomaly['examples']) < self.max_examples:
+            anomaly['examples'].append(example)
+
+    def get_stats(self):
+        return self.anomalies
+
+
+def iter_store_chunks(store_dir, where=None, page_size=5000):
+    if has_compact_index(store_dir):
+        for chunk_id, text, metadata in iter_compact_docs(get_compact_index_dir(store_dir)):
+            if where is None or all(metadata.get(key) == value for key, value in where.items()):
+                yield chunk_id, text, metadata
+        return
+
+    collection = open_chroma_collection(store_dir)
+    offset = 0
+    while True:
+        page = collection.get(where=where, include=['documents', 'metadatas'], limit=page_size, offset=offset)
+        if len(page['ids']) == 0:
+            return
+        yield from zip(page['ids'], page['documents'], page['metadatas'])
+        offset += len(page['ids'])
+
+
+def open_chroma_collection(store_dir):
+    # PersistentClient creates a database wherever it is pointed, so only open one that is already there
+    if not os.path.exists(os.path.join(store_dir, "chroma.sqlite3")):
+        raise ValueError("\"{}\" holds no Chroma database.".format(store_dir))
+
+    import chromadb.errors
+    try:
+        return chromadb.PersistentClient(path=store_dir).get_collection(CHROMA_COLLECTION_NAME)
+    except (ValueError, chromadb.errors.ChromaError) as error:
+        raise ValueError("\"{}\" has no \"{}\" Chroma collection: {}".format(store_dir, CHROMA_COLLECTION_NAME,
+                                                                           error)) from error
+
+
+def get_embedding_dim(store_dir):
+    if has_compact_index(store_dir):
+        with open(os.path.join(get_compact_index_dir(store_dir), "compact_index.json"), 'r') as header_file:
+            return json.load(header_file)['dim']
+
+    sample = open_chroma_collection(store_dir).peek(limit=1)
+    return len(sample['embeddings'][0]) if len(sample['ids']) > 0 else 0
+
+
+def get_stored_doc_id(chunk_id, metadata, chunk_doc_ids):
+    if chunk_id in chunk_doc_ids:
+        return chunk_doc_ids[chunk_id]
+    if 'repo_name' in metadata and 'kind' in metadata and 'chunk' in metadata:
+        return get_doc_id(metadata['repo_name'], metadata['kind'], metadata['chunk'])
+    return chunk_id
+
+
+def get_legacy_repo_name(metadata):
+    # Databases built before the manifest only carry the repository page URL and a title
+    source = metadata.get('source')
+    if source:
+        return urlsplit(source).path.rstrip('/').rsplit('/', 1)[-1]
+    title = metadata.get('title', "")
+    for separator in (" for ", " of "):
+        if separator in title:
+            return title.split(separator, 1)[1].split(",", 1)[0]
+    return "unknown"
+
+
+def get_index_stats(db_dir, store_dir=None, ros_distro=None, shard=None, shard_filter=None, max_chunk_chars=2000,
+                    page_size=5000):
+    store_dir = store_dir or db_dir
+    manifest_path = os.path.join(db_dir, "index_manifest.json")
+    has_manifest = os.path.exists(manifest_path)
+    manifest = IndexManifest(manifest_path)
+    expected_doc_ids = set(doc_id for repo_entry in manifest.repos.values() for doc_id in repo_entry['doc_ids'])
+
+    dedupe_path = get_near_duplicate_path(db_dir)
+    collapsed_doc_ids = set(NearDuplicateIndex(dedupe_path).duplicates.keys()) if os.path.exists(dedupe_path) \
+        else set()
+    chunk_doc_ids = {chunk_key: doc_id for doc_id, chunk_key in shard.items()} if shard is not None else dict()
+
+    anomalies = Anomalies()
+    repo_chunks = dict.fromkeys(manifest.repos.keys(), 0)
+    kind_chunks = dict()
+    chunk_lengths = array('I')
+    stored_doc_ids = set()
+    for chunk_id, text, metadata in iter_store_chunks(store_dir, where=shard_filter, page_size=page_size):
+        metadata = metadata or dict()
+        doc_id = get_stored_doc_id(chunk_id, metadata, chunk_doc_ids)
+        if doc_id in stored_doc_ids:
+            anomalies.add('duplicate_doc_ids', doc_id)
+        stored_doc_ids.add(doc_id)
+
+        text = text or ""
+        chunk_lengths.append(len(text))
+        if len(text.strip()) == 0 or text.strip() in EMPTY_TEXTS:
+            anomalies.add('empty_chunks', doc_id)
+        elif len(text) > max_chunk_chars:
+            anomalies.add('oversized_chunks', {'doc_id': doc_id, 'chars': len(text)})
+
+        if has_manifest:
+            if 'repo_name' not in metadata:
+                anomalies.add('missing_metadata', doc_id)
+            if doc_id not in expected_doc_ids:
+                anomalies.add('orphaned_vectors', doc_id)
+            repo_name = metadata.get('repo_name', get_doc_repo_name(doc_id))
+        else:
+            repo_name = metadata.get('repo_name') or get_legacy_repo_name(metadata)
+        repo_chunks[repo_name] = repo_chunks.get(repo_name, 0) + 1
+        kind = get_doc_kind(Document(page_content="", metadata=metadata)) or "unknown"
+        kind_chunks[kind] = kind_chunks.get(kind, 0) + 1
+
+    for doc_id in sorted(expected_doc_ids - stored_doc_ids - collapsed_doc_ids):
+        anomalies.add('missing_vectors', doc_id)
+    for repo_name in sorted(manifest.repos.keys()):
+        if repo_chunks[repo_name] == 0:
+            anomalies.add('repos_without_chunks', repo_name)
+
+    chunk_lengths = np.frombuffer(chunk_lengths, dtype=np.uint32) if len(chunk_lengths) > 0 else np.zeros(1)
+    chunks_per_repo = np.array(list(repo_chunks.values())) if len(repo_chunks) > 0 else np.zeros(1)
+    build_time = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None
+
+    return {'ros_distro': ros_distro,
+            'db_dir': db_dir,
+            'store_dir': store_dir,
+            'store': "compact" if has_compact_index(store_dir) else "chroma",
+            'build_date': datetime.fromtimestamp(build_time, timezone.utc).isoformat(timespec='seconds')
+            if build_time is not None else None,
+            'repos': len(manifest.repos) if has_manifest else len(repo_chunks),
+            'chunks': len(stored_doc_ids),
+            'collapsed_chunks': len(collapsed_doc_ids),
+            'chunks_by_kind': kind_chunks,
+            'chunks_per_repo': {'min': int(chunks_per_repo.min()),
+                                'mean': float(chunks_per_repo.mean()),
+                                'max': int(chunks_per_repo.max())},
+            'chunk_chars': {'mean': float(chunk_lengths.mean()),
+                            'p50': float(np.percentile(chunk_lengths, 50)),
+                            'p95': float(np.percentile(chunk_lengths, 95)),
+                            'max': int(chunk_lengths.max())},
+            'embedding_dim': get_embedding_dim(store_dir),
+            'disk_bytes': get_dir_size(db_dir) + (get_dir_size(store_dir) if store_dir != db_dir else 0),
+            'anomalies': anomalies.get_stats()}
+
+
+def get_dir_size(dir_name):
+    total_size = 0
+    for root, _, files in os.walk(dir_name):
+        for file in files:
+            try:
+                total_size += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+
+    return total_size
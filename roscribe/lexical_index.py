@@ -0,0 +1,104 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+
+class BM25Index:
+    def __init__(self, index_path, k1=1.5, b=0.75):
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+
+        if index_path is not None and os.path.exists(index_path):
+            with open(index_path, 'r') as index_file:
+                self.doc_terms = json.load(index_file)['docs']
+        else:
+            self.doc_terms = dict()
+
+        self._build_postings()
+
+    @classmethod
+    def from_json(cls, index_json, **kwargs):
+        lexical_index = cls(None, **kwargs)
+        lexical_index.doc_terms = index_json['docs']
+        lexical_index._build_postings()
+        return lexical_index
+
+    def _build_postings(self):
+        self._stale = False
+        self.postings = dict()
+        self.doc_lengths = dict()
+        for doc_id, term_counts in self.doc_terms.items():
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, []).append((doc_id, count))
+            self.doc_lengths[doc_id] = sum(term_counts.values())
+
+        self.avg_doc_length = sum(self.doc_lengths.values()) / len(self.doc_lengths) if len(self.doc_lengths) > 0 \
+            else 0.0
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add_documents(self, doc_ids, texts):
+        for doc_id, text in zip(doc_ids, texts):
+            self.doc_terms[doc_id] = dict(Counter(get_terms(text)))
+        self._stale = True
+
+    def delete(self, doc_ids):
+        for doc_id in doc_ids:
+            if self.doc_terms.pop(doc_id, None) is not None:
+                self._stale = True
+
+    def search(self, query, k=8, repo_names=None):
+        if self._stale:
+            self._build_postings()
+
+        num_docs = len(self.doc_lengths)
+        scores = dict()
+        for term in set(get_terms(query)):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+
+            idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, count in postings:
+                if repo_names is not None and get_doc_repo_name(doc_id) not in repo_names:
+                    continue
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * count * (self.k1 + 1) / \
+                    (count + self.k1 * length_norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w') as index_file:
+            json.dump({'docs': self.doc_terms}, index_file)
+        os.replace(tmp_path, self.index_path)
+
+
+def get_terms(text):
+    terms = []
+    for token in re.findall(r"[a-z0-9_]+(?:/[a-z0-9_]+)*", text.lower()):
+        terms.append(token)
+        if '/' in token or '_' in token:
+            terms.extend(part for part in re.split(r"[/_]", token) if len(part) > 0)
+
+    return terms
+
+
+def get_doc_repo_name(doc_id):
+    return doc_id.rsplit(':', 2)[0]
+
+
+def is_identifier_query(query):
+    query = query.strip()
+    return re.fullmatch(r"[A-Za-z0-9_/\-.:]+", query) is not None and \
+        ('_' in query or '/' in query or (query.lower() != query and query.upper() != query))
+
+
+def get_lexical_index_path(db_dir):
+    return os.path.join(db_dir, "lexical_index.json")
@@ -1,7 +1,8 @@
-from roscribe.spec_agent import SpecAgent, load_spec_agent
-from roscribe.gen_agent import GenAgent, load_gen_agent
-from roscribe.pack_agent import PackAgent, load_pack_agent
+from roscribe.spec_agent import SpecAgent
+from roscribe.gen_agent import GenAgent
+from roscribe.pack_agent import PackAgent
 from roscribe.support_agent import SupportAgent
+from roscribe.agent_state import load_spec_state, load_gen_state, load_pack_state
 
 
 def main(verbose=False):
@@ -9,24 +10,23 @@ def main(verbose=False):
 
     spec_agent = SpecAgent(ros_distro='noetic', verbose=verbose)
     spec_agent.spin()
-    loaded_spec_agent = load_spec_agent('spec_agent.pkl')
-    gen_agent = GenAgent(ros_distro='noetic', ros_graph_dict=loaded_spec_agent.get_ros_graph_dict(),
-                         ros_node_desc=loaded_spec_agent.get_ros_node_desc(), verbose=verbose)
+    spec_state = load_spec_state('spec_agent.pkl')
+    gen_agent = GenAgent(ros_distro='noetic', ros_graph_dict=spec_state.get_ros_graph_dict(),
+                         ros_node_desc=spec_state.get_ros_node_desc(), verbose=verbose)
     gen_agent.spin()
-    loaded_gen_agent = load_gen_agent('gen_agent.pkl', 'spec_agent.pkl')
-    pack_agent = PackAgent(ros_distro='noetic', ros_graph_dict=loaded_spec_agent.get_ros_graph_dict(),
-                           ros_node_desc=loaded_spec_agent.get_ros_node_desc(), ros_nodes=loaded_gen_agent.nodes,
-                           project_name=loaded_gen_agent.project_name, ws_name=loaded_gen_agent.ws_name,
+    gen_state = load_gen_state('gen_agent.pkl')
+    pack_agent = PackAgent(ros_distro='noetic', ros_graph_dict=spec_state.get_ros_graph_dict(),
+                           ros_node_desc=spec_state.get_ros_node_desc(), ros_nodes=gen_state.nodes,
+                           project_name=gen_state.project_name, ws_name=gen_state.ws_name,
                            verbose=verbose)
     pack_agent.spin()
-    loaded_pack_agent = load_pack_agent('pack_agent.pkl', 'gen_agent.pkl', 'spec_agent.pkl')
-    support_agent = SupportAgent(ros_distro='noetic', ros_graph_dict=loaded_spec_agent.get_ros_graph_dict(),
-                                 ros_nodes=loaded_gen_agent.nodes, project_name=loaded_gen_agent.project_name,
-                                 ws_name=loaded_gen_agent.ws_name, dependencies=loaded_pack_agent.dependencies,
-                                 package=loaded_pack_agent.package, verbose=verbose)
+    pack_state = load_pack_state('pack_agent.pkl')
+    support_agent = SupportAgent(ros_distro='noetic', ros_graph_dict=spec_state.get_ros_graph_dict(),
+                                 ros_nodes=gen_state.nodes, project_name=gen_state.project_name,
+                                 ws_name=gen_state.ws_name, dependencies=pack_state.dependencies,
+                                 package=pack_state.package, verbose=verbose)
     support_agent.spin()
 
 
 if __name__ == '__main__':
     main()
-
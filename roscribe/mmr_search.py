@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class RetrievalStats:
+    def __init__(self, max_records=1000):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=max_records)
+        self.num_queries = 0
+
+    def record(self, timings):
+        with self._lock:
+            self._records.append(dict(timings))
+            self.num_queries += 1
+
+    def get_stats(self):
+        with self._lock:
+            records = list(self._records)
+            stats = {'queries': self.num_queries, 'phases': dict()}
+
+        phases = sorted(set(phase for timings in records for phase in timings))
+        for phase in phases:
+            times = np.array([timings[phase] for timings in records if phase in timings]) * 1000.0
+            stats['phases'][phase] = {'mean_ms': float(times.mean()),
+                                      'p50_ms': float(np.percentile(times, 50)),
+                                      'p95_ms': float(np.percentile(times, 95))}
+
+        return stats
+
+
+def maximal_marginal_relevance(query_vector, candidate_vectors, k=4, lambda_mult=0.5):
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    if len(candidates) == 0 or k <= 0:
+        return []
+
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    candidates = candidates / np.where(norms > 0, norms, 1.0)
+
+    query_sims = candidates @ query_vector
+    selected = [int(np.argmax(query_sims))]
+    max_sims = candidates @ candidates[selected[0]]
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * query_sims - (1 - lambda_mult) * max_sims
+        scores[~available] = -np.inf
+        i = int(np.argmax(scores))
+        selected.append(i)
+        available[i] = False
+        max_sims = np.maximum(max_sims, candidates @ candidates[i])
+
+    return selected
+
+
+def get_mmr_candidates(vectorstore, query_vector, fetch_k, filter=None):
+    if hasattr(vectorstore, 'get_candidates'):
+        return vectorstore.get_candidates(query_vector, fetch_k, filter=filter)
+
+    results = vectorstore._collection.query(query_embeddings=[query_vector], n_results=fetch_k, where=filter,
+                                            include=['documents', 'metadatas', 'embeddings'])
+    docs = [Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(results['documents'][0], results['metadatas'][0])]
+
+    return docs, np.asarray(results['embeddings'][0], dtype=np.float32)
+
+
+def embed_queries(embeddings, queries):
+    if hasattr(embeddings, 'embed_queries'):
+        return embeddings.embed_queries(queries)
+    return embeddings.embed_documents(queries)
+
+
+def mmr_search(vectorstore, query, k=8, fetch_k=20, lambda_mult=0.5, filter=None, query_vector=None):
+    timings = dict()
+
+    if query_vector is None:
+        start_time = time.perf_counter()
+        query_vector = vectorstore.embeddings.embed_query(query)
+        timings['embed'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    docs, vectors = get_mmr_candidates(vectorstore, query_vector, fetch_k, filter=filter)
+    timings['search'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    selected = maximal_marginal_relevance(query_vector, vectors, k=k, lambda_mult=lambda_mult)
+    timings['rerank'] = time.perf_counter() - start_time
+
+    return [docs[i] for i in selected], timings
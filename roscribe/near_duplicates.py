@@ -0,0 +1,201 @@
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+from roscribe.lexical_index import get_doc_repo_name
+
+
+MINHASH_PRIME = 4294967311
+
+
+class MinHasher:
+    def __init__(self, num_perm=64, shingle_size=5, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+
+    def get_shingles(self, text):
+        words = re.findall(r"\w+", text.lower())
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return set(" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1))
+
+    def get_signature(self, text):
+        hashes = np.array([zlib.crc32(shingle.encode('utf-8')) for shingle in self.get_shingles(text)],
+                          dtype=np.uint64)
+        return ((np.outer(self.a, hashes) + self.b[:, None]) % np.uint64(MINHASH_PRIME)).min(axis=1)
+
+
+class NearDuplicateIndex:
+    def __init__(self, index_path, threshold=0.85, num_perm=64, num_bands=16, dedupe_kinds=('readme', 'contrib')):
+        self.index_path = index_path
+        self.threshold = threshold
+        self.num_bands = num_bands
+        self.dedupe_kinds = dedupe_kinds
+        self.hasher = MinHasher(num_perm=num_perm)
+
+        index = {'signatures': dict(), 'duplicates': dict()}
+        if index_path is not None and os.path.exists(index_path):
+            with open(index_path, 'r') as index_file:
+                index = json.load(index_file)
+        self._load(index)
+
+    @classmethod
+    def from_json(cls, index_json, **kwargs):
+        dedupe_index = cls(None, **kwargs)
+        dedupe_index._load(index_json)
+        return dedupe_index
+
+    def _load(self, index):
+        self.signatures = {doc_id: np.array(signature, dtype=np.uint64)
+                           for doc_id, signature in index['signatures'].items()}
+        self.duplicates = index['duplicates']
+        self.metadatas = index.get('metadatas', dict())
+
+        self.buckets = dict()
+        for doc_id, signature in self.signatures.items():
+            self._add_to_buckets(doc_id, signature)
+
+        self.back_refs = dict()
+        for doc_id, canonical_id in self.duplicates.items():
+            self.back_refs.setdefault(canonical_id, set()).add(doc_id)
+
+    def get_band_keys(self, signature):
+        rows = len(signature) // self.num_bands
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.num_bands)]
+
+    def _add_to_buckets(self, doc_id, signature):
+        for band_key in self.get_band_keys(signature):
+            self.buckets.setdefault(band_key, set()).add(doc_id)
+
+    def _add_canonical(self, doc_id, signature):
+        self.signatures[doc_id] = signature
+        self._add_to_buckets(doc_id, signature)
+
+    def _remove_canonical(self, doc_id):
+        signature = self.signatures.pop(doc_id, None)
+        if signature is None:
+            return False
+
+        for band_key in self.get_band_keys(signature):
+            bucket = self.buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if len(bucket) == 0:
+                    del self.buckets[band_key]
+        return True
+
+    def _add_duplicate(self, doc_id, canonical_id, metadata):
+        self.duplicates[doc_id] = canonical_id
+        self.back_refs.setdefault(canonical_id, set()).add(doc_id)
+        if metadata is not None:
+            self.metadatas[doc_id] = metadata
+
+    def _remove_duplicate(self, doc_id):
+        canonical_id = self.duplicates.pop(doc_id, None)
+        if canonical_id is not None:
+            self.back_refs[canonical_id].discard(doc_id)
+            if len(self.back_refs[canonical_id]) == 0:
+                del self.back_refs[canonical_id]
+        return self.metadatas.pop(doc_id, None)
+
+    def find(self, signature):
+        candidates = set()
+        for band_key in self.get_band_keys(signature):
+            candidates.update(self.buckets.get(band_key, ()))
+
+        # Candidates are visited in id order and ties keep the first, so rebuilds of the same input agree
+        best_id = None
+        best_similarity = self.threshold
+        for doc_id in sorted(candidates):
+            similarity = float(np.mean(self.signatures[doc_id] == signature))
+            if similarity > best_similarity or (best_id is None and similarity == best_similarity):
+                best_id = doc_id
+                best_similarity = similarity
+
+        return best_id
+
+    def assign(self, doc_ids, docs):
+        canonical_ids = []
+        demoted_ids = []
+        promotions = []
+        for doc_id, doc in zip(doc_ids, docs):
+            if doc.metadata.get('kind') not in self.dedupe_kinds:
+                canonical_ids.append(None)
+                continue
+
+            signature = self.hasher.get_signature(doc.page_content)
+            old_signature = self.signatures.get(doc_id)
+            if old_signature is not None and float(np.mean(old_signature == signature)) >= self.threshold:
+                self._remove_canonical(doc_id)
+                self._add_canonical(doc_id, signature)
+                canonical_ids.append(None)
+                continue
+
+            promotions.extend(self.remove([doc_id]))
+            canonical_id = self.find(signature)
+            if canonical_id is None:
+                self._add_canonical(doc_id, signature)
+            else:
+                self._add_duplicate(doc_id, canonical_id, doc.metadata)
+                if old_signature is not None:
+                    demoted_ids.append(doc_id)
+            canonical_ids.append(canonical_id)
+
+        # Chunks of this batch promoted by a later change in the same batch are stored with their own text
+        canonical_ids = [None if doc_id in self.signatures else canonical_id
+                         for doc_id, canonical_id in zip(doc_ids, canonical_ids)]
+        demoted_ids = [doc_id for doc_id in demoted_ids if doc_id not in self.signatures]
+
+        return canonical_ids, demoted_ids, promotions
+
+    def remove(self, doc_ids):
+        removed_ids = set(doc_ids)
+        promotions = []
+        for doc_id in doc_ids:
+            self._remove_duplicate(doc_id)
+            signature = self.signatures.get(doc_id)
+            if not self._remove_canonical(doc_id):
+                continue
+
+            # The first remaining duplicate becomes canonical and takes over the stored chunk
+            duplicate_metadatas = {duplicate_id: self._remove_duplicate(duplicate_id)
+                                   for duplicate_id in sorted(self.back_refs.get(doc_id, ()))}
+            duplicate_ids = [duplicate_id for duplicate_id in duplicate_metadatas if duplicate_id not in removed_ids]
+            if len(duplicate_ids) == 0:
+                continue
+
+            promoted_id = duplicate_ids[0]
+            self._add_canonical(promoted_id, signature)
+            for duplicate_id in duplicate_ids[1:]:
+                self._add_duplicate(duplicate_id, promoted_id, duplicate_metadatas[duplicate_id])
+            promotions.append((doc_id, promoted_id, duplicate_metadatas[promoted_id]))
+
+        return promotions
+
+    def get_duplicate_repos(self, doc_id):
+        return sorted(set(get_doc_repo_name(duplicate_id) for duplicate_id in self.back_refs.get(doc_id, ())))
+
+    def get_stats(self):
+        num_chunks = len(self.signatures) + len(self.duplicates)
+        return {'canonical_chunks': len(self.signatures),
+                'collapsed_chunks': len(self.duplicates),
+                'collapsed_ratio': len(self.duplicates) / num_chunks if num_chunks > 0 else 0.0}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w') as index_file:
+            json.dump({'signatures': {doc_id: signature.tolist() for doc_id, signature in self.signatures.items()},
+                       'duplicates': self.duplicates, 'metadatas': self.metadatas}, index_file)
+        os.replace(tmp_path, self.index_path)
+
+
+def get_near_duplicate_path(db_dir):
+    return os.path.join(db_dir, "near_duplicates.json")
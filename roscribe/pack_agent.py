@@ -9,8 +9,7 @@ from langchain.chains import LLMChain
 from roscribe.tools import get_rag_tool, get_launch_tool, get_package_tool, get_cmake_tool, get_readme_tool
 from roscribe.prompts import get_dep_prompt, get_launch_agent_prompt, get_package_agent_prompt,\
     get_cmake_agent_prompt, get_readme_agent_prompt
-from roscribe.spec_agent import load_spec_agent
-from roscribe.gen_agent import load_gen_agent
+from roscribe.agent_state import load_spec_state, load_gen_state, load_pack_state
 import roscribe.ui as ui
 
 
@@ -108,7 +107,7 @@ class PackAgent:
             file.write(self.package[file_type])
 
     def init_launch_agent(self):
-        rag_tool = get_rag_tool(self.ros_distro)
+        rag_tool = get_rag_tool(self.ros_distro, agent_type='launch')
         launch_edit_tool = get_launch_tool(agent=self)
 
         tools = [rag_tool, launch_edit_tool]
@@ -188,23 +187,5 @@ class PackAgent:
 
 
 def load_pack_agent(pack_agent_filename, gen_agent_filename, spec_agent_filename):
-    loaded_spec_agent = load_spec_agent(spec_agent_filename)
-    loaded_gen_agent = load_gen_agent(gen_agent_filename, spec_agent_filename)
-
-    with open(pack_agent_filename, 'rb') as saved_agent:
-        loaded_pack_agent_info = pickle.load(saved_agent)
-
-    loaded_pack_agent = PackAgent(ros_distro=loaded_pack_agent_info['ros_distro'],
-                                  ros_graph_dict=loaded_spec_agent.get_ros_graph_dict(),
-                                  ros_node_desc=loaded_spec_agent.get_ros_node_desc(),
-                                  model_name=loaded_pack_agent_info['model_name'],
-                                  max_interaction_limit=loaded_pack_agent_info['max_interaction_limit'],
-                                  verbose=loaded_pack_agent_info['verbose'],
-                                  project_name=loaded_gen_agent.project_name,
-                                  ros_nodes=loaded_gen_agent.nodes,
-                                  ws_name=loaded_gen_agent.ws_name)
-
-    loaded_pack_agent.package = loaded_pack_agent_info['package']
-    loaded_pack_agent.dependencies = loaded_pack_agent_info['dependencies']
-
-    return loaded_pack_agent
+    return load_pack_state(pack_agent_filename).to_agent(load_spec_state(spec_agent_filename),
+                                                         load_gen_state(gen_agent_filename))
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+
+INDEX_VERSION_FILES = ("index_manifest.json", "lexical_index.json", "chroma.sqlite3", "embedding_backend.json",
+                       "shards.json", "near_duplicates.json", os.path.join("compact", "compact_index.json"),
+                       os.path.join("compact", "vectors.npy"))
+
+
+class QueryCache:
+    def __init__(self, index_version, max_entries=256, cache_path=None, max_persistent_entries=20000):
+        self.index_version = index_version
+        self.max_entries = max_entries
+        self.cache_path = cache_path
+        self.max_persistent_entries = max_persistent_entries
+
+        self.lookups = dict()
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._conn = None
+
+        if cache_path is not None:
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS query_cache (key TEXT PRIMARY KEY, "
+                               "index_version TEXT NOT NULL, value TEXT NOT NULL, last_used REAL NOT NULL)")
+            self._conn.execute("DELETE FROM query_cache WHERE index_version != ?", (index_version,))
+            self._conn.commit()
+
+    def get_key(self, namespace, query, params):
+        return hashlib.sha256("{}\0{}\0{}\0{}".format(self.index_version, namespace, normalize_query(query),
+                                                      json.dumps(params, sort_keys=True)).encode('utf-8')).hexdigest()
+
+    def get(self, namespace, query, params):
+        key = self.get_key(namespace, query, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._count(namespace, 'memory_hits')
+                return self._entries[key]
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT value FROM query_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE query_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._conn.commit()
+                    self._count(namespace, 'disk_hits')
+                    value = json.loads(row[0])
+                    self._put_memory(key, value)
+                    return value
+
+            self._count(namespace, 'misses')
+            return None
+
+    def _count(self, namespace, outcome):
+        # Query embeddings and retrieved documents hit very differently, so each namespace is counted apart
+        lookups = self.lookups.setdefault(namespace, {'memory_hits': 0, 'disk_hits': 0, 'misses': 0})
+        lookups[outcome] += 1
+
+    def put(self, namespace, query, params, value):
+        key = self.get_key(namespace, query, params)
+        with self._lock:
+            self._put_memory(key, value)
+
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO query_cache (key, index_version, value, last_used) "
+                                   "VALUES (?, ?, ?, ?)", (key, self.index_version, json.dumps(value), time.time()))
+                self._conn.execute("DELETE FROM query_cache WHERE key IN (SELECT key FROM query_cache "
+                                   "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_persistent_entries,))
+                self._conn.commit()
+
+    def _put_memory(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_documents(self, query, params):
+        value = self.get('documents', query, params)
+        if value is None:
+            return None
+        return [Document(page_content=page_content, metadata=metadata) for page_content, metadata in value]
+
+    def put_documents(self, query, params, docs):
+        self.put('documents', query, params, [[doc.page_content, doc.metadata] for doc in docs])
+
+    def get_stats(self):
+        with self._lock:
+            stats = {'index_version': self.index_version,
+                     'entries': len(self._entries)}
+            for namespace, lookups in self.lookups.items():
+                hits = lookups['memory_hits'] + lookups['disk_hits']
+                num_lookups = hits + lookups['misses']
+                stats[namespace] = dict(lookups, hit_rate=hits / num_lookups if num_lookups > 0 else 0.0)
+            return stats
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedRetriever(BaseRetriever):
+    retriever: object
+    cache: object
+    search_params: dict = {}
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        docs = self.cache.get_documents(query, self.search_params)
+        if docs is None:
+            docs = self.retriever.invoke(query)
+            self.cache.put_documents(query, self.search_params, docs)
+        return docs
+
+
+class CachedQueryEmbeddings(Embeddings):
+    def __init__(self, embeddings, cache, model_id):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_id = model_id
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        vector = self.cache.get('embedding', text, self.model_id)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put('embedding', text, self.model_id, vector)
+        return vector
+
+    def embed_queries(self, texts):
+        vectors = [self.cache.get('embedding', text, self.model_id) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+
+        if len(missing) > 0:
+            new_vectors = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            for text, vector in new_vectors.items():
+                self.cache.put('embedding', text, self.model_id, vector)
+            vectors = [vector if vector is not None else new_vectors[text] for text, vector in zip(texts, vectors)]
+
+        return vectors
+
+
+def normalize_query(query):
+    # Only the ends are stripped: case and inner whitespace can change what a query means and how it embeds
+    return query.strip()
+
+
+def get_index_version(db_dir):
+    file_stats = []
+    for file_name in INDEX_VERSION_FILES:
+        try:
+            file_stat = os.stat(os.path.join(db_dir, file_name))
+        except OSError:
+            continue
+        file_stats.append("{}:{}:{}".format(file_name, file_stat.st_size, file_stat.st_mtime_ns))
+
+    return hashlib.sha256("\n".join(file_stats).encode('utf-8')).hexdigest()[:16]
+
+
+def get_query_cache_dir(db_root):
+    return os.path.join(db_root, "query_cache")
+
+
+def get_query_cache_path(cache_dir, cache_name):
+    return os.path.join(cache_dir, "{}.sqlite".format(cache_name))
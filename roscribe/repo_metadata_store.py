@@ -0,0 +1,139 @@
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+
+class RepoMetadataStore:
+    def __init__(self, db_path, read_only=False):
+        self.db_path = db_path
+        self.read_only = read_only
+
+        self._lock = threading.Lock()
+        if read_only:
+            # Query-time access must never create or migrate the database inside the shipped index directory
+            self._conn = sqlite3.connect("{}?mode=ro".format(Path(db_path).absolute().as_uri()), uri=True,
+                                         check_same_thread=False)
+            return
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS repos "
+                           "(repo_name TEXT PRIMARY KEY, repo_uri TEXT, checkout_uri TEXT, vcs_type TEXT, "
+                           "vcs_version TEXT, last_updated TEXT, dev_status TEXT, ci_status TEXT, released INTEGER)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS repo_tags (repo_name TEXT NOT NULL, tag TEXT NOT NULL, "
+                           "PRIMARY KEY (repo_name, tag))")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS repo_packages (repo_name TEXT NOT NULL, "
+                           "package_name TEXT NOT NULL, package_version TEXT, PRIMARY KEY (repo_name, package_name))")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS repos_dev_status ON repos (dev_status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS repos_last_updated ON repos (last_updated)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS repo_tags_tag ON repo_tags (tag)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS repo_packages_name ON repo_packages (package_name)")
+        self._conn.commit()
+
+    @classmethod
+    def from_bytes(cls, data):
+        store = cls.__new__(cls)
+        store.db_path = None
+        store.read_only = True
+        store._lock = threading.Lock()
+        store._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        if hasattr(store._conn, 'deserialize'):
+            store._conn.deserialize(data)
+            return store
+
+        # pysqlite3 builds lack deserialize, so the database is copied in through a private temporary file
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = os.path.join(tmp_dir, "repo_metadata.sqlite")
+            with open(tmp_path, 'wb') as tmp_file:
+                tmp_file.write(data)
+            source_conn = sqlite3.connect(tmp_path)
+            source_conn.backup(store._conn)
+            source_conn.close()
+        return store
+
+    def upsert_repos(self, repo_struct_list):
+        with self._lock:
+            for repo_struct in repo_struct_list:
+                self._delete_repo(repo_struct.repo_name)
+                self._conn.execute("INSERT INTO repos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (repo_struct.repo_name, repo_struct.repo_uri, repo_struct.checkout_uri,
+                                    repo_struct.vcs_type.strip().lower(), repo_struct.vcs_version,
+                                    repo_struct.last_updated,
+                                    repo_struct.dev_status.strip().upper(), repo_struct.ci_status.strip(),
+                                    int(repo_struct.released.strip().upper() == 'RELEASED')))
+                self._conn.executemany("INSERT OR IGNORE INTO repo_tags VALUES (?, ?)",
+                                       [(repo_struct.repo_name, tag) for tag in get_tags(repo_struct.tags)])
+                self._conn.executemany("INSERT OR IGNORE INTO repo_packages VALUES (?, ?, ?)",
+                                       [(repo_struct.repo_name, package[0], package[1])
+                                        for package in repo_struct.packages])
+            self._conn.commit()
+
+    def remove_repos(self, repo_names):
+        with self._lock:
+            for repo_name in repo_names:
+                self._delete_repo(repo_name)
+            self._conn.commit()
+
+    def _delete_repo(self, repo_name):
+        for table in ('repos', 'repo_tags', 'repo_packages'):
+            self._conn.execute("DELETE FROM {} WHERE repo_name = ?".format(table), (repo_name,))
+
+    def query(self, dev_status=None, released=None, tags=(), vcs_type=None, updated_after=None, package=None,
+              limit=None):
+        conditions = []
+        params = []
+        if dev_status is not None:
+            conditions.append("dev_status = ?")
+            params.append(dev_status.strip().upper())
+        if released is not None:
+            conditions.append("released = ?")
+            params.append(int(released))
+        for tag in tags:
+            conditions.append("repo_name IN (SELECT repo_name FROM repo_tags WHERE tag = ?)")
+            params.append(tag.strip().lower())
+        if vcs_type is not None:
+            conditions.append("vcs_type = ?")
+            params.append(vcs_type.strip().lower())
+        if updated_after is not None:
+            conditions.append("last_updated > ?")
+            params.append(updated_after)
+        if package is not None:
+            conditions.append("repo_name IN (SELECT repo_name FROM repo_packages WHERE package_name = ?)")
+            params.append(package.strip())
+
+        sql = "SELECT repo_name, checkout_uri, vcs_type, vcs_version, last_updated, dev_status, ci_status, " \
+              "released FROM repos"
+        if len(conditions) > 0:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY last_updated DESC"
+        if limit is not None:
+            sql += " LIMIT {}".format(int(limit))
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        return [{'repo_name': row[0], 'checkout_uri': row[1], 'vcs_type': row[2], 'vcs_version': row[3],
+                 'last_updated': row[4], 'dev_status': row[5], 'ci_status': row[6], 'released': bool(row[7])}
+                for row in rows]
+
+    def get_repo_names(self, **filters):
+        return [repo['repo_name'] for repo in self.query(**filters)]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM repos").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_tags(tag_text):
+    return sorted(set(tag.lower() for tag in re.split(r"[\s,]+", tag_text) if len(tag) > 0))
+
+
+def get_repo_metadata_path(db_dir):
+    return os.path.join(db_dir, "repo_metadata.sqlite")
@@ -1,61 +1,87 @@
-from bs4 import BeautifulSoup
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 from langchain.document_transformers import BeautifulSoupTransformer
 from roscribe.ros_index_repo import ROSIndexRepo
+from roscribe.ros_html_extractor import ROSDistroExtractor, ROSMultiDistroExtractor
 
 
 class ROSRepoTransformer:
-    def __init__(self, ros_distro):
-        self.distro_key = "distro-" + ros_distro
+    def __init__(self, ros_distro, num_workers=1, parser="html.parser"):
+        self.ros_distro = ros_distro
+        self.parser = parser
+        self.extractor = ROSDistroExtractor(ros_distro, parser=parser)
         self.remove_unnecessary_lines = BeautifulSoupTransformer.remove_unnecessary_lines
         self.no_distro_msg = "No version for distro {}. Known supported distros are highlighted in the buttons above.".\
             format(ros_distro)
 
+        self.num_workers = num_workers
+        self._executor = None
+
     def get_repo_struct(self, html_list, repo_names):
-        repo_struct_list = []
+        return [repo_struct for repo_struct in self.parse_pages(html_list, repo_names) if repo_struct is not None]
+
+    def parse_pages(self, html_list, repo_names):
+        if self.num_workers > 1:
+            return self.parse_pages_parallel(html_list, repo_names)
+
+        page_results = []
         for i, html, repo_name in zip(range(len(html_list)), html_list, repo_names):
-            soup = BeautifulSoup(html.page_content, "html.parser")
-            elements = soup.find_all("div")
-            for element in elements:
-                if self.distro_key in element.get_attribute_list('class'):
-                    if self.no_distro_msg not in element.get_text():
-                        summary_div = element.contents[1].contents[1].contents[3].contents[1].contents[1]
-                        checkout_uri = summary_div.contents[0].contents[3].get_text()
-                        vcs_type = summary_div.contents[2].contents[3].get_text()
-                        vcs_version = summary_div.contents[4].contents[3].get_text()
-                        last_updated = self.remove_line_space(summary_div.contents[6].contents[2].get_text())
-                        dev_status = self.remove_line_space(summary_div.contents[8].contents[3].get_text())
-                        ci_status = self.remove_line_space(summary_div.contents[10].contents[3].get_text(), space=False)
-                        released = self.remove_line_space(summary_div.contents[12].contents[3].get_text())
-                        tags = self.remove_line_space(summary_div.contents[14].contents[3].get_text(), space=False)
-
-                        packages = []
-                        if element.contents[1].contents[3].contents[3].contents[1].get_text() != "No packages found.":
-                            package_divs = element.contents[1].contents[3].contents[3].contents[1].contents[3].contents[
-                                           1::2]
-
-                            for package_div in package_divs:
-                                packages.append((package_div.contents[1].get_text(), package_div.contents[3].get_text()))
-
-                        readme = self.remove_unnecessary_lines(element.contents[1].contents[5].contents[3].get_text())
-                        contrib = self.remove_unnecessary_lines(element.contents[1].contents[7].contents[3].get_text())
-
-                        repo_struct_list.append(ROSIndexRepo(repo_uri=html.metadata['source'],
-                                                             repo_name=repo_name,
-                                                             checkout_uri=checkout_uri,
-                                                             vcs_type=vcs_type,
-                                                             vcs_version=vcs_version,
-                                                             last_updated=last_updated,
-                                                             dev_status=dev_status,
-                                                             ci_status=ci_status,
-                                                             released=released,
-                                                             tags=tags,
-                                                             packages=packages,
-                                                             readme=readme,
-                                                             contrib=contrib))
+            page_results.append(self.parse_repo_page(html.page_content, html.metadata['source'], repo_name))
 
             print("{} out of {} repositories have been scraped!".format(i + 1, len(html_list)))
 
-        return repo_struct_list
+        return page_results
+
+    def parse_pages_parallel(self, html_list, repo_names):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.num_workers, mp_context=get_pool_context())
+
+        worker_key = (type(self), self.ros_distro, self.parser)
+        page_args = [(worker_key, html.page_content, html.metadata['source'], repo_name)
+                     for html, repo_name in zip(html_list, repo_names)]
+        chunk_size = max(1, len(page_args) // (4 * self.num_workers))
+
+        page_results = list(self._executor.map(parse_repo_page, page_args, chunksize=chunk_size))
+        print("{} out of {} repositories have been scraped!".format(len(page_args), len(html_list)))
+
+        return page_results
+
+    def parse_repo_page(self, page_content, source, repo_name):
+        return self.get_repo_from_blocks(self.extractor.get_distro_blocks(page_content), source, repo_name)
+
+    def get_repo_from_blocks(self, distro_blocks, source, repo_name):
+        # A page may carry several blocks for one distro; the first one with a version wins
+        for distro_block in distro_blocks:
+            repo_struct = self.get_repo_from_block(distro_block, source, repo_name)
+            if repo_struct is not None:
+                return repo_struct
+        return None
+
+    def get_repo_from_block(self, distro_block, source, repo_name):
+        if distro_block is None or self.no_distro_msg in distro_block.get_text():
+            return None
+
+        repo_fields = self.extractor.get_repo_fields(distro_block)
+
+        return ROSIndexRepo(repo_uri=source,
+                            repo_name=repo_name,
+                            checkout_uri=repo_fields['checkout_uri'],
+                            vcs_type=repo_fields['vcs_type'],
+                            vcs_version=repo_fields['vcs_version'],
+                            last_updated=self.remove_line_space(repo_fields['last_updated']),
+                            dev_status=self.remove_line_space(repo_fields['dev_status']),
+                            ci_status=self.remove_line_space(repo_fields['ci_status'], space=False),
+                            released=self.remove_line_space(repo_fields['released']),
+                            tags=self.remove_line_space(repo_fields['tags'], space=False),
+                            packages=repo_fields['packages'],
+                            readme=self.remove_unnecessary_lines(repo_fields['readme']),
+                            contrib=self.remove_unnecessary_lines(repo_fields['contrib']))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
 
     @staticmethod
     def remove_line_space(input_text, line=True, space=True):
@@ -68,22 +94,96 @@ class ROSRepoTransformer:
         return input_text
 
 
+class ROSMultiDistroRepoTransformer(ROSRepoTransformer):
+    def __init__(self, ros_distros, num_workers=1, parser="html.parser"):
+        super().__init__(ros_distros[0], num_workers=num_workers, parser=parser)
+        self.ros_distro = tuple(ros_distros)
+        self.extractor = ROSMultiDistroExtractor(ros_distros, parser=parser)
+        self.distro_transformers = {ros_distro: ROSRepoTransformer(ros_distro, parser=parser)
+                                    for ros_distro in ros_distros}
+
+    def get_repo_struct(self, html_list, repo_names):
+        distro_repo_structs = {ros_distro: [] for ros_distro in self.ros_distro}
+        for page_result in self.parse_pages(html_list, repo_names):
+            for ros_distro, repo_struct in page_result.items():
+                distro_repo_structs[ros_distro].append(repo_struct)
+
+        return distro_repo_structs
+
+    def parse_repo_page(self, page_content, source, repo_name):
+        page_result = dict()
+        for ros_distro, distro_blocks in self.extractor.get_distro_blocks(page_content).items():
+            repo_struct = self.distro_transformers[ros_distro].get_repo_from_blocks(distro_blocks, source, repo_name)
+            if repo_struct is not None:
+                page_result[ros_distro] = repo_struct
+
+        return page_result
+
+
 class ROSIndexTransformer:
-    def __init__(self, ros_distro):
-        self.distro_key = "distro-" + ros_distro
+    def __init__(self, ros_distro, parser="html.parser"):
+        self.extractor = ROSDistroExtractor(ros_distro, parser=parser)
 
     def get_distro_URLs(self, html_list):
         distro_URLs = []
         distro_repo_names = []
         for i, html in enumerate(html_list):
-            soup = BeautifulSoup(html.page_content, "html.parser")
-            elements = soup.find_all("div")
-            for element in elements:
-                if self.distro_key in element.get_attribute_list('class'):
-                    all_links = element.find_all("a")
-                    for link in all_links:
-                        if '/r/' in link.get_attribute_list('href')[0]:
-                            distro_URLs.append('https://index.ros.org' + link.get_attribute_list('href')[0])
-                            distro_repo_names.append(link.get_text())
+            for distro_block in self.extractor.get_distro_blocks(html.page_content):
+                all_links = distro_block.find_all("a")
+                for link in all_links:
+                    if '/r/' in link.get_attribute_list('href')[0]:
+                        distro_URLs.append('https://index.ros.org' + link.get_attribute_list('href')[0])
+                        distro_repo_names.append(link.get_text())
 
         return distro_URLs, distro_repo_names
+
+
+class ROSMultiDistroIndexTransformer:
+    def __init__(self, ros_distros, parser="html.parser"):
+        self.ros_distros = list(ros_distros)
+        self.extractor = ROSMultiDistroExtractor(ros_distros, parser=parser)
+
+    def get_distro_URLs(self, html_list):
+        distro_links = {ros_distro: ([], []) for ros_distro in self.ros_distros}
+        for html in html_list:
+            for ros_distro, distro_blocks in self.extractor.get_distro_blocks(html.page_content).items():
+                for distro_block in distro_blocks:
+                    for link in distro_block.find_all("a"):
+                        if '/r/' in link.get_attribute_list('href')[0]:
+                            distro_links[ros_distro][0].append('https://index.ros.org' +
+                                                               link.get_attribute_list('href')[0])
+                            distro_links[ros_distro][1].append(link.get_text())
+
+        return distro_links
+
+
+def merge_distro_URLs(distro_links):
+    merged_URLs = []
+    merged_repo_names = []
+    seen_URLs = set()
+    for distro_URLs, distro_repo_names in distro_links.values():
+        for repo_URL, repo_name in zip(distro_URLs, distro_repo_names):
+            if repo_URL not in seen_URLs:
+                seen_URLs.add(repo_URL)
+                merged_URLs.append(repo_URL)
+                merged_repo_names.append(repo_name)
+
+    return merged_URLs, merged_repo_names
+
+
+def get_pool_context():
+    # The pool is started from a pipeline thread; forking while other threads hold locks can deadlock the workers
+    start_methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in start_methods else "spawn")
+
+
+_worker_transformers = dict()
+
+
+def parse_repo_page(page_args):
+    worker_key, page_content, source, repo_name = page_args
+    if worker_key not in _worker_transformers:
+        transformer_class, ros_distro, parser = worker_key
+        _worker_transformers[worker_key] = transformer_class(ros_distro, parser=parser)
+
+    return _worker_transformers[worker_key].parse_repo_page(page_content, source, repo_name)
@@ -0,0 +1,98 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml
+    FAST_HTML_PARSER = "lxml"
+except ImportError:
+    FAST_HTML_PARSER = None
+
+
+# Child index paths inside a "distro-<name>" block of an index.ros.org repository page
+SUMMARY_TABLE = (1, 1, 3, 1, 1)
+SUMMARY_FIELDS = {'checkout_uri': (0, 3),
+                  'vcs_type': (2, 3),
+                  'vcs_version': (4, 3),
+                  'last_updated': (6, 2),
+                  'dev_status': (8, 3),
+                  'ci_status': (10, 3),
+                  'released': (12, 3),
+                  'tags': (14, 3)}
+PACKAGES_PANEL = (1, 3, 3, 1)
+PACKAGES_TABLE = (3,)
+PACKAGE_NAME = (1,)
+PACKAGE_VERSION = (3,)
+README_BODY = (1, 5, 3)
+CONTRIB_BODY = (1, 7, 3)
+
+NO_PACKAGES_MSG = "No packages found."
+
+
+def get_html_parser(parser="html.parser"):
+    if parser == "fast":
+        return FAST_HTML_PARSER if FAST_HTML_PARSER is not None else "html.parser"
+    return parser
+
+
+def get_class_matcher(class_names):
+    class_names = {class_names} if isinstance(class_names, str) else set(class_names)
+
+    def match_class(class_value):
+        return class_value is not None and not class_names.isdisjoint(class_value.split())
+
+    return match_class
+
+
+def select_path(element, path):
+    for index in path:
+        element = element.contents[index]
+    return element
+
+
+class ROSDistroExtractor:
+    def __init__(self, ros_distro, parser="html.parser"):
+        self.distro_key = "distro-" + ros_distro
+        self.parser = get_html_parser(parser)
+        self.strainer = SoupStrainer("div", class_=get_class_matcher(self.distro_key))
+
+    def get_distro_blocks(self, page_content):
+        soup = BeautifulSoup(page_content, self.parser, parse_only=self.strainer)
+        return soup.find_all("div", class_=self.distro_key)
+
+    @staticmethod
+    def get_repo_fields(distro_block):
+        summary_table = select_path(distro_block, SUMMARY_TABLE)
+        repo_fields = {field: select_path(summary_table, path).get_text() for field, path in SUMMARY_FIELDS.items()}
+
+        packages = []
+        packages_panel = select_path(distro_block, PACKAGES_PANEL)
+        if packages_panel.get_text() != NO_PACKAGES_MSG:
+            for package_row in select_path(packages_panel, PACKAGES_TABLE).contents[1::2]:
+                packages.append((select_path(package_row, PACKAGE_NAME).get_text(),
+                                 select_path(package_row, PACKAGE_VERSION).get_text()))
+        repo_fields['packages'] = packages
+
+        repo_fields['readme'] = select_path(distro_block, README_BODY).get_text()
+        repo_fields['contrib'] = select_path(distro_block, CONTRIB_BODY).get_text()
+
+        return repo_fields
+
+
+class ROSMultiDistroExtractor:
+    def __init__(self, ros_distros, parser="html.parser"):
+        self.distro_keys = {"distro-" + ros_distro: ros_distro for ros_distro in ros_distros}
+        self.parser = get_html_parser(parser)
+        self.strainer = SoupStrainer("div", class_=get_class_matcher(self.distro_keys.keys()))
+
+    def get_distro_blocks(self, page_content):
+        soup = BeautifulSoup(page_content, self.parser, parse_only=self.strainer)
+
+        distro_blocks = dict()
+        for distro_block in soup.find_all("div", class_=get_class_matcher(self.distro_keys.keys())):
+            for class_name in distro_block.get_attribute_list('class'):
+                ros_distro = self.distro_keys.get(class_name)
+                if ros_distro is not None:
+                    distro_blocks.setdefault(ros_distro, []).append(distro_block)
+
+        return distro_blocks
+
+    get_repo_fields = ROSDistroExtractor.get_repo_fields
@@ -0,0 +1,238 @@
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+from langchain_core.documents import Document
+
+
+USER_AGENT = "ROScribe index builder"
+
+
+def requires_browser(page_content):
+    return "distro-" not in page_content
+
+
+def is_loader_error(page_content):
+    # AsyncChromiumLoader returns the exception text as the page instead of raising
+    return page_content.startswith("Error: ")
+
+
+class HTTPConnectionPool:
+    def __init__(self, max_connections_per_host=4, timeout=30):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._idle_connections = dict()
+        self._host_semaphores = dict()
+
+    def request(self, url, headers):
+        url_parts = urlsplit(url)
+        host_key = (url_parts.scheme, url_parts.netloc)
+        path = url_parts.path if url_parts.path != '' else '/'
+        if url_parts.query != '':
+            path += '?' + url_parts.query
+
+        with self._get_semaphore(host_key):
+            for attempt in range(2):
+                conn = self._acquire(host_key)
+                try:
+                    conn.request('GET', path, headers=headers)
+                    response = conn.getresponse()
+                    body = response.read()
+                except (http.client.HTTPException, OSError):
+                    conn.close()
+                    if attempt == 1:
+                        raise
+                    continue
+
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._release(host_key, conn)
+
+                return response.status, {key.lower(): value for key, value in response.getheaders()}, body
+
+    def close(self):
+        with self._lock:
+            for connections in self._idle_connections.values():
+                for conn in connections:
+                    conn.close()
+            self._idle_connections.clear()
+
+    def _get_semaphore(self, host_key):
+        with self._lock:
+            if host_key not in self._host_semaphores:
+                self._host_semaphores[host_key] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return self._host_semaphores[host_key]
+
+    def _acquire(self, host_key):
+        with self._lock:
+            idle_connections = self._idle_connections.get(host_key, [])
+            if len(idle_connections) > 0:
+                return idle_connections.pop()
+
+        scheme, netloc = host_key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _release(self, host_key, conn):
+        with self._lock:
+            self._idle_connections.setdefault(host_key, []).append(conn)
+
+
+class HTTPResponseCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get(self, url):
+        body_path, meta_path = self._get_paths(url)
+        if not os.path.exists(meta_path) or not os.path.exists(body_path):
+            return None, None
+
+        with open(meta_path, 'r') as meta_file:
+            meta = json.load(meta_file)
+        with open(body_path, 'rb') as body_file:
+            body = body_file.read()
+
+        return meta, body
+
+    def put(self, url, headers, body):
+        meta = {'url': url, 'etag': headers.get('etag'), 'last_modified': headers.get('last-modified')}
+        if meta['etag'] is None and meta['last_modified'] is None:
+            return
+
+        body_path, meta_path = self._get_paths(url)
+        with open(body_path + '.tmp', 'wb') as body_file:
+            body_file.write(body)
+        os.replace(body_path + '.tmp', body_path)
+        with open(meta_path + '.tmp', 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def _get_paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + '.html'), os.path.join(self.cache_dir, key + '.json')
+
+
+class ROSHTTPFetcher:
+    def __init__(self, cache_dir="ROS_index_database/http_cache", max_workers=8, max_connections_per_host=4,
+                 timeout=30, host_override=None, browser_fallback=True, needs_browser=requires_browser):
+        self.max_workers = max_workers
+        self.host_override = host_override
+        self.browser_fallback = browser_fallback
+        self.needs_browser = needs_browser
+
+        self.pool = HTTPConnectionPool(max_connections_per_host=max_connections_per_host, timeout=timeout)
+        self.cache = HTTPResponseCache(cache_dir) if cache_dir is not None else None
+
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'not_modified': 0, 'downloaded_bytes': 0, 'browser_fallbacks': 0,
+                      'errors': 0}
+
+    def load(self, urls):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            page_contents = list(executor.map(self.fetch, urls))
+
+        fetch_failed = [page_content is None for page_content in page_contents]
+        browser_urls = [url for url, page_content in zip(urls, page_contents)
+                        if page_content is None or self.needs_browser(page_content)]
+        if self.browser_fallback and len(browser_urls) > 0:
+            from langchain.document_loaders import AsyncChromiumLoader
+
+            browser_pages = {html.metadata['source']: html.page_content
+                             for html in AsyncChromiumLoader(browser_urls).load()}
+            self._count('browser_fallbacks', len(browser_urls))
+            for i, url in enumerate(urls):
+                if url not in browser_urls:
+                    continue
+                browser_page = browser_pages.get(url)
+                # A loader error or a page still missing its distro block is a failed fetch, not an empty page
+                if browser_page is None or is_loader_error(browser_page) or self.needs_browser(browser_page):
+                    fetch_failed[i] = True
+                    self._count('errors')
+                else:
+                    page_contents[i] = browser_page
+                    fetch_failed[i] = False
+
+        # Pages that could not be fetched are flagged so callers never mistake them for empty pages
+        return [Document(page_content=page_content if page_content is not None else "",
+                         metadata={'source': url, 'fetch_failed': failed})
+                for url, page_content, failed in zip(urls, page_contents, fetch_failed)]
+
+    def fetch(self, url):
+        request_url = self.get_request_url(url)
+        cached_meta, cached_body = self.cache.get(url) if self.cache is not None else (None, None)
+
+        headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip'}
+        if cached_meta is not None:
+            if cached_meta['etag'] is not None:
+                headers['If-None-Match'] = cached_meta['etag']
+            if cached_meta['last_modified'] is not None:
+                headers['If-Modified-Since'] = cached_meta['last_modified']
+
+        try:
+            for _ in range(5):
+                status, response_headers, body = self.pool.request(request_url, headers)
+                self._count('requests')
+                if status in (301, 302, 303, 307, 308) and 'location' in response_headers:
+                    request_url = urljoin(request_url, response_headers['location'])
+                    continue
+                break
+        except (http.client.HTTPException, OSError):
+            self._count('errors')
+            return None if cached_body is None else cached_body.decode('utf-8', errors='replace')
+
+        if status == 304 and cached_body is not None:
+            self._count('not_modified')
+            return cached_body.decode('utf-8', errors='replace')
+
+        if status != 200:
+            self._count('errors')
+            # A server error or rate limit says nothing about the page, so the cached copy is still served
+            if (status >= 500 or status == 429) and cached_body is not None:
+                return cached_body.decode('utf-8', errors='replace')
+            return None
+
+        if response_headers.get('content-encoding') == 'gzip':
+            try:
+                body = gzip.decompress(body)
+            except (OSError, EOFError):
+                self._count('errors')
+                return None if cached_body is None else cached_body.decode('utf-8', errors='replace')
+        self._count('downloaded_bytes', len(body))
+
+        if self.cache is not None:
+            self.cache.put(url, response_headers, body)
+
+        return body.decode('utf-8', errors='replace')
+
+    def get_request_url(self, url):
+        if self.host_override is None:
+            return url
+
+        url_parts = urlsplit(url)
+        return self.host_override.rstrip('/') + url[len(url_parts.scheme) + 3 + len(url_parts.netloc):]
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def close(self):
+        self.pool.close()
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+
+def get_failed_sources(html_list):
+    return [html.metadata['source'] for html in html_list if html.metadata.get('fetch_failed', False)]
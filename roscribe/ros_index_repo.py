@@ -1,9 +1,16 @@
+from functools import lru_cache
+
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 
 
 class ROSIndexRepo:
+    __slots__ = ('repo_uri', 'repo_name', 'checkout_uri', 'vcs_type', 'vcs_version', 'last_updated', 'dev_status',
+                 'ci_status', 'released', 'tags', 'packages', 'readme', 'contrib')
+
     def __init__(self, repo_uri, repo_name, checkout_uri, vcs_type, vcs_version, last_updated,
                  dev_status, ci_status, released, tags, packages, readme, contrib):
+        self.repo_uri = repo_uri
         self.repo_name = repo_name
         self.checkout_uri = checkout_uri
         self.vcs_type = vcs_type
@@ -13,11 +20,13 @@ class ROSIndexRepo:
         self.ci_status = ci_status
         self.released = released
         self.tags = tags
-        self.packages = packages
+        self.packages = tuple(tuple(package) for package in packages)
         self.readme = readme
         self.contrib = contrib
 
-        self.repo_metadata = {'source': repo_uri, 'language': 'en'}
+    @property
+    def repo_metadata(self):
+        return {'source': self.repo_uri, 'language': 'en', 'repo_name': self.repo_name}
 
     def get_repo_summary(self):
         ret_str = "Repository summary for {repo_name}:\nCheckout URI: {checkout_uri}\nVCS Type: {vcs_type}\n" \
@@ -32,11 +41,10 @@ class ROSIndexRepo:
                                                                                       released=self.released,
                                                                                       tags=self.tags)
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=400000, chunk_overlap=0)
-        summary_doc_list = text_splitter.create_documents(texts=[ret_str], metadatas=[self.repo_metadata])
-        summary_doc_list[0].metadata['title'] = "Repository summary for {repo_name}".format(repo_name=self.repo_name)
+        summary_doc = self.create_single_doc(ret_str, "Repository summary for {repo_name}".
+                                             format(repo_name=self.repo_name), 'summary')
 
-        return summary_doc_list
+        return [summary_doc]
 
     def get_repo_packages(self):
         ret_str = ""
@@ -47,14 +55,13 @@ class ROSIndexRepo:
         else:
             ret_str += "No packages available for {repo_name}.".format(repo_name=self.repo_name)
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=400000, chunk_overlap=0)
-        package_doc_list = text_splitter.create_documents(texts=[ret_str], metadatas=[self.repo_metadata])
-        package_doc_list[0].metadata['title'] = "ROS packages for {repo_name}".format(repo_name=self.repo_name)
+        package_doc = self.create_single_doc(ret_str, "ROS packages for {repo_name}".
+                                             format(repo_name=self.repo_name), 'packages')
 
-        return package_doc_list
+        return [package_doc]
 
     def get_repo_readme(self, chunk_size=500, chunk_overlap=0):
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        text_splitter = get_text_splitter(chunk_size, chunk_overlap)
         readme_doc_list = text_splitter.create_documents(texts=[self.readme], metadatas=[self.repo_metadata])
         if len(readme_doc_list) > 1:
             for i, split in enumerate(readme_doc_list):
@@ -62,14 +69,14 @@ class ROSIndexRepo:
                                                                                           part_num=i+1)
         else:
             if len(readme_doc_list) == 0:
-                readme_doc_list = text_splitter.create_documents(texts=["No README found."],
-                                                                 metadatas=[self.repo_metadata])
+                readme_doc_list = [Document(page_content="No README found.", metadata=self.repo_metadata)]
             readme_doc_list[0].metadata['title'] = "README of {repo_name}".format(repo_name=self.repo_name)
 
+        set_doc_kind(readme_doc_list, 'readme')
         return readme_doc_list
 
     def get_repo_contrib(self, chunk_size=500, chunk_overlap=0):
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        text_splitter = get_text_splitter(chunk_size, chunk_overlap)
         contrib_doc_list = text_splitter.create_documents(texts=[self.contrib], metadatas=[self.repo_metadata])
         if len(contrib_doc_list) > 1:
             for i, split in enumerate(contrib_doc_list):
@@ -77,17 +84,52 @@ class ROSIndexRepo:
                     format(repo_name=self.repo_name, part_num=i + 1)
         else:
             if len(contrib_doc_list) == 0:
-                contrib_doc_list = text_splitter.create_documents(texts=["No Contributing found."],
-                                                                  metadatas=[self.repo_metadata])
+                contrib_doc_list = [Document(page_content="No Contributing found.", metadata=self.repo_metadata)]
             contrib_doc_list[0].metadata['title'] = "Contributing information of {repo_name}".\
                 format(repo_name=self.repo_name)
 
+        set_doc_kind(contrib_doc_list, 'contrib')
         return contrib_doc_list
 
+    def get_repo_version(self):
+        return {'last_updated': self.last_updated, 'vcs_version': self.vcs_version}
+
+    def create_single_doc(self, text, title, doc_kind):
+        metadata = self.repo_metadata
+        metadata['title'] = title
+        metadata['kind'] = doc_kind
+        metadata['chunk'] = 0
+        return Document(page_content=text.strip(), metadata=metadata)
+
+    def iter_repo_docs(self, chunk_size=500, chunk_overlap=0, release_text=False):
+        yield from self.get_repo_summary()
+        yield from self.get_repo_packages()
+        yield from self.get_repo_readme(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        if release_text:
+            self.readme = None
+        yield from self.get_repo_contrib(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        if release_text:
+            self.contrib = None
+
     def get_all_repo_info(self, chunk_size=500, chunk_overlap=0):
-        all_repo_docs = []
-        all_repo_docs.extend(self.get_repo_summary())
-        all_repo_docs.extend(self.get_repo_packages())
-        all_repo_docs.extend(self.get_repo_readme(chunk_size=chunk_size, chunk_overlap=chunk_overlap))
-        all_repo_docs.extend(self.get_repo_contrib(chunk_size=chunk_size, chunk_overlap=chunk_overlap))
-        return all_repo_docs
+        return list(self.iter_repo_docs(chunk_size=chunk_size, chunk_overlap=chunk_overlap))
+
+
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_size, chunk_overlap):
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def set_doc_kind(doc_list, doc_kind):
+    for i, doc in enumerate(doc_list):
+        doc.metadata['kind'] = doc_kind
+        doc.metadata['chunk'] = i
+
+
+def get_doc_id(repo_name, doc_kind, chunk_index):
+    return "{repo_name}:{doc_kind}:{chunk_index}".format(repo_name=repo_name, doc_kind=doc_kind,
+                                                         chunk_index=chunk_index)
+
+
+def get_doc_ids(doc_list):
+    return [get_doc_id(doc.metadata['repo_name'], doc.metadata['kind'], doc.metadata['chunk']) for doc in doc_list]
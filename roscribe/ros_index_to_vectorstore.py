@@ -2,50 +2,473 @@ __import__('pysqlite3')
 import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
+import math
+import os
+import shutil
+import threading
 from datetime import date
 
-from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import Chroma
 from langchain.document_loaders import AsyncChromiumLoader
+from langchain_core.documents import Document
 
-from roscribe.ros_bs_transformer import ROSIndexTransformer, ROSRepoTransformer
+from roscribe.ros_bs_transformer import ROSMultiDistroIndexTransformer, ROSMultiDistroRepoTransformer,\
+    merge_distro_URLs
+from roscribe.ros_index_repo import get_doc_ids
+from roscribe.embedding_cache import EmbeddingCache, CachedEmbeddings, get_embedding_model_id
+from roscribe.embedding_batcher import TokenBatchedEmbeddings
+from roscribe.embedding_backends import get_embedding_backend, is_remote_backend, check_backend_spec,\
+    save_backend_spec
+from roscribe.index_manifest import IndexManifest
+from roscribe.ros_name_index import ROSNameIndex, get_name_index_path
+from roscribe.lexical_index import BM25Index, get_lexical_index_path, get_doc_repo_name
+from roscribe.near_duplicates import NearDuplicateIndex, get_near_duplicate_path
+from roscribe.compact_index import export_compact_index, get_compact_index_dir
+from roscribe.sharded_index import ShardedChunkStore, SHARED_DB_NAME, get_shard_path
+from roscribe.repo_metadata_store import RepoMetadataStore, get_repo_metadata_path
+from roscribe.index_pipeline import PipelineStage, StagedPipeline
+from roscribe.index_snapshot import DISTRO_FILES
+from roscribe.ros_http_fetcher import ROSHTTPFetcher, get_failed_sources
 
 
 num_pages = 5
-ros_version = 'noetic'
+ros_versions = ['noetic']
 URL_batch_size = 10
+incremental = True
+embedding_backend = "openai"
+embedding_backend_options = dict()
+embedding_cache_path = "ROS_index_database/embedding_cache.sqlite"
+embedding_cache_size = 500000
+stage_workers = {'fetch': 2, 'parse': 1, 'chunk': 1, 'dedupe': 1, 'embed': 2, 'upsert': 1}
+stage_queue_size = 4
+parse_processes = 4
+html_parser = "html.parser"
+fetch_backend = "http"
+http_cache_dir = "ROS_index_database/http_cache"
+embedding_max_tokens_per_request = 8000
+embedding_max_concurrency = 4
+embedding_requests_per_minute = 3000
+embedding_tokens_per_minute = 1000000
+compact_index_dtype = "float16"
+sharded_index = False
+near_duplicate_threshold = 0.85
 
-# Load ROS Index
-loader = AsyncChromiumLoader(["https://index.ros.org/repos/page/{i}/time/".format(i=page)
-                              for page in range(1, num_pages + 1)])
-html_list = loader.load()
 
-# Collect ROS Repositories
-ros_index_transformer = ROSIndexTransformer(ros_version)
-repo_URLs, repo_names = ros_index_transformer.get_distro_URLs(html_list)
+def load_pages(urls, fetcher=None):
+    if fetcher is not None:
+        return fetcher.load(urls)
 
-# Initialize Database
-db_name = "ros_index_db_{}_".format(ros_version) + str(date.today()).replace("-", "_")
-vectorstore = Chroma(embedding_function=OpenAIEmbeddings(), persist_directory="ROS_index_database/" + db_name)
-print("A ChromaDB object has been initialized!")
+    loader = AsyncChromiumLoader(urls)
+    return loader.load()
 
-# Load ROS Repositories
-ros_repo_transformer = ROSRepoTransformer(ros_version)
-for i in range(int(len(repo_URLs) / URL_batch_size)):
-# for i in range(40, 45):
-    loader = AsyncChromiumLoader(repo_URLs[i*URL_batch_size:(i+1)*URL_batch_size])
-    html_list = loader.load()
-    repo_struct_list = ros_repo_transformer.get_repo_struct(html_list,
-                                                            repo_names[i*URL_batch_size:(i+1)*URL_batch_size])
 
-    if len(repo_struct_list) > 0:
-        repo_docs = []
-        for repo_struct in repo_struct_list:
-            repo_docs.extend(repo_struct.get_all_repo_info())
+def get_db_name(ros_distro, incremental_build):
+    if incremental_build:
+        return "ros_index_db_{}".format(ros_distro)
+    return "ros_index_db_{}_".format(ros_distro) + str(date.today()).replace("-", "_")
 
-        # Database Update
-        vectorstore.add_documents(documents=repo_docs)
 
-    print("{}-th batch has been scraped!".format(i+1))
+class DistroIndex:
+    def __init__(self, ros_distro, repo_names, vectorstore, manifest, name_index, lexical_index, metadata_store,
+                 chunk_store=None, dedupe_index=None):
+        self.ros_distro = ros_distro
+        self.repo_names = repo_names
+        self.listed_repos = set(repo_names)
+        self.vectorstore = vectorstore
+        self.manifest = manifest
+        self.name_index = name_index
+        self.lexical_index = lexical_index
+        self.metadata_store = metadata_store
+        self.chunk_store = chunk_store
+        self.dedupe_index = dedupe_index
+        self.invalidated_repos = set()
 
-print("A ChromaDB object has been stored in \"{}\"!".format(db_name))
+    def dedupe_docs(self, doc_ids, docs):
+        if self.dedupe_index is None:
+            return doc_ids, docs, [], []
+
+        canonical_ids, demoted_ids, promotions = self.dedupe_index.assign(doc_ids, docs)
+        kept = [(doc_id, doc) for doc_id, doc, canonical_id in zip(doc_ids, docs, canonical_ids)
+                if canonical_id is None]
+        return [doc_id for doc_id, _ in kept], [doc for _, doc in kept], demoted_ids, promotions
+
+    def promote_docs(self, promotions):
+        for source_id, doc_id, metadata in promotions:
+            stored_chunk = self.get_stored_chunk(source_id)
+            if stored_chunk is None or metadata is None:
+                # Without a stored copy the chunk is re-embedded when its repository is indexed again
+                self.invalidated_repos.add(get_doc_repo_name(doc_id))
+                continue
+
+            text, embedding = stored_chunk
+            self.upsert_docs([doc_id], [Document(page_content=text, metadata=metadata)], [embedding])
+
+    def get_stored_chunk(self, doc_id):
+        store_id = self.chunk_store.get_shard(self.ros_distro).get(doc_id) if self.chunk_store is not None \
+            else doc_id
+        if store_id is None:
+            return None
+
+        results = self.vectorstore._collection.get(ids=[store_id], include=['documents', 'embeddings'])
+        if len(results['ids']) == 0:
+            return None
+        return results['documents'][0], [float(value) for value in results['embeddings'][0]]
+
+    def apply_invalidations(self):
+        for repo_name in self.invalidated_repos:
+            self.manifest.invalidate_repo(repo_name)
+        return len(self.invalidated_repos)
+
+    def upsert_docs(self, doc_ids, docs, embeddings):
+        if self.chunk_store is not None:
+            self.chunk_store.upsert(self.ros_distro, doc_ids, docs, embeddings)
+        else:
+            self.vectorstore._collection.upsert(ids=doc_ids, embeddings=embeddings,
+                                                metadatas=[doc.metadata for doc in docs],
+                                                documents=[doc.page_content for doc in docs])
+        self.lexical_index.add_documents(doc_ids, [doc.page_content for doc in docs])
+
+    def delete_docs(self, doc_ids):
+        if self.dedupe_index is not None:
+            self.promote_docs(self.dedupe_index.remove(doc_ids))
+        self.delete_stored_docs(doc_ids)
+
+    def delete_stored_docs(self, doc_ids):
+        if self.chunk_store is not None:
+            self.chunk_store.delete(self.ros_distro, doc_ids)
+        else:
+            self.vectorstore.delete(ids=doc_ids)
+        self.lexical_index.delete(doc_ids)
+
+    def save(self):
+        self.manifest.save()
+        self.name_index.save()
+        self.lexical_index.save()
+        if self.chunk_store is not None:
+            self.chunk_store.save()
+        if self.dedupe_index is not None:
+            self.dedupe_index.save()
+
+
+class ROSIndexBuild:
+    def __init__(self, repo_URLs, repo_names, distro_indexes, embeddings, incremental_build,
+                 num_parse_workers=1, parser="html.parser", fetcher=None):
+        self.repo_URLs = repo_URLs
+        self.repo_names = repo_names
+        self.distro_indexes = distro_indexes
+        self.embeddings = embeddings
+        self.incremental_build = incremental_build
+        self.fetcher = fetcher
+
+        self.ros_repo_transformer = ROSMultiDistroRepoTransformer(list(distro_indexes.keys()),
+                                                                  num_workers=num_parse_workers, parser=parser)
+
+        self.num_skipped = 0
+        self.failed_repos = set()
+        self.next_batch = min(distro_index.manifest.get_resume_batch(repo_URLs)
+                              for distro_index in distro_indexes.values()) if incremental_build else 0
+        self.completed_batches = set()
+        self._lock = threading.Lock()
+
+    def get_batches(self, batch_size):
+        for i in range(self.next_batch, math.ceil(len(self.repo_URLs) / batch_size)):
+            yield {'index': i,
+                   'urls': self.repo_URLs[i*batch_size:(i+1)*batch_size],
+                   'names': self.repo_names[i*batch_size:(i+1)*batch_size]}
+
+    def get_stages(self, stage_workers):
+        return [PipelineStage('fetch', self.fetch, stage_workers['fetch']),
+                PipelineStage('parse', self.parse, stage_workers['parse']),
+                PipelineStage('chunk', self.chunk, stage_workers['chunk']),
+                PipelineStage('dedupe', self.dedupe, stage_workers['dedupe']),
+                PipelineStage('embed', self.embed, stage_workers['embed']),
+                PipelineStage('upsert', self.upsert, stage_workers['upsert'])]
+
+    def fetch(self, batch):
+        batch['html_list'] = load_pages(batch['urls'], fetcher=self.fetcher)
+
+        failed_URLs = set(get_failed_sources(batch['html_list']))
+        if len(failed_URLs) > 0:
+            failed_repos = [repo_name for repo_URL, repo_name in zip(batch['urls'], batch['names'])
+                            if repo_URL in failed_URLs]
+            with self._lock:
+                self.failed_repos.update(failed_repos)
+            print("Could not fetch {}; their indexed chunks are kept.".format(", ".join(failed_repos)))
+
+        return batch
+
+    def parse(self, batch):
+        distro_repo_structs = self.ros_repo_transformer.get_repo_struct(batch.pop('html_list'), batch['names'])
+
+        batch['repo_structs'] = dict()
+        for ros_distro, repo_struct_list in distro_repo_structs.items():
+            distro_index = self.distro_indexes[ros_distro]
+            repo_struct_list = [repo_struct for repo_struct in repo_struct_list
+                                if repo_struct.repo_name in distro_index.listed_repos]
+
+            if self.incremental_build:
+                changed_repo_list = [repo_struct for repo_struct in repo_struct_list
+                                     if not distro_index.manifest.is_unchanged(repo_struct)]
+                with self._lock:
+                    self.num_skipped += len(repo_struct_list) - len(changed_repo_list)
+                repo_struct_list = changed_repo_list
+
+            batch['repo_structs'][ros_distro] = repo_struct_list
+
+        return batch
+
+    def chunk(self, batch):
+        batch['docs'] = dict()
+        batch['repo_doc_ids'] = dict()
+        for ros_distro, repo_struct_list in batch['repo_structs'].items():
+            batch['docs'][ros_distro] = []
+            batch['repo_doc_ids'][ros_distro] = []
+            for repo_struct in repo_struct_list:
+                docs = list(repo_struct.iter_repo_docs(release_text=True))
+                batch['docs'][ros_distro].extend(docs)
+                batch['repo_doc_ids'][ros_distro].append(get_doc_ids(docs))
+        return batch
+
+    def dedupe(self, batch):
+        batch['doc_ids'] = dict()
+        batch['demoted_doc_ids'] = dict()
+        batch['promotions'] = dict()
+        with self._lock:
+            for ros_distro, distro_index in self.distro_indexes.items():
+                doc_ids = [doc_id for doc_ids in batch['repo_doc_ids'][ros_distro] for doc_id in doc_ids]
+                batch['doc_ids'][ros_distro], batch['docs'][ros_distro], batch['demoted_doc_ids'][ros_distro], \
+                    batch['promotions'][ros_distro] = distro_index.dedupe_docs(doc_ids, batch['docs'][ros_distro])
+        return batch
+
+    def embed(self, batch):
+        # Repositories released for several distros share most of their chunks, so each text is embedded once
+        unique_texts = list(dict.fromkeys(doc.page_content for docs in batch['docs'].values() for doc in docs))
+        text_embeddings = dict(zip(unique_texts, self.embeddings.embed_documents(unique_texts)))
+
+        batch['embeddings'] = dict()
+        for ros_distro, docs in batch['docs'].items():
+            batch['embeddings'][ros_distro] = [text_embeddings[doc.page_content] for doc in docs]
+        return batch
+
+    def upsert(self, batch):
+        with self._lock:
+            for ros_distro, distro_index in self.distro_indexes.items():
+                docs = batch['docs'][ros_distro]
+
+                # Database Update
+                distro_index.promote_docs(batch['promotions'][ros_distro])
+                if len(batch['demoted_doc_ids'][ros_distro]) > 0:
+                    distro_index.delete_stored_docs(batch['demoted_doc_ids'][ros_distro])
+                if len(docs) > 0:
+                    distro_index.upsert_docs(batch['doc_ids'][ros_distro], docs, batch['embeddings'][ros_distro])
+
+                stale_doc_ids = []
+                for repo_struct, doc_ids in zip(batch['repo_structs'][ros_distro],
+                                                batch['repo_doc_ids'][ros_distro]):
+                    stale_doc_ids.extend(distro_index.manifest.update_repo(repo_struct, doc_ids))
+                    distro_index.name_index.add_repo(repo_struct)
+                if len(stale_doc_ids) > 0:
+                    distro_index.delete_docs(stale_doc_ids)
+                distro_index.metadata_store.upsert_repos(batch['repo_structs'][ros_distro])
+
+            self.completed_batches.add(batch['index'])
+            while self.next_batch in self.completed_batches:
+                self.completed_batches.remove(self.next_batch)
+                self.next_batch += 1
+
+            for distro_index in self.distro_indexes.values():
+                distro_index.manifest.set_checkpoint(self.repo_URLs, self.next_batch)
+                distro_index.save()
+
+        print("{}-th batch has been scraped!".format(batch['index'] + 1))
+        return batch['index']
+
+    def remove_vanished_repos(self):
+        num_vanished = 0
+        for distro_index in self.distro_indexes.values():
+            vanished_repos = [repo_name
+                              for repo_name in distro_index.manifest.get_vanished_repos(distro_index.repo_names)
+                              if repo_name not in self.failed_repos]
+            for repo_name in vanished_repos:
+                vanished_doc_ids = distro_index.manifest.remove_repo(repo_name)
+                distro_index.name_index.remove_repo(repo_name)
+                if len(vanished_doc_ids) > 0:
+                    distro_index.delete_docs(vanished_doc_ids)
+            distro_index.metadata_store.remove_repos(vanished_repos)
+            num_vanished += len(vanished_repos)
+
+        return num_vanished
+
+
+def get_listing_URLs(num_listing_pages):
+    return ["https://index.ros.org/repos/page/{i}/time/".format(i=page) for page in range(1, num_listing_pages + 1)]
+
+
+def open_distro_indexes(ros_distros, distro_links, db_root, embeddings, incremental_build, backend, backend_options,
+                        chunk_store=None, dedupe_threshold=None):
+    distro_indexes = dict()
+    for ros_distro in ros_distros:
+        db_dir = os.path.join(db_root, get_db_name(ros_distro, incremental_build))
+        if chunk_store is not None:
+            os.makedirs(db_dir, exist_ok=True)
+            vectorstore = chunk_store.vectorstore
+        else:
+            check_backend_spec(db_dir, backend, backend_options)
+            save_backend_spec(db_dir, backend, backend_options)
+            vectorstore = Chroma(embedding_function=embeddings, persist_directory=db_dir)
+        manifest = IndexManifest(os.path.join(db_dir, "index_manifest.json"))
+        if len(manifest.repos) > 0 and vectorstore._collection.count() == 0:
+            # An imported snapshot has a manifest but no Chroma data; skipping its repos would export an empty index
+            print("The index for {} has a manifest but no stored vectors; rebuilding it from scratch!".
+                  format(ros_distro))
+            reset_distro_files(db_dir)
+            if chunk_store is not None:
+                chunk_store.shards.pop(ros_distro, None)
+            manifest = IndexManifest(os.path.join(db_dir, "index_manifest.json"))
+        name_index = ROSNameIndex(get_name_index_path(db_dir))
+        lexical_index = BM25Index(get_lexical_index_path(db_dir))
+        metadata_store = RepoMetadataStore(get_repo_metadata_path(db_dir))
+        dedupe_index = NearDuplicateIndex(get_near_duplicate_path(db_dir), threshold=dedupe_threshold) \
+            if dedupe_threshold is not None else None
+        distro_indexes[ros_distro] = DistroIndex(ros_distro, distro_links[ros_distro][1], vectorstore, manifest,
+                                                 name_index, lexical_index, metadata_store, chunk_store=chunk_store,
+                                                 dedupe_index=dedupe_index)
+        if chunk_store is None:
+            print("A ChromaDB object has been initialized for {}!".format(ros_distro))
+
+    return distro_indexes
+
+
+def reset_distro_files(db_dir):
+    for file_name in DISTRO_FILES:
+        file_path = os.path.join(db_dir, file_name)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    shutil.rmtree(get_compact_index_dir(db_dir), ignore_errors=True)
+
+
+def build_index(listing_URLs, ros_distros, embeddings, db_root="ROS_index_database", fetcher=None,
+                incremental_build=True, backend=embedding_backend, backend_options=embedding_backend_options,
+                sharded=sharded_index, compact_dtype=compact_index_dtype, dedupe_threshold=near_duplicate_threshold,
+                batch_size=URL_batch_size, workers=stage_workers, queue_size=stage_queue_size,
+                num_parse_workers=parse_processes, parser=html_parser):
+    # Load ROS Index
+    html_list = load_pages(listing_URLs, fetcher=fetcher)
+    failed_URLs = get_failed_sources(html_list)
+    if len(failed_URLs) > 0:
+        # Every repository missing from a listing page would otherwise be removed as vanished
+        raise RuntimeError("Could not fetch the ROS index listing pages {}; the index has not been updated.".
+                           format(", ".join(failed_URLs)))
+
+    # Collect ROS Repositories
+    ros_index_transformer = ROSMultiDistroIndexTransformer(ros_distros, parser=parser)
+    distro_links = ros_index_transformer.get_distro_URLs(html_list)
+    repo_URLs, repo_names = merge_distro_URLs(distro_links)
+
+    # Initialize Databases
+    chunk_store = None
+    if sharded:
+        shared_db_dir = os.path.join(db_root, SHARED_DB_NAME)
+        check_backend_spec(shared_db_dir, backend, backend_options)
+        save_backend_spec(shared_db_dir, backend, backend_options)
+        shared_vectorstore = Chroma(embedding_function=embeddings, persist_directory=shared_db_dir)
+        chunk_store = ShardedChunkStore(shared_vectorstore, get_shard_path(shared_db_dir))
+        print("A shared ChromaDB object has been initialized for {}!".format(", ".join(ros_distros)))
+
+    distro_indexes = open_distro_indexes(ros_distros, distro_links, db_root, embeddings, incremental_build, backend,
+                                         backend_options, chunk_store=chunk_store, dedupe_threshold=dedupe_threshold)
+
+    # Load ROS Repositories
+    index_build = ROSIndexBuild(repo_URLs, repo_names, distro_indexes, embeddings, incremental_build,
+                                num_parse_workers=num_parse_workers, parser=parser, fetcher=fetcher)
+    if index_build.next_batch > 0:
+        print("Resuming from the {}-th batch!".format(index_build.next_batch + 1))
+
+    pipeline = StagedPipeline(index_build.get_stages(workers), queue_size=queue_size)
+    try:
+        pipeline.run(index_build.get_batches(batch_size))
+    finally:
+        index_build.ros_repo_transformer.close()
+
+    if incremental_build:
+        num_vanished = index_build.remove_vanished_repos()
+        print("{} unchanged repositories skipped, {} vanished repositories removed!".
+              format(index_build.num_skipped, num_vanished))
+    if len(index_build.failed_repos) > 0:
+        print("{} repositories could not be fetched and were left as they were!".format(len(index_build.failed_repos)))
+
+    for ros_distro, distro_index in distro_indexes.items():
+        num_invalidated = distro_index.apply_invalidations()
+        distro_index.manifest.clear_checkpoint()
+        distro_index.save()
+        distro_index.metadata_store.close()
+        if distro_index.dedupe_index is not None:
+            print("Near-duplicates for {}: {}, {} repositories queued for re-indexing".format(
+                ros_distro, distro_index.dedupe_index.get_stats(), num_invalidated))
+        if chunk_store is not None:
+            continue
+        print("A ChromaDB object has been stored in \"{}\"!".format(get_db_name(ros_distro, incremental_build)))
+
+        db_dir = os.path.join(db_root, get_db_name(ros_distro, incremental_build))
+        if compact_dtype is not None:
+            header = export_compact_index(distro_index.vectorstore._collection, get_compact_index_dir(db_dir),
+                                          dtype=compact_dtype)
+            print("A compact {} index with {} vectors has been exported for {}!".format(header['dtype'],
+                                                                                        header['count'], ros_distro))
+        else:
+            # Queries prefer a compact index, so one left by an earlier build would serve stale vectors
+            shutil.rmtree(get_compact_index_dir(db_dir), ignore_errors=True)
+
+    if chunk_store is not None:
+        chunk_store.save()
+        print("A shared ChromaDB object has been stored in \"{}\"!".format(SHARED_DB_NAME))
+        print("Shards: {}".format(chunk_store.get_stats()))
+
+        if compact_dtype is not None:
+            header = export_compact_index(chunk_store.vectorstore._collection, get_compact_index_dir(shared_db_dir),
+                                          dtype=compact_dtype)
+            print("A compact {} index with {} vectors has been exported for the shared store!".format(
+                header['dtype'], header['count']))
+        else:
+            shutil.rmtree(get_compact_index_dir(shared_db_dir), ignore_errors=True)
+
+    return index_build, pipeline
+
+
+def main():
+    fetcher = ROSHTTPFetcher(cache_dir=http_cache_dir) if fetch_backend == "http" else None
+
+    backend_embeddings = get_embedding_backend(embedding_backend, **embedding_backend_options)
+    if is_remote_backend(embedding_backend):
+        embedding_cache = EmbeddingCache(embedding_cache_path, max_entries=embedding_cache_size)
+        batched_embeddings = TokenBatchedEmbeddings(backend_embeddings,
+                                                    max_tokens_per_request=embedding_max_tokens_per_request,
+                                                    max_concurrency=embedding_max_concurrency,
+                                                    requests_per_minute=embedding_requests_per_minute,
+                                                    tokens_per_minute=embedding_tokens_per_minute)
+        embeddings = CachedEmbeddings(batched_embeddings, embedding_cache,
+                                      model_id=get_embedding_model_id(backend_embeddings))
+    else:
+        embedding_cache = None
+        batched_embeddings = None
+        embeddings = backend_embeddings
+
+    _, pipeline = build_index(get_listing_URLs(num_pages), ros_versions, embeddings, fetcher=fetcher,
+                              incremental_build=incremental, backend=embedding_backend,
+                              backend_options=embedding_backend_options, sharded=sharded_index,
+                              compact_dtype=compact_index_dtype, dedupe_threshold=near_duplicate_threshold,
+                              batch_size=URL_batch_size, workers=stage_workers, queue_size=stage_queue_size,
+                              num_parse_workers=parse_processes, parser=html_parser)
+
+    print("Pipeline: {}".format(pipeline.get_stats()))
+    if fetcher is not None:
+        print("HTTP fetcher: {}".format(fetcher.get_stats()))
+        fetcher.close()
+    if embedding_cache is not None:
+        print("Embedding requests: {}".format(batched_embeddings.get_stats()))
+        print("Embedding cache: {}".format(embedding_cache.get_stats()))
+        embedding_cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import bisect
+import json
+import os
+
+
+class ROSNameIndex:
+    def __init__(self, index_path):
+        self.index_path = index_path
+
+        if index_path is not None and os.path.exists(index_path):
+            with open(index_path, 'r') as index_file:
+                self.repos = json.load(index_file)['repos']
+        else:
+            self.repos = dict()
+
+        self._build_lookup()
+
+    @classmethod
+    def from_json(cls, index_json):
+        name_index = cls(None)
+        name_index.repos = index_json['repos']
+        name_index._build_lookup()
+        return name_index
+
+    def _build_lookup(self):
+        self._stale = False
+        self.names = dict()
+        for repo_name, entry in self.repos.items():
+            self._add_names(repo_name, entry)
+        self.sorted_names = sorted(self.names.keys())
+
+    def _add_names(self, repo_name, entry):
+        for name in [repo_name] + [package[0] for package in entry['packages']]:
+            self.names.setdefault(name.lower(), set()).add(repo_name)
+
+    def add_repo(self, repo_struct):
+        self.repos[repo_struct.repo_name] = {'checkout_uri': repo_struct.checkout_uri,
+                                             'vcs_type': repo_struct.vcs_type,
+                                             'vcs_version': repo_struct.vcs_version,
+                                             'summary': repo_struct.get_repo_summary()[0].page_content,
+                                             'packages': [list(package) for package in repo_struct.packages]}
+        self._stale = True
+
+    def remove_repo(self, repo_name):
+        removed = self.repos.pop(repo_name, None) is not None
+        self._stale = self._stale or removed
+        return removed
+
+    def lookup(self, name):
+        if self._stale:
+            self._build_lookup()
+        repo_names = self.names.get(name.strip().lower(), ())
+        return [(repo_name, self.repos[repo_name]) for repo_name in sorted(repo_names)]
+
+    def lookup_prefix(self, prefix, limit=10):
+        if self._stale:
+            self._build_lookup()
+        prefix = prefix.strip().lower()
+        matches = []
+        for i in range(bisect.bisect_left(self.sorted_names, prefix), len(self.sorted_names)):
+            name = self.sorted_names[i]
+            if not name.startswith(prefix) or len(matches) >= limit:
+                break
+            matches.append(name)
+
+        return matches
+
+    def __len__(self):
+        return len(self.repos)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w') as index_file:
+            json.dump({'repos': self.repos}, index_file)
+        os.replace(tmp_path, self.index_path)
+
+
+def get_name_index_path(db_dir):
+    return os.path.join(db_dir, "name_index.json")
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.retrievers import BaseRetriever
+
+from roscribe.hybrid_retriever import get_document_key
+
+
+SHARED_DB_NAME = "ros_index_db_shared"
+
+
+class ShardedChunkStore:
+    def __init__(self, vectorstore, shard_path):
+        self.vectorstore = vectorstore
+        self.shard_path = shard_path
+
+        if os.path.exists(shard_path):
+            with open(shard_path, 'r') as shard_file:
+                self.shards = json.load(shard_file)['shards']
+        else:
+            self.shards = dict()
+
+        self._lock = threading.Lock()
+
+    def upsert(self, ros_distro, doc_ids, docs, embeddings):
+        shard = self.shards.setdefault(ros_distro, dict())
+        chunk_keys = [get_chunk_key(doc_id, doc.page_content) for doc_id, doc in zip(doc_ids, docs)]
+
+        with self._lock:
+            collection = self.vectorstore._collection
+            existing = collection.get(ids=list(dict.fromkeys(chunk_keys)), include=['metadatas'])
+            existing_metadatas = dict(zip(existing['ids'], existing['metadatas']))
+
+            new_chunks = dict()
+            for chunk_key, doc, embedding in zip(chunk_keys, docs, embeddings):
+                if chunk_key in existing_metadatas:
+                    existing_metadatas[chunk_key][get_shard_flag(ros_distro)] = True
+                elif chunk_key not in new_chunks:
+                    metadata = dict(doc.metadata)
+                    metadata[get_shard_flag(ros_distro)] = True
+                    new_chunks[chunk_key] = (doc.page_content, metadata, embedding)
+
+            if len(existing_metadatas) > 0:
+                collection.update(ids=list(existing_metadatas.keys()), metadatas=list(existing_metadatas.values()))
+            if len(new_chunks) > 0:
+                collection.upsert(ids=list(new_chunks.keys()),
+                                  documents=[chunk[0] for chunk in new_chunks.values()],
+                                  metadatas=[chunk[1] for chunk in new_chunks.values()],
+                                  embeddings=[chunk[2] for chunk in new_chunks.values()])
+
+            replaced_keys = [shard[doc_id] for doc_id, chunk_key in zip(doc_ids, chunk_keys)
+                             if doc_id in shard and shard[doc_id] != chunk_key]
+            shard.update(zip(doc_ids, chunk_keys))
+            self._release(ros_distro, replaced_keys)
+
+        return chunk_keys
+
+    def delete(self, ros_distro, doc_ids):
+        shard = self.shards.get(ros_distro, dict())
+        with self._lock:
+            self._release(ros_distro, [shard.pop(doc_id) for doc_id in doc_ids if doc_id in shard])
+
+    def _release(self, ros_distro, chunk_keys):
+        still_used = set(self.shards.get(ros_distro, dict()).values())
+        chunk_keys = [chunk_key for chunk_key in set(chunk_keys) if chunk_key not in still_used]
+        if len(chunk_keys) == 0:
+            return
+
+        collection = self.vectorstore._collection
+        existing = collection.get(ids=chunk_keys, include=['metadatas'])
+        orphan_keys = []
+        updated_keys = []
+        updated_metadatas = []
+        for chunk_key, metadata in zip(existing['ids'], existing['metadatas']):
+            metadata[get_shard_flag(ros_distro)] = False
+            if any(key.startswith("distro_") and value for key, value in metadata.items()):
+                updated_keys.append(chunk_key)
+                updated_metadatas.append(metadata)
+            else:
+                orphan_keys.append(chunk_key)
+
+        if len(updated_keys) > 0:
+            collection.update(ids=updated_keys, metadatas=updated_metadatas)
+        if len(orphan_keys) > 0:
+            collection.delete(ids=orphan_keys)
+
+    def get_shard(self, ros_distro):
+        return self.shards.get(ros_distro, dict())
+
+    def get_stats(self):
+        with self._lock:
+            num_refs = sum(len(shard) for shard in self.shards.values())
+            num_chunks = len(set(chunk_key for shard in self.shards.values() for chunk_key in shard.values()))
+            return {'shards': {ros_distro: len(shard) for ros_distro, shard in self.shards.items()},
+                    'chunks': num_chunks,
+                    'chunk_refs': num_refs,
+                    'dedup_ratio': num_refs / num_chunks if num_chunks > 0 else 0.0}
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.shard_path) or '.', exist_ok=True)
+            tmp_path = self.shard_path + ".tmp"
+            with open(tmp_path, 'w') as shard_file:
+                json.dump({'shards': self.shards}, shard_file)
+            os.replace(tmp_path, self.shard_path)
+
+
+class ShardRouter(BaseRetriever):
+    retrievers: dict
+    k: int = 8
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.search(query)
+
+    def search(self, query, ros_distros=None):
+        ros_distros = [ros_distro for ros_distro in (ros_distros or self.retrievers.keys())
+                       if ros_distro in self.retrievers]
+        with ThreadPoolExecutor(max_workers=max(1, len(ros_distros))) as executor:
+            results = list(executor.map(lambda ros_distro: self.retrievers[ros_distro].search(query), ros_distros))
+
+        fused_scores = dict()
+        fused_docs = dict()
+        doc_distros = dict()
+        for ros_distro, docs in zip(ros_distros, results):
+            for rank, doc in enumerate(docs):
+                doc_key = (get_document_key(doc), doc.page_content)
+                fused_scores[doc_key] = fused_scores.get(doc_key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                fused_docs.setdefault(doc_key, doc)
+                doc_distros.setdefault(doc_key, []).append(ros_distro)
+
+        top_keys = sorted(fused_scores.keys(), key=lambda doc_key: fused_scores[doc_key], reverse=True)[:self.k]
+        docs = []
+        for doc_key in top_keys:
+            doc = fused_docs[doc_key]
+            doc.metadata = {key: value for key, value in doc.metadata.items() if not key.startswith("distro_")}
+            doc.metadata['distros'] = ", ".join(doc_distros[doc_key])
+            docs.append(doc)
+
+        return docs
+
+
+def get_chunk_key(doc_id, text):
+    return "{}@{}".format(doc_id, hashlib.sha256(text.encode('utf-8')).hexdigest()[:12])
+
+
+def get_shard_flag(ros_distro):
+    return "distro_{}".format(ros_distro)
+
+
+def get_shard_filter(ros_distro):
+    return {get_shard_flag(ros_distro): True}
+
+
+def get_shared_db_dir(db_root):
+    return os.path.join(db_root, SHARED_DB_NAME)
+
+
+def get_shard_path(shared_db_dir):
+    return os.path.join(shared_db_dir, "shards.json")
+
+
+def has_shared_index(db_root, ros_distro=None):
+    shard_path = get_shard_path(get_shared_db_dir(db_root))
+    if not os.path.exists(shard_path):
+        return False
+    if ros_distro is None:
+        return True
+
+    with open(shard_path, 'r') as shard_file:
+        return ros_distro in json.load(shard_file)['shards']
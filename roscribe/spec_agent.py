@@ -6,8 +6,9 @@ from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain.memory import ConversationBufferWindowMemory
 from langchain.chains import LLMChain
 
-from roscribe.tools import get_rag_tool, get_gen_graph_tool
+from roscribe.tools import get_rag_tool, get_multi_search_tool, get_filtered_search_tool, get_gen_graph_tool
 from roscribe.prompts import get_spec_agent_prompt, get_node_desc_prompt, get_graph_gen_prompt
+from roscribe.agent_state import load_spec_state
 import roscribe.ui as ui
 
 
@@ -20,10 +21,12 @@ class SpecAgent:
         self.max_interaction_limit = max_interaction_limit
         self.verbose = verbose
 
-        rag_tool = get_rag_tool(ros_distro)
+        rag_tool = get_rag_tool(ros_distro, agent_type='spec')
+        multi_search_tool = get_multi_search_tool(ros_distro, agent_type='spec')
+        filtered_search_tool = get_filtered_search_tool(ros_distro, agent_type='spec')
         ros_graph_tool = get_gen_graph_tool(agent=self)
 
-        tools = [rag_tool, ros_graph_tool]
+        tools = [rag_tool, multi_search_tool, filtered_search_tool, ros_graph_tool]
 
         self.end_conv_keyword = 'END_OF_SPEC'
         agent_prompt = get_spec_agent_prompt(end_conv_keyword=self.end_conv_keyword)
@@ -92,18 +95,7 @@ class SpecAgent:
 
 
 def load_spec_agent(filename):
-    with open(filename, 'rb') as saved_agent:
-        loaded_spec_agent_info = pickle.load(saved_agent)
-
-    loaded_spec_agent = SpecAgent(ros_distro=loaded_spec_agent_info['ros_distro'],
-                                  model_name=loaded_spec_agent_info['model_name'],
-                                  max_interaction_limit=loaded_spec_agent_info['max_interaction_limit'],
-                                  verbose=loaded_spec_agent_info['verbose'])
-
-    loaded_spec_agent.ros_graph = loaded_spec_agent_info['ros_graph_dict']
-    loaded_spec_agent.ros_node_desc = loaded_spec_agent_info['ros_node_desc']
-
-    return loaded_spec_agent
+    return load_spec_state(filename).to_agent()
 
 
 def cleanup_string_before_eval(input_str):
@@ -4,30 +4,168 @@ sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
 import graphviz as gv
 import re, subprocess
+from typing import List
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain.chains import LLMChain
 from langchain.agents import tool
-from langchain.agents.agent_toolkits import create_retriever_tool
 
 from roscribe.prompts import get_gen_code_prompt, get_edit_code_prompt,\
     get_gen_launch_prompt, get_edit_launch_prompt, get_gen_package_prompt, get_edit_package_prompt,\
     get_gen_cmake_prompt, get_edit_cmake_prompt, get_gen_readme_prompt, get_edit_readme_prompt
+from roscribe.vectorstore_registry import get_vectorstore, get_name_index, get_lexical_index, get_metadata_store,\
+    get_query_cache, get_routed_query_cache, get_shard, get_near_duplicate_index, get_retrieval_stats
+from roscribe.query_cache import CachedRetriever
+from roscribe.hybrid_retriever import HybridRetriever
+from roscribe.sharded_index import ShardRouter
+from roscribe.context_compressor import get_context_compressor, get_doc_repo
+
+
+default_rag_settings = {'k': 8, 'fetch_k': 20, 'lambda_mult': 0.5}
+agent_rag_settings = {'spec': dict(), 'gen': dict(), 'launch': dict(), 'support': dict()}
+
+
+def get_rag_settings(agent_type=None, **search_kwargs):
+    settings = dict(default_rag_settings)
+    settings.update(agent_rag_settings.get(agent_type, dict()))
+    settings.update(search_kwargs)
+    return settings
+
+
+def get_hybrid_retriever(ros_distro, settings):
+    shard_filter, shard_map = get_shard(ros_distro)
+    return HybridRetriever(vectorstore=get_vectorstore(ros_distro), lexical_index=get_lexical_index(ros_distro),
+                           base_filter=shard_filter, id_map=shard_map,
+                           dedupe_index=get_near_duplicate_index(ros_distro), stats=get_retrieval_stats(), **settings)
+
+
+def get_rag_tool(ros_distro, agent_type=None, **search_kwargs):
+    settings = get_rag_settings(agent_type, **search_kwargs)
+    if isinstance(ros_distro, (list, tuple)):
+        retriever = ShardRouter(retrievers={distro: get_hybrid_retriever(distro, settings) for distro in ros_distro},
+                                k=settings['k'])
+        search_params = dict(settings, search_type="routed", ros_distros=sorted(ros_distro))
+        query_cache = get_routed_query_cache(ros_distro)
+    else:
+        retriever = get_hybrid_retriever(ros_distro, settings)
+        search_params = dict(settings, search_type="hybrid")
+        query_cache = get_query_cache(ros_distro)
+    retriever = CachedRetriever(retriever=retriever, cache=query_cache, search_params=search_params)
+    context_compressor = get_context_compressor()
 
+    @tool
+    def search_ROS_repositories(query: str) -> str:
+        """Searches and returns documents regarding the ROS repositories."""
+
+        return context_compressor.compress(retriever.invoke(query))
+
+    return search_ROS_repositories
+
+
+def get_multi_search_tool(ros_distro, agent_type=None, **search_kwargs):
+    settings = get_rag_settings(agent_type, **search_kwargs)
+    query_cache = get_query_cache(ros_distro)
+    search_params = dict(settings, search_type="hybrid")
+    retriever = get_hybrid_retriever(ros_distro, settings)
+    context_compressor = get_context_compressor()
+
+    @tool
+    def search_ROS_repositories_batch(queries: List[str]) -> str:
+        """Takes a list of search queries, searches the ROS repositories for all of them at once, and returns the documents grouped by repository."""
+
+        queries = list(dict.fromkeys(query for query in queries if query.strip()))
+        if len(queries) == 0:
+            return "No search queries were given."
+
+        results = {query: query_cache.get_documents(query, search_params) for query in queries}
+        missing = [query for query, docs in results.items() if docs is None]
+        for query, docs in zip(missing, retriever.search_many(missing)):
+            query_cache.put_documents(query, search_params, docs)
+            results[query] = docs
+
+        all_docs = []
+        repo_queries = dict()
+        for i, query in enumerate(queries):
+            for doc in results[query]:
+                all_docs.append(doc)
+                repo_queries.setdefault(get_doc_repo(doc), set()).add(i + 1)
+
+        if len(all_docs) == 0:
+            return "No documents were found for the given search queries."
+
+        repo_notes = {repo_name: "matched queries: " + ", ".join(str(query_id) for query_id in sorted(query_ids))
+                      for repo_name, query_ids in repo_queries.items()}
+        return context_compressor.compress(all_docs, repo_notes=repo_notes)
+
+    return search_ROS_repositories_batch
+
+
+def get_filtered_search_tool(ros_distro, agent_type=None, **search_kwargs):
+    settings = get_rag_settings(agent_type, **search_kwargs)
+    metadata_store = get_metadata_store(ros_distro)
+    query_cache = get_query_cache(ros_distro)
+    retriever = get_hybrid_retriever(ros_distro, settings)
+    context_compressor = get_context_compressor()
+
+    @tool
+    def filter_ROS_repositories(query: str, dev_status: str = "", released: str = "", tags: str = "",
+                                updated_after: str = "") -> str:
+        """Searches the ROS repositories that match the given filters and returns documents regarding them.
+        dev_status is a development status such as MAINTAINED or DEVELOPED, released is 'yes' or 'no',
+        tags is a comma-separated list of tags, and updated_after is a date in YYYY-MM-DD format.
+        Leave a filter empty to not filter on it."""
+
+        if metadata_store is None:
+            return "The ROS repository metadata store for {ros_distro} has not been built yet; rebuild the ROS " \
+                   "index database to enable filtering, or use search_ROS_repositories instead.".\
+                format(ros_distro=ros_distro)
+
+        repo_names = metadata_store.get_repo_names(
+            dev_status=dev_status or None,
+            released=released.strip().lower() in ('yes', 'true', 'released') if released else None,
+            tags=[tag for tag in tags.split(",") if tag.strip()],
+            updated_after=updated_after or None)
+
+        if len(repo_names) == 0:
+            return "No ROS repositories match the given filters."
+
+        search_params = dict(settings, search_type="filtered", repo_names=repo_names)
+        docs = query_cache.get_documents(query, search_params)
+        if docs is None:
+            docs = retriever.search(query, repo_names=repo_names)
+            query_cache.put_documents(query, search_params, docs)
+        if len(docs) == 0:
+            return "Matching ROS repositories: {repo_names}".format(repo_names=", ".join(repo_names))
+
+        return context_compressor.compress(docs)
+
+    return filter_ROS_repositories
+
+
+def get_name_lookup_tool(ros_distro):
+    name_index = get_name_index(ros_distro)
+
+    @tool
+    def lookup_ROS_repository(name: str) -> str:
+        """Takes the exact name of a ROS repository or ROS package, and returns its summary, checkout URI and VCS version."""
+
+        matches = name_index.lookup(name)
+        if len(matches) > 0:
+            ret_msg = ""
+            for repo_name, entry in matches:
+                ret_msg += "{summary}\nPackages: {packages}\n\n".format(
+                    summary=entry['summary'],
+                    packages=", ".join(package[0] for package in entry['packages']) or "None")
+            return ret_msg.strip()
 
-def get_rag_tool(ros_distro):
-    db_name = "ros_index_db_{}".format(ros_distro)
-    vectorstore = Chroma(persist_directory="ROS_index_database/" + db_name, embedding_function=OpenAIEmbeddings())
-    retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={'k': 8})
+        suggestions = name_index.lookup_prefix(name)
+        if len(suggestions) > 0:
+            return "No repository or package named '{name}' was found. Similar names: {suggestions}".format(
+                name=name, suggestions=", ".join(suggestions))
 
-    rag_tool = create_retriever_tool(
-        retriever,
-        "search_ROS_repositories",
-        "Searches and returns documents regarding the ROS repositories."
-    )
+        return "No repository or package named '{name}' was found.\n" \
+               "Use 'search_ROS_repositories' tool to search the ROS repositories instead.".format(name=name)
 
-    return rag_tool
+    return lookup_ROS_repository
 
 
 def get_gen_graph_tool(agent):
@@ -115,9 +253,13 @@ def get_code_retrieval_tool(agent):
         try:
             repo_name = matches[0]
         except IndexError:
-            return "Code download was unsuccessful due to incorrect Git URI.\n" \
-                   "Make sure the 'checkout_uri' is a Git URI.\n" \
-                   "Instead, set the search query to 'Repository summary for REPO_NAME' where REPO_NAME is the name of the repository."
+            ret_msg = "Code download was unsuccessful due to incorrect Git URI.\n" \
+                      "Make sure the 'checkout_uri' is a Git URI.\n"
+            if len(get_name_index(agent.ros_distro)) > 0:
+                return ret_msg + "Instead, use 'lookup_ROS_repository' tool with the name of the repository or " \
+                                 "package."
+            return ret_msg + "Instead, set the search query to 'Repository summary for REPO_NAME' where " \
+                             "REPO_NAME is the name of the repository."
 
         git_command = "git clone {uri} -b {ver}".format(uri=checkout_uri, ver=vcs_version)
 
@@ -0,0 +1,393 @@
+import json
+import os
+import sys
+import threading
+
+from langchain_community.vectorstores import Chroma
+
+from roscribe.embedding_cache import get_embedding_model_id
+from roscribe.embedding_backends import get_embedding_backend, load_backend_spec
+from roscribe.query_cache import QueryCache, CachedQueryEmbeddings, get_index_version, get_query_cache_dir,\
+    get_query_cache_path
+from roscribe.mmr_search import RetrievalStats
+from roscribe.sharded_index import ShardedChunkStore, get_shared_db_dir, get_shard_path, get_shard_filter,\
+    has_shared_index
+from roscribe.compact_index import CompactVectorStore, get_compact_index_dir, has_compact_index
+from roscribe.index_stats import get_dir_size
+from roscribe.ros_name_index import ROSNameIndex, get_name_index_path
+from roscribe.lexical_index import BM25Index, get_lexical_index_path
+from roscribe.near_duplicates import NearDuplicateIndex, get_near_duplicate_path
+from roscribe.repo_metadata_store import RepoMetadataStore, get_repo_metadata_path
+from roscribe.index_snapshot import IndexSnapshot, get_snapshot_path, load_snapshot_store, load_snapshot_name_index,\
+    load_snapshot_lexical_index, load_snapshot_near_duplicate_index, load_snapshot_metadata_store,\
+    load_snapshot_backend_spec, load_snapshot_shard
+
+
+class VectorStoreRegistry:
+    def __init__(self, db_root="ROS_index_database", query_cache_size=256, persist_query_cache=True):
+        self.db_root = db_root
+        self.query_cache_size = query_cache_size
+        self.persist_query_cache = persist_query_cache
+
+        self._lock = threading.RLock()
+        self._embeddings = dict()
+        self._stores = dict()
+        self._shared = dict()
+        self._shared_store = None
+        self._shard_maps = dict()
+        self._snapshots = dict()
+        self._name_indexes = dict()
+        self._lexical_indexes = dict()
+        self._dedupe_indexes = dict()
+        self._metadata_stores = dict()
+        self._query_caches = dict()
+        self._routed_query_caches = dict()
+        self._embedding_caches = dict()
+        self.retrieval_stats = RetrievalStats()
+        self._open_count = dict()
+        self._request_count = dict()
+
+    def get_db_dir(self, ros_distro):
+        return os.path.join(self.db_root, "ros_index_db_{}".format(ros_distro))
+
+    def open_snapshot(self, ros_distro):
+        with self._lock:
+            if ros_distro not in self._snapshots:
+                # An unpacked database wins, so a snapshot left next to it never shadows a newer build
+                snapshot_path = get_snapshot_path(self.db_root, ros_distro)
+                self._snapshots[ros_distro] = IndexSnapshot(snapshot_path) \
+                    if os.path.exists(snapshot_path) and not os.path.isdir(self.get_db_dir(ros_distro)) else None
+
+            return self._snapshots[ros_distro]
+
+    def is_shared(self, ros_distro):
+        with self._lock:
+            if ros_distro not in self._shared:
+                self._shared[ros_distro] = self.open_snapshot(ros_distro) is None and \
+                    has_shared_index(self.db_root, ros_distro)
+
+            return self._shared[ros_distro]
+
+    def get_store_dir(self, ros_distro):
+        if self.is_shared(ros_distro):
+            return get_shared_db_dir(self.db_root)
+        return self.get_db_dir(ros_distro)
+
+    def get_store_key(self, ros_distro):
+        snapshot = self.open_snapshot(ros_distro)
+        return snapshot.snapshot_path if snapshot is not None else self.get_store_dir(ros_distro)
+
+    def get_embeddings(self, ros_distro):
+        with self._lock:
+            snapshot = self.open_snapshot(ros_distro)
+            backend_spec = load_snapshot_backend_spec(snapshot) if snapshot is not None \
+                else load_backend_spec(self.get_store_dir(ros_distro))
+            backend_key = json.dumps(backend_spec, sort_keys=True)
+            if backend_key not in self._embeddings:
+                self._embeddings[backend_key] = get_embedding_backend(backend_spec['backend'],
+                                                                      **backend_spec['options'])
+            return self._embeddings[backend_key]
+
+    def open(self, ros_distro):
+        with self._lock:
+            self._request_count[ros_distro] = self._request_count.get(ros_distro, 0) + 1
+
+            if ros_distro not in self._stores:
+                if self.is_shared(ros_distro):
+                    if self._shared_store is None:
+                        self._shared_store = self._open_store(ros_distro, get_shared_db_dir(self.db_root))
+                    self._stores[ros_distro] = self._shared_store
+                else:
+                    self._stores[ros_distro] = self._open_store(ros_distro, self.get_db_dir(ros_distro))
+                self._open_count[ros_distro] = self._open_count.get(ros_distro, 0) + 1
+
+            return self._stores[ros_distro]
+
+    def _open_store(self, ros_distro, store_dir):
+        backend_embeddings = self.get_embeddings(ros_distro)
+        embeddings = CachedQueryEmbeddings(backend_embeddings, self.open_embedding_cache(ros_distro),
+                                           model_id=get_embedding_model_id(backend_embeddings))
+        snapshot = self.open_snapshot(ros_distro)
+        if snapshot is not None:
+            return load_snapshot_store(snapshot, embeddings)
+        if has_compact_index(store_dir):
+            return CompactVectorStore(get_compact_index_dir(store_dir), embedding_function=embeddings)
+        return Chroma(persist_directory=store_dir, embedding_function=embeddings)
+
+    def get_shard(self, ros_distro):
+        with self._lock:
+            if ros_distro not in self._shard_maps:
+                snapshot = self.open_snapshot(ros_distro)
+                if snapshot is not None:
+                    self._shard_maps[ros_distro] = load_snapshot_shard(snapshot, ros_distro)
+                elif self.is_shared(ros_distro):
+                    shard_path = get_shard_path(get_shared_db_dir(self.db_root))
+                    self._shard_maps[ros_distro] = ShardedChunkStore(None, shard_path).get_shard(ros_distro)
+                else:
+                    self._shard_maps[ros_distro] = None
+
+            if self._shard_maps[ros_distro] is None:
+                return None, None
+            return get_shard_filter(ros_distro), self._shard_maps[ros_distro]
+
+    def open_name_index(self, ros_distro):
+        with self._lock:
+            if ros_distro not in self._name_indexes:
+                snapshot = self.open_snapshot(ros_distro)
+                self._name_indexes[ros_distro] = load_snapshot_name_index(snapshot) if snapshot is not None \
+                    else ROSNameIndex(get_name_index_path(self.get_db_dir(ros_distro)))
+
+            return self._name_indexes[ros_distro]
+
+    def open_lexical_index(self, ros_distro):
+        with self._lock:
+            if ros_distro not in self._lexical_indexes:
+                snapshot = self.open_snapshot(ros_distro)
+                self._lexical_indexes[ros_distro] = load_snapshot_lexical_index(snapshot) if snapshot is not None \
+                    else BM25Index(get_lexical_index_path(self.get_db_dir(ros_distro)))
+
+            return self._lexical_indexes[ros_distro]
+
+    def open_near_duplicate_index(self, ros_distro):
+        with self._lock:
+            if ros_distro not in self._dedupe_indexes:
+                snapshot = self.open_snapshot(ros_distro)
+                if snapshot is not None:
+                    self._dedupe_indexes[ros_distro] = load_snapshot_near_duplicate_index(snapshot)
+                    return self._dedupe_indexes[ros_distro]
+
+                dedupe_path = get_near_duplicate_path(self.get_db_dir(ros_distro))
+                self._dedupe_indexes[ros_distro] = NearDuplicateIndex(dedupe_path) if os.path.exists(dedupe_path) \
+                    else None
+
+            return self._dedupe_indexes[ros_distro]
+
+    def open_metadata_store(self, ros_distro):
+        with self._lock:
+            if ros_distro not in self._metadata_stores:
+                snapshot = self.open_snapshot(ros_distro)
+                if snapshot is not None:
+                    self._metadata_stores[ros_distro] = load_snapshot_metadata_store(snapshot)
+                    return self._metadata_stores[ros_distro]
+
+                metadata_path = get_repo_metadata_path(self.get_db_dir(ros_distro))
+                self._metadata_stores[ros_distro] = RepoMetadataStore(metadata_path, read_only=True) \
+                    if os.path.exists(metadata_path) else None
+
+            return self._metadata_stores[ros_distro]
+
+    def open_query_cache(self, ros_distro):
+        with self._lock:
+            if ros_distro not in self._query_caches:
+                self._query_caches[ros_distro] = QueryCache(self.get_index_version(ros_distro),
+                                                            max_entries=self.query_cache_size,
+                                                            cache_path=self.get_query_cache_path(ros_distro))
+
+            return self._query_caches[ros_distro]
+
+    def open_embedding_cache(self, ros_distro):
+        with self._lock:
+            # Distros on the shared store embed queries alike, so query embeddings are cached per store
+            store_key = self.get_store_key(ros_distro)
+            if store_key not in self._embedding_caches:
+                snapshot = self.open_snapshot(ros_distro)
+                index_version = snapshot.get_version() if snapshot is not None else get_index_version(store_key)
+                cache_name = "store_" + os.path.splitext(os.path.basename(store_key))[0]
+                self._embedding_caches[store_key] = QueryCache(index_version, max_entries=self.query_cache_size,
+                                                               cache_path=self.get_query_cache_path(cache_name))
+
+            return self._embedding_caches[store_key]
+
+    def open_routed_query_cache(self, ros_distros):
+        ros_distros = tuple(sorted(set(ros_distros)))
+        with self._lock:
+            if ros_distros not in self._routed_query_caches:
+                # Routed results depend on every distro they merge, so they are versioned and cached apart
+                cache_path = self.get_query_cache_path("routed_" + "_".join(ros_distros))
+                index_version = "".join(self.get_index_version(ros_distro) for ros_distro in ros_distros)
+                self._routed_query_caches[ros_distros] = QueryCache(index_version, max_entries=self.query_cache_size,
+                                                                    cache_path=cache_path)
+
+            return self._routed_query_caches[ros_distros]
+
+    def get_query_cache_path(self, cache_name):
+        # Caches live outside the index directories, so they never count as index disk use or ship with a snapshot
+        if not self.persist_query_cache or not os.path.isdir(self.db_root):
+            return None
+
+        cache_dir = get_query_cache_dir(self.db_root)
+        os.makedirs(cache_dir, exist_ok=True)
+        return get_query_cache_path(cache_dir, cache_name)
+
+    def get_index_version(self, ros_distro):
+        snapshot = self.open_snapshot(ros_distro)
+        if snapshot is not None:
+            return snapshot.get_version()
+
+        db_dir = self.get_db_dir(ros_distro)
+        index_version = get_index_version(db_dir)
+        store_dir = self.get_store_dir(ros_distro)
+        if store_dir != db_dir:
+            index_version += get_index_version(store_dir)
+        return index_version
+
+    def is_open(self, ros_distro):
+        with self._lock:
+            return ros_distro in self._stores
+
+    def close(self, ros_distro):
+        with self._lock:
+            store_key = self.get_store_key(ros_distro)
+            self._name_indexes.pop(ros_distro, None)
+            self._lexical_indexes.pop(ros_distro, None)
+            self._dedupe_indexes.pop(ros_distro, None)
+            metadata_store = self._metadata_stores.pop(ros_distro, None)
+            if metadata_store is not None:
+                metadata_store.close()
+            query_cache = self._query_caches.pop(ros_distro, None)
+            if query_cache is not None:
+                query_cache.close()
+            for ros_distros in [key for key in self._routed_query_caches if ros_distro in key]:
+                self._routed_query_caches.pop(ros_distros).close()
+            self._shared.pop(ros_distro, None)
+            self._shard_maps.pop(ros_distro, None)
+            # Stores still hold views of the mapped file, so the snapshot is dropped rather than closed
+            self._snapshots.pop(ros_distro, None)
+
+            store = self._stores.pop(ros_distro, None)
+            if store is not None and all(other_store is not store for other_store in self._stores.values()):
+                if store is self._shared_store:
+                    self._shared_store = None
+                embedding_cache = self._embedding_caches.pop(store_key, None)
+                if embedding_cache is not None:
+                    embedding_cache.close()
+            return store is not None
+
+    def close_all(self):
+        with self._lock:
+            self._stores.clear()
+            self._shared.clear()
+            self._shared_store = None
+            self._shard_maps.clear()
+            self._snapshots.clear()
+            self._name_indexes.clear()
+            self._lexical_indexes.clear()
+            self._dedupe_indexes.clear()
+            for metadata_store in self._metadata_stores.values():
+                if metadata_store is not None:
+                    metadata_store.close()
+            self._metadata_stores.clear()
+            for query_cache in list(self._query_caches.values()) + list(self._routed_query_caches.values()) + \
+                    list(self._embedding_caches.values()):
+                query_cache.close()
+            self._query_caches.clear()
+            self._routed_query_caches.clear()
+            self._embedding_caches.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stores = dict(self._stores)
+            distros = sorted(set(self._request_count.keys()) | set(stores.keys()))
+
+            stats = {'open_stores': len(stores),
+                     'max_rss_bytes': get_max_rss_bytes(),
+                     'retrieval': self.retrieval_stats.get_stats(),
+                     'stores': dict()}
+
+            for ros_distro in distros:
+                store_stats = {'open': ros_distro in stores,
+                               'opens': self._open_count.get(ros_distro, 0),
+                               'requests': self._request_count.get(ros_distro, 0),
+                               'disk_bytes': self.get_disk_bytes(ros_distro)}
+
+                if ros_distro in stores:
+                    num_vectors, dim = get_collection_shape(stores[ros_distro])
+                    store_stats['num_vectors'] = num_vectors
+                    store_stats['embedding_dim'] = dim
+                    store_stats['vector_bytes'] = get_vector_bytes(stores[ros_distro], num_vectors, dim)
+
+                if ros_distro in self._query_caches:
+                    store_stats['query_cache'] = self._query_caches[ros_distro].get_stats()
+                if ros_distro in stores:
+                    embedding_cache = self._embedding_caches.get(self.get_store_key(ros_distro))
+                    if embedding_cache is not None:
+                        store_stats['embedding_cache'] = embedding_cache.get_stats()
+
+                stats['stores'][ros_distro] = store_stats
+
+        return stats
+
+    def get_disk_bytes(self, ros_distro):
+        if self._snapshots.get(ros_distro) is not None:
+            return os.path.getsize(self._snapshots[ros_distro].snapshot_path)
+        return get_dir_size(self.get_db_dir(ros_distro))
+
+
+def get_collection_shape(vectorstore):
+    if isinstance(vectorstore, CompactVectorStore):
+        return vectorstore.get_shape()
+
+    collection = vectorstore._collection
+    num_vectors = collection.count()
+    if num_vectors == 0:
+        return 0, 0
+
+    sample = collection.peek(limit=1)
+    return num_vectors, len(sample['embeddings'][0])
+
+
+def get_vector_bytes(vectorstore, num_vectors, dim):
+    if isinstance(vectorstore, CompactVectorStore):
+        return vectorstore.vectors.nbytes + (vectorstore.scales.nbytes if vectorstore.scales is not None else 0)
+    return num_vectors * dim * 4
+
+
+def get_max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return max_rss
+    return max_rss * 1024
+
+
+vectorstore_registry = VectorStoreRegistry()
+
+
+def get_vectorstore(ros_distro):
+    return vectorstore_registry.open(ros_distro)
+
+
+def get_name_index(ros_distro):
+    return vectorstore_registry.open_name_index(ros_distro)
+
+
+def get_lexical_index(ros_distro):
+    return vectorstore_registry.open_lexical_index(ros_distro)
+
+
+def get_near_duplicate_index(ros_distro):
+    return vectorstore_registry.open_near_duplicate_index(ros_distro)
+
+
+def get_metadata_store(ros_distro):
+    return vectorstore_registry.open_metadata_store(ros_distro)
+
+
+def get_query_cache(ros_distro):
+    return vectorstore_registry.open_query_cache(ros_distro)
+
+
+def get_routed_query_cache(ros_distros):
+    return vectorstore_registry.open_routed_query_cache(ros_distros)
+
+
+def get_shard(ros_distro):
+    return vectorstore_registry.get_shard(ros_distro)
+
+
+def get_retrieval_stats():
+    return vectorstore_registry.retrieval_stats
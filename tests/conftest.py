@@ -0,0 +1,51 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fixture_server import FIXTURE_DIR, start_fixture_server  # noqa: E402
+
+
+LISTING_URLS = ["https://index.ros.org/repos/page/1/time/", "https://index.ros.org/repos/page/2/time/"]
+
+
+@pytest.fixture
+def fixture_dir(tmp_path):
+    fixture_dir = str(tmp_path / "fixtures")
+    shutil.copytree(FIXTURE_DIR, fixture_dir)
+    return fixture_dir
+
+
+def edit_fixture(fixture_dir, file_name, old_text, new_text, count=-1):
+    file_path = os.path.join(fixture_dir, file_name)
+    with open(file_path, 'r') as page_file:
+        page = page_file.read()
+    assert old_text in page
+    with open(file_path, 'w') as page_file:
+        page_file.write(page.replace(old_text, new_text, count))
+
+
+def run_build(fixture_dir, db_root, ros_distros=('noetic',), sharded=False, compact_dtype=None,
+              dedupe_threshold=0.85):
+    pytest.importorskip("langchain.vectorstores")
+    from roscribe.embedding_backends import HashedNgramEmbeddings
+    from roscribe.ros_http_fetcher import ROSHTTPFetcher
+    from roscribe.ros_index_to_vectorstore import build_index
+
+    server, base_url = start_fixture_server(fixture_dir=fixture_dir)
+    fetcher = ROSHTTPFetcher(cache_dir=None, host_override=base_url, browser_fallback=False)
+    try:
+        index_build, _ = build_index(LISTING_URLS, list(ros_distros), HashedNgramEmbeddings(), db_root=str(db_root),
+                                     fetcher=fetcher, backend="hashed-ngram", backend_options=dict(),
+                                     sharded=sharded, compact_dtype=compact_dtype,
+                                     dedupe_threshold=dedupe_threshold, batch_size=4,
+                                     num_parse_workers=1)
+    finally:
+        fetcher.close()
+        server.shutdown()
+
+    return index_build
@@ -0,0 +1,41 @@
+import json
+import os
+
+from conftest import run_build
+
+from roscribe.compact_index import has_compact_index
+from roscribe.index_stats import get_index_stats
+
+
+def get_db_dir(db_root):
+    return str(db_root / "ros_index_db_noetic")
+
+
+def test_export_compact_converts_an_existing_database(fixture_dir, tmp_path, capsys):
+    from roscribe.index_cli import main
+
+    run_build(fixture_dir, tmp_path / "db")
+    db_dir = get_db_dir(tmp_path / "db")
+    chroma_stats = get_index_stats(db_dir, ros_distro="noetic")
+    assert chroma_stats['store'] == "chroma"
+    capsys.readouterr()
+
+    main(['export-compact', db_dir, '--dtype', 'int8'])
+
+    header = json.loads(capsys.readouterr().out)
+    assert header['dtype'] == 'int8'
+    assert header['count'] == chroma_stats['chunks']
+    compact_stats = get_index_stats(db_dir, ros_distro="noetic")
+    assert compact_stats['store'] == "compact"
+    for key in ('repos', 'chunks', 'chunks_by_kind', 'embedding_dim'):
+        assert compact_stats[key] == chroma_stats[key]
+
+
+def test_build_without_export_removes_the_old_compact_index(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db", compact_dtype='float16')
+    assert has_compact_index(get_db_dir(tmp_path / "db"))
+
+    run_build(fixture_dir, tmp_path / "db", compact_dtype=None)
+
+    assert not has_compact_index(get_db_dir(tmp_path / "db"))
+    assert not os.path.exists(os.path.join(get_db_dir(tmp_path / "db"), "compact"))
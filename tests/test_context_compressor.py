@@ -0,0 +1,20 @@
+import tiktoken
+from langchain_core.documents import Document
+
+from roscribe.context_compressor import CharEncoding, ContextCompressor
+
+
+def test_offline_encoding_falls_back_to_a_character_budget(monkeypatch):
+    def get_encoding(encoding_name):
+        raise OSError("could not download {}".format(encoding_name))
+
+    monkeypatch.setattr(tiktoken, 'get_encoding', get_encoding)
+    context_compressor = ContextCompressor(max_tokens=50)
+    docs = [Document(page_content="navigation " * 100, metadata={'repo_name': "navigation", 'kind': 'readme'})]
+
+    compressed_text = context_compressor.compress(docs)
+
+    assert isinstance(context_compressor.encoding, CharEncoding)
+    assert compressed_text.endswith(" ...")
+    assert len(compressed_text) <= 50 * 4 + len(" ...")
+    assert context_compressor.get_stats()['tokens_after'] < context_compressor.get_stats()['tokens_before']
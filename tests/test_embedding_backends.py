@@ -0,0 +1,36 @@
+import pytest
+
+from conftest import run_build
+
+from roscribe.embedding_backends import HashedNgramEmbeddings, check_backend_spec, load_backend_spec
+
+
+def test_build_refuses_another_backend(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db")
+    db_dir = str(tmp_path / "db" / "ros_index_db_noetic")
+    assert load_backend_spec(db_dir) == {'backend': "hashed-ngram", 'options': dict()}
+
+    check_backend_spec(db_dir, "hashed-ngram", dict())
+    with pytest.raises(ValueError, match="rebuild it from scratch"):
+        check_backend_spec(db_dir, "hashed-ngram", {'dim': 256})
+    with pytest.raises(ValueError, match="hashed-ngram embedding backend"):
+        check_backend_spec(db_dir, "openai", dict())
+
+
+def test_index_without_a_backend_file_is_openai(tmp_path):
+    (tmp_path / "chroma.sqlite3").write_bytes(b"")
+
+    check_backend_spec(str(tmp_path), "openai", dict())
+    with pytest.raises(ValueError):
+        check_backend_spec(str(tmp_path), "hashed-ngram", dict())
+    check_backend_spec(str(tmp_path / "new_db"), "hashed-ngram", dict())
+
+
+def test_hashed_ngram_embeddings_are_normalized():
+    embeddings = HashedNgramEmbeddings(dim=64)
+    vector = embeddings.embed_query("lidar slam mapping")
+
+    assert len(vector) == 64
+    assert abs(sum(value * value for value in vector) - 1.0) < 1e-5
+    assert embeddings.embed_documents(["lidar slam mapping"]) == [vector]
+    assert embeddings.embed_query("") == [0.0] * 64
@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import tiktoken
+from langchain_core.embeddings import Embeddings
+
+from roscribe.embedding_batcher import TokenBatchedEmbeddings
+
+
+class WordEncoding:
+    # Stands in for a tiktoken encoding, which cannot be downloaded offline
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        return [self.encode_ordinary(text) for text in texts]
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    monkeypatch.setattr(tiktoken, 'get_encoding', lambda encoding_name: WordEncoding())
+
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.requests.append(list(texts))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+def test_batches_stay_within_the_token_budget():
+    recorder = RecordingEmbeddings()
+    embeddings = TokenBatchedEmbeddings(recorder, max_tokens_per_request=50, max_concurrency=1)
+    texts = ["word " * (i % 7 + 1) * 4 for i in range(40)]
+
+    batches = embeddings.get_batches(texts)
+    assert [i for batch, _ in batches for i in batch] == list(range(len(texts)))
+    for batch, batch_tokens in batches:
+        assert batch_tokens <= 50
+        assert batch_tokens == sum(len(embeddings.encoding.encode_ordinary(texts[i])) for i in batch)
+
+    assert embeddings.embed_documents(texts) == [[float(len(text))] for text in texts]
+    assert len(recorder.requests) == len(batches)
+    assert embeddings.get_stats()['tokens'] == sum(batch_tokens for _, batch_tokens in batches)
+
+
+def test_oversized_text_gets_its_own_request():
+    embeddings = TokenBatchedEmbeddings(RecordingEmbeddings(), max_tokens_per_request=10, max_texts_per_request=2)
+    texts = ["short", "word " * 40, "short", "short", "short"]
+
+    assert [batch for batch, _ in embeddings.get_batches(texts)] == [[0], [1], [2, 3], [4]]
+
+
+def test_concurrent_callers_share_the_request_cap():
+    recorder = RecordingEmbeddings(delay=0.02)
+    embeddings = TokenBatchedEmbeddings(recorder, max_tokens_per_request=5, max_concurrency=2)
+    texts = ["lidar slam mapping {}".format(i) for i in range(8)]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(embeddings.embed_documents, [texts] * 4))
+
+    assert all(vectors == [[float(len(text))] for text in texts] for vectors in results)
+    assert recorder.max_in_flight <= 2
+    assert embeddings.get_stats()['requests'] == len(recorder.requests)
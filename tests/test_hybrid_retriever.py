@@ -0,0 +1,60 @@
+from langchain_core.documents import Document
+
+import roscribe.hybrid_retriever
+from roscribe.hybrid_retriever import HybridRetriever, get_document_key
+
+
+def get_doc(repo_name):
+    return Document(page_content="{} readme".format(repo_name),
+                    metadata={'repo_name': repo_name, 'kind': "readme", 'chunk': 0})
+
+
+class FakeLexicalIndex:
+    def __init__(self, doc_ids):
+        self.doc_ids = doc_ids
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def search(self, query, k=20, repo_names=None):
+        return [(doc_id, 1.0) for doc_id in self.doc_ids[:k]]
+
+
+class FakeStore:
+    def get(self, ids=None, include=None):
+        docs = [get_doc(doc_id.split(":", 1)[0]) for doc_id in ids]
+        return {'ids': ids, 'documents': [doc.page_content for doc in docs],
+                'metadatas': [doc.metadata for doc in docs]}
+
+
+def get_retriever(monkeypatch, lexical_repos, vector_repos, k):
+    def mmr_search(vectorstore, query, **kwargs):
+        return [get_doc(repo_name) for repo_name in vector_repos], {'vector': 0.0}
+
+    monkeypatch.setattr(roscribe.hybrid_retriever, "mmr_search", mmr_search)
+    lexical_index = FakeLexicalIndex([get_document_key(get_doc(repo_name)) for repo_name in lexical_repos])
+    return HybridRetriever(vectorstore=FakeStore(), lexical_index=lexical_index, k=k)
+
+
+def get_repo_names(docs):
+    return [doc.metadata['repo_name'] for doc in docs]
+
+
+def test_fusion_ranks_by_reciprocal_rank(monkeypatch):
+    retriever = get_retriever(monkeypatch, ["amcl", "gmapping", "navigation"], ["gmapping", "velodyne", "amcl"], k=4)
+
+    # gmapping ranks 2nd and 1st, amcl 1st and 3rd; velodyne and navigation only appear in one list
+    assert get_repo_names(retriever.search("lidar slam mapping")) == ["gmapping", "amcl", "velodyne", "navigation"]
+    assert get_repo_names(retriever.search("lidar slam mapping", repo_names=[])) == []
+
+
+def test_fusion_keeps_the_top_k(monkeypatch):
+    retriever = get_retriever(monkeypatch, ["amcl", "gmapping", "navigation"], ["gmapping", "velodyne", "amcl"], k=2)
+
+    assert get_repo_names(retriever.search("lidar slam mapping")) == ["gmapping", "amcl"]
+
+
+def test_identifier_queries_keep_the_lexical_order(monkeypatch):
+    retriever = get_retriever(monkeypatch, ["amcl", "gmapping", "navigation"], ["gmapping", "velodyne", "amcl"], k=4)
+
+    assert get_repo_names(retriever.search("move_base")) == ["amcl", "gmapping", "navigation"]
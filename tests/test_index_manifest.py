@@ -0,0 +1,102 @@
+import os
+
+from conftest import edit_fixture, run_build
+
+from roscribe.index_manifest import IndexManifest
+from roscribe.index_stats import get_index_stats
+from roscribe.ros_index_repo import ROSIndexRepo
+
+
+VELODYNE_LINK = '<a href="/r/velodyne/">velodyne</a>'
+
+
+def get_repo(repo_name, last_updated, vcs_version="main"):
+    return ROSIndexRepo("https://index.ros.org/r/{}/".format(repo_name), repo_name, "", "git", vcs_version,
+                        last_updated, "", "", "", [], [], "", "")
+
+
+def get_db_dir(db_root):
+    return str(db_root / "ros_index_db_noetic")
+
+
+def get_manifest(db_root):
+    return IndexManifest(os.path.join(get_db_dir(db_root), "index_manifest.json"))
+
+
+def test_rebuild_skips_unchanged_repos(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db")
+    manifest = get_manifest(tmp_path / "db")
+    assert len(manifest.repos) > 0
+    assert manifest.checkpoint is None
+
+    index_build = run_build(fixture_dir, tmp_path / "db")
+
+    assert index_build.num_skipped == len(manifest.repos)
+    assert get_manifest(tmp_path / "db").repos == manifest.repos
+
+
+def test_changed_repo_replaces_its_chunks(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db")
+    old_entry = get_manifest(tmp_path / "db").repos['navigation']
+
+    edit_fixture(fixture_dir, "repo_navigation.html", "2023-01-01", "2024-01-01")
+    index_build = run_build(fixture_dir, tmp_path / "db")
+
+    manifest = get_manifest(tmp_path / "db")
+    assert index_build.num_skipped == len(manifest.repos) - 1
+    assert manifest.repos['navigation']['last_updated'] != old_entry['last_updated']
+    anomalies = get_index_stats(get_db_dir(tmp_path / "db"), ros_distro="noetic")['anomalies']
+    assert 'orphaned_vectors' not in anomalies
+    assert 'missing_vectors' not in anomalies
+
+
+def test_vanished_repo_is_removed(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db")
+    assert 'velodyne' in get_manifest(tmp_path / "db").repos
+
+    edit_fixture(fixture_dir, "listing_page_1.html", VELODYNE_LINK, "velodyne", count=1)
+    run_build(fixture_dir, tmp_path / "db")
+
+    assert 'velodyne' not in get_manifest(tmp_path / "db").repos
+    stats = get_index_stats(get_db_dir(tmp_path / "db"), ros_distro="noetic")
+    assert 'orphaned_vectors' not in stats['anomalies']
+    assert 'missing_vectors' not in stats['anomalies']
+
+
+def test_checkpoint_only_resumes_the_same_listing(tmp_path):
+    manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+    repo_URLs = ["https://index.ros.org/r/navigation/", "https://index.ros.org/r/velodyne/"]
+    manifest.set_checkpoint(repo_URLs, 3)
+    manifest.save()
+
+    manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+    assert manifest.get_resume_batch(repo_URLs) == 3
+    assert manifest.get_resume_batch(repo_URLs[::-1]) == 0
+
+
+def test_update_repo_returns_the_stale_doc_ids(tmp_path):
+    manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+    repo = get_repo("navigation", "2023-01-01")
+    assert not manifest.is_unchanged(repo)
+
+    assert manifest.update_repo(repo, ["navigation:readme:0", "navigation:readme:1"]) == []
+    assert manifest.is_unchanged(repo)
+    assert not manifest.is_unchanged(get_repo("navigation", "2024-01-01"))
+    assert not manifest.is_unchanged(get_repo("navigation", "2023-01-01", vcs_version="ros2"))
+
+    assert manifest.update_repo(get_repo("navigation", "2024-01-01"), ["navigation:readme:0"]) == \
+        ["navigation:readme:1"]
+
+
+def test_invalidated_and_unlisted_repos(tmp_path):
+    manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+    for repo_name in ("navigation", "velodyne"):
+        manifest.update_repo(get_repo(repo_name, "2023-01-01"), ["{}:readme:0".format(repo_name)])
+    manifest.save()
+
+    manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+    manifest.invalidate_repo("navigation")
+    assert not manifest.is_unchanged(get_repo("navigation", "2023-01-01"))
+    assert manifest.get_vanished_repos(["navigation"]) == ["velodyne"]
+    assert manifest.remove_repo("velodyne") == ["velodyne:readme:0"]
+    assert manifest.remove_repo("velodyne") == []
@@ -0,0 +1,144 @@
+import json
+import os
+
+import pytest
+
+from conftest import run_build
+
+from roscribe.compact_index import CompactVectorStore
+from roscribe.index_snapshot import IndexSnapshot, export_snapshot, import_snapshot, get_snapshot_path
+from roscribe.index_stats import get_index_stats
+from roscribe.sharded_index import get_shared_db_dir
+from roscribe.vectorstore_registry import VectorStoreRegistry
+
+
+def test_snapshot_round_trip(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db", compact_dtype='float16')
+    db_dir = str(tmp_path / "db" / "ros_index_db_noetic")
+    snapshot_path = str(tmp_path / "noetic.rosidx")
+
+    header = export_snapshot(db_dir, snapshot_path, ros_distro="noetic")
+    snapshot = IndexSnapshot(snapshot_path)
+    snapshot.verify()
+    snapshot.close()
+    assert header['compact']['count'] > 0
+
+    imported_dir = str(tmp_path / "imported" / "ros_index_db_noetic")
+    import_snapshot(snapshot_path, imported_dir)
+    for file_name in ("index_manifest.json", "lexical_index.json", "name_index.json", "near_duplicates.json",
+                      os.path.join("compact", "docs.json")):
+        with open(os.path.join(db_dir, file_name), 'rb') as original_file, \
+                open(os.path.join(imported_dir, file_name), 'rb') as imported_file:
+            assert original_file.read() == imported_file.read()
+
+    original_stats = get_index_stats(db_dir, ros_distro="noetic")
+    imported_stats = get_index_stats(imported_dir, ros_distro="noetic")
+    assert imported_stats['store'] == "compact"
+    for key in ('repos', 'chunks', 'collapsed_chunks', 'chunks_by_kind', 'embedding_dim', 'anomalies'):
+        assert imported_stats[key] == original_stats[key]
+
+
+def test_corrupted_snapshot_fails_verification(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db", compact_dtype='int8')
+    snapshot_path = str(tmp_path / "noetic.rosidx")
+    header = export_snapshot(str(tmp_path / "db" / "ros_index_db_noetic"), snapshot_path, ros_distro="noetic")
+
+    with open(snapshot_path, 'r+b') as snapshot_file:
+        snapshot_file.seek(header['sections']['compact/vectors']['offset'])
+        snapshot_file.write(b"\xff\xff\xff\xff")
+
+    with pytest.raises(ValueError):
+        import_snapshot(snapshot_path, str(tmp_path / "imported" / "ros_index_db_noetic"))
+
+
+def test_sharded_import_keeps_other_shared_stores(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db", ros_distros=('noetic', 'humble'), sharded=True, compact_dtype='float16')
+    shared_dir = get_shared_db_dir(str(tmp_path / "db"))
+    snapshot_paths = dict()
+    for ros_distro in ('noetic', 'humble'):
+        snapshot_paths[ros_distro] = str(tmp_path / "{}.rosidx".format(ros_distro))
+        export_snapshot(str(tmp_path / "db" / "ros_index_db_{}".format(ros_distro)), snapshot_paths[ros_distro],
+                        store_dir=shared_dir, ros_distro=ros_distro)
+
+    # Both snapshots carry the same shared store, so they can be imported next to each other
+    imported_root = str(tmp_path / "imported")
+    for ros_distro in ('noetic', 'humble'):
+        import_snapshot(snapshot_paths[ros_distro], os.path.join(imported_root, "ros_index_db_{}".format(ros_distro)),
+                        store_dir=get_shared_db_dir(imported_root))
+
+    run_build(fixture_dir, tmp_path / "jazzy", ros_distros=('jazzy',), sharded=True, compact_dtype='float16')
+    jazzy_shared_dir = get_shared_db_dir(str(tmp_path / "jazzy"))
+    with open(os.path.join(jazzy_shared_dir, "shards.json"), 'rb') as shard_file:
+        jazzy_shards = shard_file.read()
+
+    with pytest.raises(ValueError):
+        import_snapshot(snapshot_paths['noetic'], str(tmp_path / "jazzy" / "ros_index_db_noetic"),
+                        store_dir=jazzy_shared_dir)
+    with open(os.path.join(jazzy_shared_dir, "shards.json"), 'rb') as shard_file:
+        assert shard_file.read() == jazzy_shards
+
+
+def test_registry_serves_a_snapshot_in_place(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db", compact_dtype='int8')
+    db_dir = str(tmp_path / "db" / "ros_index_db_noetic")
+    deploy_root = tmp_path / "deploy"
+    deploy_root.mkdir()
+    export_snapshot(db_dir, get_snapshot_path(str(deploy_root), "noetic"), ros_distro="noetic")
+
+    built_registry = VectorStoreRegistry(db_root=str(tmp_path / "db"), persist_query_cache=False)
+    registry = VectorStoreRegistry(db_root=str(deploy_root), persist_query_cache=False)
+    store = registry.open("noetic")
+    assert isinstance(store, CompactVectorStore)
+    # Vectors and scales are read-only views of the mapped file, not copies
+    for array in (store.vectors, store.scales):
+        assert not array.flags.owndata and not array.flags.writeable
+
+    built_store = built_registry.open("noetic")
+    query = "navigation stack costmap"
+    assert [doc.metadata for doc in store.similarity_search(query)] == \
+        [doc.metadata for doc in built_store.similarity_search(query)]
+    assert registry.open_name_index("noetic").lookup("navigation") == \
+        built_registry.open_name_index("noetic").lookup("navigation")
+    assert registry.open_lexical_index("noetic").search(query) == \
+        built_registry.open_lexical_index("noetic").search(query)
+    assert len(registry.open_metadata_store("noetic")) == len(built_registry.open_metadata_store("noetic"))
+    assert registry.open_near_duplicate_index("noetic").get_stats() == \
+        built_registry.open_near_duplicate_index("noetic").get_stats()
+
+    # Nothing is unpacked next to the snapshot
+    assert sorted(os.listdir(str(deploy_root))) == ["ros_index_noetic.rosidx"]
+    registry.close_all()
+    built_registry.close_all()
+
+
+def test_build_after_import_rebuilds_the_index(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db", compact_dtype='float16')
+    snapshot_path = str(tmp_path / "noetic.rosidx")
+    header = export_snapshot(str(tmp_path / "db" / "ros_index_db_noetic"), snapshot_path, ros_distro="noetic")
+
+    imported_dir = str(tmp_path / "imported" / "ros_index_db_noetic")
+    import_snapshot(snapshot_path, imported_dir)
+    index_build = run_build(fixture_dir, tmp_path / "imported", compact_dtype='float16')
+
+    assert index_build.num_skipped == 0
+    stats = get_index_stats(imported_dir, ros_distro="noetic")
+    assert stats['store'] == "compact"
+    assert stats['chunks'] == header['compact']['count']
+
+
+def test_reimport_replaces_the_compact_index(fixture_dir, tmp_path):
+    snapshot_paths = dict()
+    for compact_dtype in ('int8', 'float16'):
+        run_build(fixture_dir, tmp_path / compact_dtype, compact_dtype=compact_dtype)
+        snapshot_paths[compact_dtype] = str(tmp_path / "noetic_{}.rosidx".format(compact_dtype))
+        export_snapshot(str(tmp_path / compact_dtype / "ros_index_db_noetic"), snapshot_paths[compact_dtype],
+                        ros_distro="noetic")
+
+    imported_dir = str(tmp_path / "imported" / "ros_index_db_noetic")
+    import_snapshot(snapshot_paths['int8'], imported_dir)
+    import_snapshot(snapshot_paths['float16'], imported_dir)
+
+    assert sorted(os.listdir(os.path.join(imported_dir, "compact"))) == \
+        ["compact_index.json", "docs.json", "vectors.npy"]
+    with open(os.path.join(imported_dir, "compact", "compact_index.json"), 'r') as header_file:
+        assert json.load(header_file)['dtype'] == 'float16'
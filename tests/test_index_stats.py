@@ -0,0 +1,55 @@
+import pytest
+
+from roscribe.index_stats import CHROMA_COLLECTION_NAME, get_index_stats
+
+
+def test_legacy_database_without_manifest(tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    db_dir = str(tmp_path / "ros_index_db_noetic")
+    collection = chromadb.PersistentClient(path=db_dir).get_or_create_collection(CHROMA_COLLECTION_NAME)
+    collection.add(ids=["3f1c", "9a2e", "77b0"], embeddings=[[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]],
+                   documents=["Repository summary for navigation:\nVCS Type: git", "A 2D navigation stack",
+                              "Slam Toolbox for lifelong mapping"],
+                   metadatas=[{'source': "https://index.ros.org/r/navigation/", 'title': "Repository summary for "
+                                                                                        "navigation"},
+                              {'source': "https://index.ros.org/r/navigation/", 'title': "README of navigation"},
+                              {'source': "https://index.ros.org/r/slam_toolbox/", 'title': "README of slam_toolbox"}])
+
+    stats = get_index_stats(db_dir, ros_distro="noetic")
+
+    assert stats['repos'] == 2
+    assert stats['chunks'] == 3
+    assert stats['chunks_by_kind'] == {'summary': 1, 'readme': 2}
+    assert stats['chunks_per_repo'] == {'min': 1, 'mean': 1.5, 'max': 2}
+    assert stats['anomalies'] == dict()
+
+
+def test_stats_refuses_a_directory_without_a_chroma_database(tmp_path, capsys):
+    from roscribe.index_cli import main
+
+    db_dir = tmp_path / "ros_index_db_noetic"
+    db_dir.mkdir()
+    (db_dir / "notes.txt").write_text("not an index")
+
+    with pytest.raises(ValueError):
+        get_index_stats(str(db_dir), ros_distro="noetic")
+    with pytest.raises(SystemExit) as exit_info:
+        main(['stats', 'noetic', '--db-root', str(tmp_path)])
+
+    assert exit_info.value.code == 1
+    assert capsys.readouterr().err.startswith("roscribe-index: ")
+    assert sorted(path.name for path in db_dir.iterdir()) == ["notes.txt"]
+
+
+def test_stats_refuses_a_chroma_database_without_the_collection(tmp_path, capsys):
+    chromadb = pytest.importorskip("chromadb")
+    from roscribe.index_cli import main
+
+    db_dir = str(tmp_path / "ros_index_db_noetic")
+    chromadb.PersistentClient(path=db_dir).get_or_create_collection("other_collection")
+
+    with pytest.raises(SystemExit) as exit_info:
+        main(['stats', 'noetic', '--db-root', str(tmp_path)])
+
+    assert exit_info.value.code == 1
+    assert "has no \"{}\" Chroma collection".format(CHROMA_COLLECTION_NAME) in capsys.readouterr().err
@@ -0,0 +1,59 @@
+import os
+import re
+
+from conftest import edit_fixture, run_build
+
+from roscribe.index_stats import get_index_stats
+from roscribe.lexical_index import get_doc_repo_name
+from roscribe.near_duplicates import NearDuplicateIndex, get_near_duplicate_path
+
+
+CONTRIB_TEXT = "Any contribution that you make to this repository"
+
+
+def bump_last_updated(fixture_dir, repo_name):
+    file_path = os.path.join(fixture_dir, "repo_{}.html".format(repo_name))
+    with open(file_path, 'r') as page_file:
+        page = page_file.read()
+    with open(file_path, 'w') as page_file:
+        page_file.write(re.sub(r"(<b>Last Updated</b></td><td>\s*)\S+", r"\g<1>2099-01-01", page))
+
+
+def test_changed_canonical_promotes_a_duplicate(fixture_dir, tmp_path):
+    db_root = tmp_path / "db"
+    run_build(fixture_dir, db_root)
+
+    db_dir = str(db_root / "ros_index_db_noetic")
+    dedupe_index = NearDuplicateIndex(get_near_duplicate_path(db_dir))
+    canonical_id = max((doc_id for doc_id in dedupe_index.back_refs if ":contrib:" in doc_id),
+                       key=lambda doc_id: len(dedupe_index.back_refs[doc_id]))
+    duplicate_ids = set(dedupe_index.back_refs[canonical_id])
+    assert len(duplicate_ids) > 1
+
+    repo_name = get_doc_repo_name(canonical_id)
+    edit_fixture(fixture_dir, "repo_{}.html".format(repo_name), CONTRIB_TEXT,
+                 "Contributions to {} are reviewed by the maintainers on a rolling basis".format(repo_name))
+    bump_last_updated(fixture_dir, repo_name)
+    run_build(fixture_dir, db_root)
+
+    stats = get_index_stats(db_dir, ros_distro="noetic")
+    assert 'missing_vectors' not in stats['anomalies']
+
+    dedupe_index = NearDuplicateIndex(get_near_duplicate_path(db_dir))
+    assert canonical_id not in dedupe_index.back_refs
+    promoted_ids = [doc_id for doc_id in duplicate_ids if doc_id in dedupe_index.signatures]
+    assert len(promoted_ids) == 1
+    assert all(dedupe_index.duplicates[doc_id] == promoted_ids[0] for doc_id in duplicate_ids - set(promoted_ids))
+
+
+def test_tied_candidates_resolve_to_the_same_canonical():
+    signature = NearDuplicateIndex(None).hasher.get_signature(CONTRIB_TEXT)
+    canonical_ids = []
+    for doc_ids in (["zeta:contrib:0", "alpha:contrib:0", "mid:contrib:0"],
+                    ["mid:contrib:0", "zeta:contrib:0", "alpha:contrib:0"]):
+        dedupe_index = NearDuplicateIndex(None)
+        for doc_id in doc_ids:
+            dedupe_index._add_canonical(doc_id, signature)
+        canonical_ids.append(dedupe_index.find(signature))
+
+    assert canonical_ids == ["alpha:contrib:0", "alpha:contrib:0"]
@@ -0,0 +1,93 @@
+import os
+
+from langchain_core.documents import Document
+
+from conftest import edit_fixture, run_build
+
+from roscribe.index_stats import get_dir_size
+from roscribe.query_cache import CachedQueryEmbeddings, QueryCache, get_query_cache_dir
+from roscribe.vectorstore_registry import VectorStoreRegistry
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(self.queries))]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def test_query_keys_keep_case(tmp_path):
+    query_cache = QueryCache("v1", cache_path=str(tmp_path / "query_cache.sqlite"))
+    embeddings = CountingEmbeddings()
+    cached_embeddings = CachedQueryEmbeddings(embeddings, query_cache, model_id="counting")
+
+    assert cached_embeddings.embed_query("Lidar") != cached_embeddings.embed_query("lidar")
+    assert cached_embeddings.embed_query("  lidar ") == cached_embeddings.embed_query("lidar")
+    assert embeddings.queries == ["Lidar", "lidar"]
+
+
+def test_embedding_and_document_lookups_are_counted_apart():
+    query_cache = QueryCache("v1")
+    cached_embeddings = CachedQueryEmbeddings(CountingEmbeddings(), query_cache, model_id="counting")
+
+    cached_embeddings.embed_query("lidar driver")
+    cached_embeddings.embed_query("lidar driver")
+    assert query_cache.get_documents("lidar driver", {'k': 4}) is None
+    query_cache.put_documents("lidar driver", {'k': 4}, [Document(page_content="velodyne", metadata={})])
+    query_cache.get_documents("lidar driver", {'k': 4})
+    query_cache.get_documents("lidar driver", {'k': 4})
+
+    stats = query_cache.get_stats()
+    assert stats['embedding'] == {'memory_hits': 1, 'disk_hits': 0, 'misses': 1, 'hit_rate': 0.5}
+    assert stats['documents']['memory_hits'] == 2
+    assert stats['documents']['misses'] == 1
+
+
+def test_persistent_cache_is_dropped_when_the_index_changes(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db")
+    docs = [Document(page_content="navigation stack", metadata={'repo_name': "navigation"})]
+
+    registry = VectorStoreRegistry(db_root=str(tmp_path / "db"))
+    registry.open_query_cache("noetic").put_documents("costmap", {'k': 4}, docs)
+    registry.close_all()
+
+    registry = VectorStoreRegistry(db_root=str(tmp_path / "db"))
+    assert registry.open_query_cache("noetic").get_documents("costmap", {'k': 4}) == docs
+    assert registry.open_query_cache("noetic").get_stats()['documents']['disk_hits'] == 1
+    registry.close_all()
+
+    edit_fixture(fixture_dir, "repo_navigation.html", "2023-01-01", "2024-01-01")
+    run_build(fixture_dir, tmp_path / "db")
+
+    registry = VectorStoreRegistry(db_root=str(tmp_path / "db"))
+    assert registry.open_query_cache("noetic").get_documents("costmap", {'k': 4}) is None
+    registry.close_all()
+
+
+def test_shared_store_caches_query_embeddings_once_outside_the_index(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db", ros_distros=('noetic', 'humble'), sharded=True)
+    db_sizes = {ros_distro: get_dir_size(str(tmp_path / "db" / "ros_index_db_{}".format(ros_distro)))
+                for ros_distro in ('noetic', 'humble')}
+    registry = VectorStoreRegistry(db_root=str(tmp_path / "db"))
+
+    noetic_store = registry.open("noetic")
+    humble_store = registry.open("humble")
+    assert humble_store is noetic_store
+    assert registry.open_embedding_cache("humble") is registry.open_embedding_cache("noetic")
+
+    humble_store.embeddings.embed_query("lidar driver")
+    noetic_store.embeddings.embed_query("lidar driver")
+
+    embedding_stats = registry.get_stats()['stores']['noetic']['embedding_cache']['embedding']
+    assert embedding_stats['misses'] == 1 and embedding_stats['memory_hits'] == 1
+    assert 'embedding' not in registry.open_query_cache("noetic").get_stats()
+    assert 'embedding' not in registry.open_query_cache("humble").get_stats()
+    for ros_distro, db_size in db_sizes.items():
+        assert get_dir_size(str(tmp_path / "db" / "ros_index_db_{}".format(ros_distro))) == db_size
+    assert os.path.exists(os.path.join(get_query_cache_dir(str(tmp_path / "db")), "store_ros_index_db_shared.sqlite"))
+    registry.close_all()
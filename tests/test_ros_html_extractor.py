@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("langchain.document_transformers")
+
+from conftest import FIXTURE_DIR
+
+from roscribe.ros_bs_transformer import ROSIndexTransformer, ROSMultiDistroIndexTransformer, ROSRepoTransformer,\
+    ROSMultiDistroRepoTransformer
+
+
+class FixturePage:
+    def __init__(self, page_content, source):
+        self.page_content = page_content
+        self.metadata = {'source': source}
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURE_DIR, file_name), 'r') as page_file:
+        return page_file.read()
+
+
+def test_listing_links_are_merged_across_distro_blocks():
+    listing_page = read_fixture("listing_page_1.html")
+    single_URLs, _ = ROSIndexTransformer('noetic').get_distro_URLs([FixturePage(listing_page, "listing")])
+
+    start = listing_page.index('<div class="tab-pane distro-noetic">')
+    end = listing_page.index('<div class="tab-pane', start + 1)
+    split_page = listing_page[:end] + '<div class="tab-pane distro-noetic"><a href="/r/extra_repo/">extra_repo</a>' \
+                                      '</div>' + listing_page[end:]
+    split_URLs, split_names = ROSIndexTransformer('noetic').get_distro_URLs([FixturePage(split_page, "listing")])
+    multi_links = ROSMultiDistroIndexTransformer(['noetic']).get_distro_URLs([FixturePage(split_page, "listing")])
+
+    assert split_URLs == single_URLs + ["https://index.ros.org/r/extra_repo/"]
+    assert split_names[-1] == "extra_repo"
+    assert multi_links['noetic'][0] == split_URLs
+
+
+def test_repo_page_uses_the_first_block_with_a_version():
+    repo_page = read_fixture("repo_navigation.html")
+    placeholder = '<div class="tab-pane distro-noetic"><p>No version for distro noetic. Known supported distros ' \
+                  'are highlighted in the buttons above.</p></div>'
+    start = repo_page.index('<div class="tab-pane distro-noetic"')
+    repo_page = repo_page[:start] + placeholder + repo_page[start:]
+
+    repo_structs = ROSRepoTransformer('noetic').get_repo_struct([FixturePage(repo_page, "navigation")],
+                                                                ["navigation"])
+
+    assert len(repo_structs) == 1
+    assert repo_structs[0].vcs_version == "noetic-devel"
+
+
+def test_parallel_parsing_matches_serial_parsing():
+    with open(os.path.join(FIXTURE_DIR, "pages.json"), 'r') as pages_file:
+        repo_pages = [(source, file_name) for source, file_name in json.load(pages_file).items() if '/r/' in source]
+    html_list = [FixturePage(read_fixture(file_name), source) for source, file_name in repo_pages]
+    repo_names = [source.rstrip('/').rsplit('/', 1)[-1] for source, _ in repo_pages]
+
+    serial_results = ROSMultiDistroRepoTransformer(['noetic', 'humble']).get_repo_struct(html_list, repo_names)
+    parallel_transformer = ROSMultiDistroRepoTransformer(['noetic', 'humble'], num_workers=2)
+    try:
+        parallel_results = parallel_transformer.get_repo_struct(html_list, repo_names)
+        assert parallel_transformer._executor._mp_context.get_start_method() != "fork"
+    finally:
+        parallel_transformer.close()
+
+    def get_fields(repo_structs):
+        return [[getattr(repo_struct, field) for field in repo_struct.__slots__] for repo_struct in repo_structs]
+
+    assert len(serial_results['noetic']) > 0
+    for ros_distro, repo_structs in serial_results.items():
+        assert get_fields(parallel_results[ros_distro]) == get_fields(repo_structs)
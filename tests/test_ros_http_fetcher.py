@@ -0,0 +1,160 @@
+import json
+import os
+
+import pytest
+from langchain_core.documents import Document
+
+from conftest import run_build
+from fixture_server import start_fixture_server
+
+from roscribe.index_manifest import IndexManifest
+from roscribe.ros_http_fetcher import ROSHTTPFetcher, get_failed_sources
+
+
+NAVIGATION_URL = "https://index.ros.org/r/navigation/"
+
+
+def drop_fixture_page(fixture_dir, url):
+    pages_path = os.path.join(fixture_dir, "pages.json")
+    with open(pages_path, 'r') as pages_file:
+        pages = json.load(pages_file)
+    del pages[url]
+    with open(pages_path, 'w') as pages_file:
+        json.dump(pages, pages_file)
+
+
+def get_manifest(db_root):
+    return IndexManifest(os.path.join(str(db_root), "ros_index_db_noetic", "index_manifest.json"))
+
+
+def test_failed_listing_page_aborts_the_build(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db")
+    repo_names = set(get_manifest(tmp_path / "db").repos.keys())
+
+    drop_fixture_page(fixture_dir, "https://index.ros.org/repos/page/2/time/")
+    with pytest.raises(RuntimeError):
+        run_build(fixture_dir, tmp_path / "db")
+
+    assert set(get_manifest(tmp_path / "db").repos.keys()) == repo_names
+
+
+def test_failed_repo_page_keeps_its_manifest_entry(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db")
+    navigation_entry = get_manifest(tmp_path / "db").repos['navigation']
+
+    drop_fixture_page(fixture_dir, "https://index.ros.org/r/navigation/")
+    index_build = run_build(fixture_dir, tmp_path / "db")
+
+    assert index_build.failed_repos == {'navigation'}
+    assert get_manifest(tmp_path / "db").repos['navigation'] == navigation_entry
+
+
+def test_corrupt_gzip_body_is_a_failed_fetch():
+    fetcher = ROSHTTPFetcher(cache_dir=None, browser_fallback=False)
+    fetcher.pool.request = lambda url, headers: (200, {'content-encoding': 'gzip'}, b"not gzip")
+
+    html_list = fetcher.load(["https://index.ros.org/r/navigation/"])
+
+    assert get_failed_sources(html_list) == ["https://index.ros.org/r/navigation/"]
+    assert fetcher.get_stats()['errors'] == 1
+
+
+class FakeServer:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.request_headers = []
+
+    def request(self, url, headers):
+        self.request_headers.append(dict(headers))
+        return self.responses.pop(0)
+
+
+def test_etag_revalidation_serves_the_cached_body(fixture_dir, tmp_path):
+    server, base_url = start_fixture_server(fixture_dir=fixture_dir)
+    fetcher = ROSHTTPFetcher(cache_dir=str(tmp_path / "http_cache"), host_override=base_url, browser_fallback=False)
+    try:
+        first_pages = fetcher.load([NAVIGATION_URL])
+        second_pages = fetcher.load([NAVIGATION_URL])
+    finally:
+        fetcher.close()
+        server.shutdown()
+
+    assert second_pages[0].page_content == first_pages[0].page_content
+    assert fetcher.get_stats()['not_modified'] == 1
+    assert fetcher.get_stats()['downloaded_bytes'] == len(first_pages[0].page_content.encode('utf-8'))
+
+
+def test_last_modified_revalidation_serves_the_cached_body(tmp_path):
+    fetcher = ROSHTTPFetcher(cache_dir=str(tmp_path / "http_cache"), browser_fallback=False)
+    last_modified = "Sun, 01 Jan 2023 00:00:00 GMT"
+    fetcher.pool = FakeServer([(200, {'last-modified': last_modified}, b"<div id=\"distro-noetic\"></div>"),
+                               (304, dict(), b"")])
+
+    first_pages = fetcher.load([NAVIGATION_URL])
+    second_pages = fetcher.load([NAVIGATION_URL])
+
+    assert fetcher.pool.request_headers[1]['If-Modified-Since'] == last_modified
+    assert 'If-None-Match' not in fetcher.pool.request_headers[1]
+    assert second_pages[0].page_content == first_pages[0].page_content
+    assert get_failed_sources(second_pages) == []
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_server_errors_serve_the_cached_body(tmp_path, status):
+    fetcher = ROSHTTPFetcher(cache_dir=str(tmp_path / "http_cache"), browser_fallback=False)
+    fetcher.pool = FakeServer([(200, {'etag': '"v1"'}, b"<div id=\"distro-noetic\"></div>"),
+                               (status, dict(), b"")])
+
+    first_pages = fetcher.load([NAVIGATION_URL])
+    second_pages = fetcher.load([NAVIGATION_URL])
+
+    assert second_pages[0].page_content == first_pages[0].page_content
+    assert get_failed_sources(second_pages) == []
+
+
+def test_missing_page_is_not_served_from_the_cache(tmp_path):
+    fetcher = ROSHTTPFetcher(cache_dir=str(tmp_path / "http_cache"), browser_fallback=False)
+    fetcher.pool = FakeServer([(200, {'etag': '"v1"'}, b"<div id=\"distro-noetic\"></div>"), (404, dict(), b"")])
+
+    fetcher.load([NAVIGATION_URL])
+
+    assert get_failed_sources(fetcher.load([NAVIGATION_URL])) == [NAVIGATION_URL]
+
+
+def use_browser_pages(monkeypatch, browser_pages):
+    document_loaders = pytest.importorskip("langchain.document_loaders")
+
+    class FakeChromiumLoader:
+        def __init__(self, urls):
+            self.urls = urls
+
+        def load(self):
+            return [Document(page_content=browser_pages[url], metadata={'source': url}) for url in self.urls
+                    if url in browser_pages]
+
+    monkeypatch.setattr(document_loaders, 'AsyncChromiumLoader', FakeChromiumLoader, raising=False)
+
+
+@pytest.mark.parametrize('browser_page', ["Error: net::ERR_CONNECTION_RESET", "<html><body>Loading...</body></html>",
+                                          None])
+def test_failed_browser_fallback_is_a_failed_fetch(monkeypatch, browser_page):
+    use_browser_pages(monkeypatch, {NAVIGATION_URL: browser_page} if browser_page is not None else dict())
+    fetcher = ROSHTTPFetcher(cache_dir=None)
+    fetcher.pool = FakeServer([(200, dict(), b"<html><body>Loading...</body></html>")])
+
+    html_list = fetcher.load([NAVIGATION_URL])
+
+    assert get_failed_sources(html_list) == [NAVIGATION_URL]
+    assert fetcher.get_stats()['browser_fallbacks'] == 1
+
+
+def test_browser_fallback_replaces_an_unrendered_page(monkeypatch):
+    rendered_page = "<div id=\"distro-noetic\">navigation</div>"
+    use_browser_pages(monkeypatch, {NAVIGATION_URL: rendered_page})
+    fetcher = ROSHTTPFetcher(cache_dir=None)
+    fetcher.pool = FakeServer([(503, dict(), b"")])
+
+    html_list = fetcher.load([NAVIGATION_URL])
+
+    assert html_list[0].page_content == rendered_page
+    assert get_failed_sources(html_list) == []
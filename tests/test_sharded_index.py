@@ -0,0 +1,86 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+from conftest import edit_fixture, run_build
+
+from roscribe.index_stats import get_index_stats
+from roscribe.sharded_index import ShardedChunkStore, get_shard_filter, get_shard_path, get_shared_db_dir
+
+
+VELODYNE_LINK = '<a href="/r/velodyne/">velodyne</a>'
+
+
+@pytest.fixture
+def chunk_store(tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    collection = chromadb.PersistentClient(path=str(tmp_path / "shared")).get_or_create_collection("langchain")
+    return ShardedChunkStore(SimpleNamespace(_collection=collection), str(tmp_path / "shared" / "shards.json"))
+
+
+def get_flags(chunk_store, chunk_key):
+    results = chunk_store.vectorstore._collection.get(ids=[chunk_key], include=['metadatas'])
+    if len(results['ids']) == 0:
+        return None
+    return {key: value for key, value in results['metadatas'][0].items() if key.startswith("distro_")}
+
+
+def test_shared_chunk_is_stored_once_and_released_per_distro(chunk_store):
+    doc = Document(page_content="Velodyne LiDAR driver", metadata={'repo_name': "velodyne"})
+    chunk_key = chunk_store.upsert('noetic', ["velodyne:readme:0"], [doc], [[1.0, 0.0]])[0]
+    assert chunk_store.upsert('humble', ["velodyne:readme:0"], [doc], [[1.0, 0.0]])[0] == chunk_key
+
+    assert chunk_store.vectorstore._collection.count() == 1
+    assert get_flags(chunk_store, chunk_key) == {'distro_noetic': True, 'distro_humble': True}
+
+    chunk_store.delete('noetic', ["velodyne:readme:0"])
+    assert get_flags(chunk_store, chunk_key) == {'distro_noetic': False, 'distro_humble': True}
+
+    chunk_store.delete('humble', ["velodyne:readme:0"])
+    assert get_flags(chunk_store, chunk_key) is None
+
+
+def test_changed_text_releases_the_old_chunk(chunk_store):
+    old_doc = Document(page_content="Velodyne LiDAR driver", metadata={'repo_name': "velodyne"})
+    new_doc = Document(page_content="Velodyne LiDAR driver and pointcloud tools", metadata={'repo_name': "velodyne"})
+    old_key = chunk_store.upsert('noetic', ["velodyne:readme:0"], [old_doc], [[1.0, 0.0]])[0]
+    chunk_store.upsert('humble', ["velodyne:readme:0"], [old_doc], [[1.0, 0.0]])
+
+    new_key = chunk_store.upsert('noetic', ["velodyne:readme:0"], [new_doc], [[0.0, 1.0]])[0]
+
+    assert new_key != old_key
+    assert get_flags(chunk_store, old_key) == {'distro_noetic': False, 'distro_humble': True}
+    assert get_flags(chunk_store, new_key) == {'distro_noetic': True}
+    chunk_store.save()
+    assert ShardedChunkStore(None, chunk_store.shard_path).get_shard('noetic') == {"velodyne:readme:0": new_key}
+
+
+def get_shard_stats(db_root, ros_distro):
+    shared_dir = get_shared_db_dir(str(db_root))
+    shard = ShardedChunkStore(None, get_shard_path(shared_dir)).get_shard(ros_distro)
+    return get_index_stats(os.path.join(str(db_root), "ros_index_db_{}".format(ros_distro)), store_dir=shared_dir,
+                           ros_distro=ros_distro, shard=shard, shard_filter=get_shard_filter(ros_distro))
+
+
+def test_sharded_build_removes_a_repo_from_one_distro_only(fixture_dir, tmp_path):
+    db_root = tmp_path / "db"
+    run_build(fixture_dir, db_root, ros_distros=('noetic', 'humble'), sharded=True)
+    chunk_store = ShardedChunkStore(None, get_shard_path(get_shared_db_dir(str(db_root))))
+    assert chunk_store.get_stats()['dedup_ratio'] > 1.0
+    velodyne_keys = {chunk_key for doc_id, chunk_key in chunk_store.get_shard('noetic').items()
+                     if doc_id.startswith("velodyne:")}
+    assert len(velodyne_keys) > 0
+
+    # The first link is in the noetic block of the listing page
+    edit_fixture(fixture_dir, "listing_page_1.html", VELODYNE_LINK, "velodyne", count=1)
+    run_build(fixture_dir, db_root, ros_distros=('noetic', 'humble'), sharded=True)
+
+    chunk_store = ShardedChunkStore(None, get_shard_path(get_shared_db_dir(str(db_root))))
+    assert not any(doc_id.startswith("velodyne:") for doc_id in chunk_store.get_shard('noetic'))
+    assert velodyne_keys & set(chunk_store.get_shard('humble').values())
+    for ros_distro in ('noetic', 'humble'):
+        anomalies = get_shard_stats(db_root, ros_distro)['anomalies']
+        assert 'orphaned_vectors' not in anomalies
+        assert 'missing_vectors' not in anomalies
@@ -0,0 +1,41 @@
+from conftest import run_build
+
+from roscribe.vectorstore_registry import VectorStoreRegistry
+
+
+def test_open_reuses_the_store_until_it_is_closed(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db")
+    registry = VectorStoreRegistry(db_root=str(tmp_path / "db"), persist_query_cache=False)
+
+    store = registry.open("noetic")
+    assert registry.open("noetic") is store
+    assert registry.is_open("noetic")
+
+    assert registry.close("noetic")
+    assert not registry.is_open("noetic")
+    assert registry.open("noetic") is not store
+
+    store_stats = registry.get_stats()['stores']['noetic']
+    assert store_stats['opens'] == 2
+    assert store_stats['requests'] == 3
+    registry.close_all()
+
+
+def test_closing_every_sharded_distro_releases_the_shared_store(fixture_dir, tmp_path):
+    run_build(fixture_dir, tmp_path / "db", ros_distros=('noetic', 'humble'), sharded=True)
+    registry = VectorStoreRegistry(db_root=str(tmp_path / "db"), persist_query_cache=False)
+
+    shared_store = registry.open("noetic")
+    assert registry.open("humble") is shared_store
+    _, noetic_shard = registry.get_shard("noetic")
+
+    registry.close("noetic")
+    assert registry.open("humble") is shared_store
+    registry.close("humble")
+
+    run_build(fixture_dir, tmp_path / "db", ros_distros=('noetic',), sharded=True)
+    assert registry.open("noetic") is not shared_store
+    _, rebuilt_shard = registry.get_shard("noetic")
+    assert rebuilt_shard is not noetic_shard
+    assert rebuilt_shard == noetic_shard
+    registry.close_all()